@@ -0,0 +1,81 @@
+# Compare ranking bigrams with NLTK's BigramCollocationFinder against the
+# BigramCounts engine, and check that both give the same rankings for every
+# association measure and a range of frequency thresholds. The engine's
+# first ranking includes counting; later rankings reuse the counts, as when
+# a user moves the frequency filter on the results page.
+#
+# Usage:
+#   python benchmarks/bench_bigrams.py page1.html page2.html ...
+#   python benchmarks/bench_bigrams.py --dir saved_pages/
+#   python benchmarks/bench_bigrams.py --cache patenttools/cache --limit 50
+#   python benchmarks/bench_bigrams.py --words 50000
+
+# Import necessary modules
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "patenttools"))
+
+from nltk.collocations import BigramCollocationFinder
+from nltk.metrics import BigramAssocMeasures
+from bench_tokenizers import load_texts
+from bigrams import BigramCounts, MEASURES
+from distiller import TextDistiller
+import config
+
+MIN_FREQS = (1, 2, 4, 8)
+
+
+def nltk_rank(tokens, min_freq, measure):
+    # Rank bigrams as TextDistiller.gen_bigrams used to.
+    bg_finder = BigramCollocationFinder.from_words(tokens, window_size = config.bg_win)
+    bg_finder.apply_freq_filter(min_freq)
+    return bg_finder.nbest(getattr(BigramAssocMeasures, measure), config.bg_count)
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Compare NLTK and BigramCounts bigram rankings.")
+    parser.add_argument("pages", nargs = "*", help = "saved patent pages")
+    parser.add_argument("--dir", help = "a directory of saved patent pages")
+    parser.add_argument("--cache", help = "a PatentCache directory to read pages from")
+    parser.add_argument("--limit", type = int, default = None, help = "pages to read from the cache")
+    parser.add_argument("--words", type = int, default = 50000, help = "words of synthetic text")
+    args = parser.parse_args()
+
+    mismatches = 0
+    totals = {"nltk" : 0.0, "count" : 0.0, "rerank" : 0.0}
+    rankings = 0
+    for name, text in load_texts(args):
+        tokens = TextDistiller(text, visuals = False).crp_toks
+
+        start = time.perf_counter()
+        counts = BigramCounts.from_tokens(tokens, config.bg_win)
+        totals["count"] += time.perf_counter() - start
+
+        for measure in MEASURES:
+            for min_freq in MIN_FREQS:
+                start = time.perf_counter()
+                expected = nltk_rank(tokens, min_freq, measure)
+                totals["nltk"] += time.perf_counter() - start
+
+                start = time.perf_counter()
+                ranked = counts.rank(min_freq, config.bg_count, measure)
+                totals["rerank"] += time.perf_counter() - start
+                rankings += 1
+
+                if ranked != expected:
+                    mismatches += 1
+                    print("%s: rankings differ for %s, min_freq %d" % (name, measure, min_freq))
+
+    print("%d rankings, %d mismatches" % (rankings, mismatches))
+    print("nltk            %10.2f ms per ranking" % (totals["nltk"] * 1000 / rankings))
+    print("counting        %10.2f ms per document" % (totals["count"] * 1000 * len(MEASURES)
+                                                      * len(MIN_FREQS) / rankings))
+    print("ranking         %10.2f ms per ranking" % (totals["rerank"] * 1000 / rankings))
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
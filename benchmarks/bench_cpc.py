@@ -0,0 +1,81 @@
+# Compare the cost of loading CPC titles from the classifiers.cpc_codes dict
+# literal with memory-mapping the prebuilt cpctree.bin, and the time taken
+# to look up a title each way. Each import is timed in a fresh interpreter,
+# both with the compiled bytecode already cached ("warm") and with none
+# ("cold", as on a fresh container or with PYTHONDONTWRITEBYTECODE), and the
+# median of several runs is reported.
+# Also checks that every title in the file matches the dict.
+#
+# Usage:
+#   python benchmarks/bench_cpc.py
+#   python benchmarks/bench_cpc.py --runs 50
+
+# Import necessary modules
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PACKAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "patenttools")
+sys.path.insert(0, PACKAGE_DIR)
+
+from classifiers import cpc_codes
+from cpctree import CpcTree
+
+# Statements timed in a fresh interpreter for each way of loading titles.
+LOADERS = (("dict literal", "from classifiers import cpc_codes"),
+           ("mmap tree", "from cpctree import CpcTree; CpcTree()"))
+TIMER = "import time; start = time.perf_counter(); %s; print(time.perf_counter() - start)"
+
+
+def import_time(statement, cache_dir):
+    # Seconds taken by a statement in a fresh interpreter, which reads and
+    # writes compiled bytecode in cache_dir.
+    env = dict(os.environ, PYTHONPYCACHEPREFIX = cache_dir)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    output = subprocess.run([sys.executable, "-c", TIMER % statement], cwd = PACKAGE_DIR, env = env,
+                            capture_output = True, text = True, check = True).stdout
+    return float(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Compare loading CPC titles from a dict literal and a mmap file.")
+    parser.add_argument("--runs", type = int, default = 20, help = "interpreters started per measurement")
+    parser.add_argument("--lookups", type = int, default = 200000, help = "title lookups timed")
+    args = parser.parse_args()
+
+    tree = CpcTree()
+    mismatches = sum(tree.title(code) != title for code, title in cpc_codes.items())
+    print("%d codes, %d title mismatches" % (len(cpc_codes), mismatches))
+
+    print("%-14s %14s %14s" % ("loader", "warm ms", "cold ms"))
+    for name, statement in LOADERS:
+        # Warm runs share a bytecode cache, filled by a first run; each
+        # cold run starts with an empty one.
+        warm_dir = tempfile.mkdtemp()
+        import_time(statement, warm_dir)
+        warm = statistics.median(import_time(statement, warm_dir) for run in range(args.runs))
+        cold = statistics.median(import_time(statement, tempfile.mkdtemp()) for run in range(args.runs))
+        print("%-14s %14.3f %14.3f" % (name, warm * 1000, cold * 1000))
+
+    codes = list(cpc_codes) * (args.lookups // len(cpc_codes) + 1)
+    codes = codes[:args.lookups]
+    for name, function in (("dict literal", cpc_codes.get), ("mmap tree", tree.title)):
+        start = time.perf_counter()
+        for code in codes:
+            function(code)
+        elapsed = time.perf_counter() - start
+        print("%-14s %10.3f us per title lookup" % (name, elapsed / len(codes) * 1e6))
+
+    start = time.perf_counter()
+    for section in "ABCDEFGHY":
+        tree.with_prefix(section)
+    print("prefix query: %.1f us per section" % ((time.perf_counter() - start) / 9 * 1e6))
+    return 0 if mismatches == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
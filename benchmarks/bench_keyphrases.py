@@ -0,0 +1,100 @@
+# Compare the memory and time used to find key phrases of several words by
+# counting n-grams exactly, with NLTK's TrigramCollocationFinder or a
+# Counter, against the bounded-memory PhraseSketch. Also check how many of
+# the exact top phrases PhraseSketch finds. By default, the 200 largest
+# (longest) patents in the cache are used.
+#
+# Usage:
+#   python benchmarks/bench_keyphrases.py --cache patenttools/cache
+#   python benchmarks/bench_keyphrases.py --cache patenttools/cache --limit 50
+#   python benchmarks/bench_keyphrases.py page1.html page2.html ...
+#   python benchmarks/bench_keyphrases.py --words 500000
+
+# Import necessary modules
+import argparse
+import os
+import collections
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "patenttools"))
+
+from nltk.collocations import TrigramCollocationFinder
+from bench_tokenizers import load_texts
+from distiller import TextDistiller
+from keyphrases import PhraseSketch
+import config
+
+
+def exact_counts(tokens):
+    # Count every n-gram of config.ngram_sizes tokens exactly.
+    counts = collections.Counter()
+    for size in config.ngram_sizes:
+        counts.update(zip(*(tokens[offset:] for offset in range(size))))
+    return counts
+
+
+def exact_top(counts):
+    # Rank phrases as PhraseSketch.top does.
+    ranked = sorted((item for item in counts.items() if item[1] >= config.ngram_min_freq),
+                    key = lambda item: (-item[1], item[0]))
+    return [phrase for phrase, count in ranked[:config.ngram_count]]
+
+
+def measure(function, tokens):
+    # Peak memory traced while calling a function, and its wall time.
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function(tokens)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, peak, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Compare exact n-gram counting with PhraseSketch.")
+    parser.add_argument("pages", nargs = "*", help = "saved patent pages")
+    parser.add_argument("--dir", help = "a directory of saved patent pages")
+    parser.add_argument("--cache", help = "a PatentCache directory to read pages from")
+    parser.add_argument("--limit", type = int, default = 200, help = "pages to read from the cache")
+    parser.add_argument("--words", type = int, default = 500000, help = "words of synthetic text")
+    args = parser.parse_args()
+
+    methods = (("nltk trigrams", TrigramCollocationFinder.from_words),
+               ("exact counter", exact_counts),
+               ("phrase sketch", PhraseSketch.from_tokens))
+    peaks = dict.fromkeys(name for name, function in methods)
+    totals = dict.fromkeys(peaks, 0.0)
+    for name in peaks:
+        peaks[name] = []
+    found = 0
+    expected = 0
+    tokens_seen = 0
+    texts = load_texts(args)
+    for text_name, text in texts:
+        tokens = TextDistiller(text, visuals = False).crp_toks
+        tokens_seen += len(tokens)
+        results = {}
+        for name, function in methods:
+            results[name], peak, elapsed = measure(function, tokens)
+            peaks[name].append(peak)
+            totals[name] += elapsed
+
+        exact = exact_top(results["exact counter"])
+        found += len(set(exact) & set(results["phrase sketch"].top()))
+        expected += len(exact)
+
+    print("%d texts, %d tokens" % (len(texts), tokens_seen))
+    print("%-14s %14s %14s %12s" % ("method", "max peak MB", "mean peak MB", "total s"))
+    for name in peaks:
+        print("%-14s %14.1f %14.1f %12.2f" % (name, max(peaks[name]) / 1024 ** 2,
+                                               sum(peaks[name]) / len(peaks[name]) / 1024 ** 2,
+                                               totals[name]))
+    print("phrase sketch found %d of %d exact top phrases" % (found, expected))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
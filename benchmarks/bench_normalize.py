@@ -0,0 +1,101 @@
+# Check that the one-pass functions in normalize give exactly the results of
+# the re.sub chains they replaced, and compare their speed, on the text of
+# saved patent pages.
+#
+# Usage:
+#   python benchmarks/bench_normalize.py page1.html page2.html ...
+#   python benchmarks/bench_normalize.py --dir saved_pages/
+#   python benchmarks/bench_normalize.py --cache patenttools/cache --limit 50
+
+# Import necessary modules
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "patenttools"))
+
+from bench_parsers import load_pages
+from pageparser import parse_patent_page
+import normalize
+
+# A sample of the raw patent numbers people type in.
+PATENT_NUMBERS = ["8,622,391", "US 8622391 B2", "US8622391", "8622391", "US 2012/0123456 A1",
+                  "D659,000", "RE43,456", "8.622.391", "#8622391!", "us8622391b1", "8 622 391"]
+
+
+def clean_num_chain(raw_patent_num):
+    cleaned_num = re.sub(r"US", "", raw_patent_num)
+    cleaned_num = re.sub(r"[a-zA-Z]+[0-9]*", "", cleaned_num)
+    cleaned_num = re.sub(r"[,.\\\!\?\#-]*", "", cleaned_num)
+    return re.sub(r"\s+", "", cleaned_num)
+
+
+def lookup_clean_text_chain(ugly_text):
+    cleaned_text = re.sub(r"[\s]{2,}", " ", ugly_text)
+    return re.sub(r"\n", " ", cleaned_text)
+
+
+def distiller_clean_text_chain(raw_text):
+    processed_text = re.sub(r"\s+", " ", raw_text)
+    processed_text = processed_text.lower()
+    return re.sub(r"[^a-zA-Z]", " ", processed_text)
+
+
+# Each case pairs a replaced chain with its replacement and the inputs
+# they are applied to: "numbers", every text node, or whole documents.
+CASES = (("clean_num", clean_num_chain, normalize.strip_patent_number, "numbers"),
+         ("USPTOLookup.clean_text", lookup_clean_text_chain, normalize.squeeze_whitespace, "strings"),
+         ("TextDistiller.clean_text", distiller_clean_text_chain, normalize.letters_only, "documents"))
+
+
+def best_time(function, inputs, repeats):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for text in inputs:
+            function(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Check and time the normalize module.")
+    parser.add_argument("pages", nargs = "*", help = "saved patent pages")
+    parser.add_argument("--dir", help = "a directory of saved patent pages")
+    parser.add_argument("--cache", help = "a PatentCache directory to read pages from")
+    parser.add_argument("--limit", type = int, default = None, help = "pages to read from the cache")
+    parser.add_argument("--repeats", type = int, default = 5)
+    args = parser.parse_args()
+
+    pages = load_pages(args)
+    if not pages:
+        parser.error("no patent pages given")
+
+    inputs = {"numbers" : PATENT_NUMBERS * 100, "strings" : [], "documents" : []}
+    for name, patent_html in pages:
+        strings = parse_patent_page(patent_html).strings
+        inputs["strings"].extend(strings)
+        inputs["documents"].append(" ".join(strings))
+
+    mismatches = 0
+    print("%-26s %10s %12s %12s %8s" % ("function", "inputs", "chain ms", "one-pass ms", "speedup"))
+    for name, chain, replacement, kind in CASES:
+        for text in inputs[kind]:
+            if chain(text) != replacement(text):
+                mismatches += 1
+                print("%s differs on %r" % (name, text[:60]))
+        chain_time = best_time(chain, inputs[kind], args.repeats)
+        replacement_time = best_time(replacement, inputs[kind], args.repeats)
+        print("%-26s %10d %12.2f %12.2f %7.1fx" % (name, len(inputs[kind]), chain_time * 1000,
+                                                  replacement_time * 1000,
+                                                  chain_time / max(replacement_time, 1e-9)))
+
+    print("%d mismatches" % mismatches)
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
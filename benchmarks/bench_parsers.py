@@ -0,0 +1,99 @@
+# Compare the CPU cost of USPTOLookup's two parser engines on saved patent
+# pages, and check that both engines extract identical fields.
+#
+# Usage:
+#   python benchmarks/bench_parsers.py page1.html page2.html ...
+#   python benchmarks/bench_parsers.py --dir saved_pages/
+#   python benchmarks/bench_parsers.py --cache patenttools/cache --limit 50
+
+# Import necessary modules
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "patenttools"))
+
+from cache import PatentCache
+from lookup import USPTOLookup, RECORD_FIELDS
+
+ENGINES = ("soup", "stream")
+
+
+def load_pages(args):
+    # Collect (name, html) pairs from files, a directory, or a PatentCache.
+    pages = []
+    paths = list(args.pages)
+    if args.dir:
+        paths += sorted(glob.glob(os.path.join(args.dir, "*.htm*")))
+    for path in paths:
+        with open(path, encoding = "utf-8", errors = "replace") as page:
+            pages.append((os.path.basename(path), page.read()))
+    if args.cache:
+        pages += list(PatentCache(args.cache).pages(limit = args.limit))
+    return pages
+
+
+def parse(engine, patent_html):
+    # Parse a page without fetching it, returning the extracted fields.
+    lookup = USPTOLookup.__new__(USPTOLookup)
+    for field in RECORD_FIELDS:
+        setattr(lookup, field, None)
+    lookup.engine = engine
+    try:
+        lookup.parse_us_pat(patent_html)
+        outcome = None
+    except AttributeError:
+        outcome = "AttributeError"
+    return outcome, [getattr(lookup, field) for field in RECORD_FIELDS]
+
+
+def cpu_time(engine, patent_html, repeats):
+    # Best-of-n CPU time for one parse, in seconds.
+    best = None
+    for _ in range(repeats):
+        start = time.process_time()
+        parse(engine, patent_html)
+        elapsed = time.process_time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Compare the soup and stream parser engines.")
+    parser.add_argument("pages", nargs = "*", help = "saved patent pages")
+    parser.add_argument("--dir", help = "a directory of saved patent pages")
+    parser.add_argument("--cache", help = "a PatentCache directory to read pages from")
+    parser.add_argument("--limit", type = int, default = None, help = "pages to read from the cache")
+    parser.add_argument("--repeats", type = int, default = 5)
+    args = parser.parse_args()
+
+    pages = load_pages(args)
+    if not pages:
+        parser.error("no patent pages given")
+
+    totals = dict.fromkeys(ENGINES, 0.0)
+    mismatches = 0
+    print("%-28s %10s %12s %12s %8s" % ("page", "bytes", "soup ms", "stream ms", "speedup"))
+    for name, patent_html in pages:
+        if parse("soup", patent_html) != parse("stream", patent_html):
+            mismatches += 1
+            print("%s: the engines disagree" % name)
+
+        times = {engine : cpu_time(engine, patent_html, args.repeats) for engine in ENGINES}
+        for engine in ENGINES:
+            totals[engine] += times[engine]
+        print("%-28s %10d %12.2f %12.2f %7.1fx" % (name[:28], len(patent_html),
+                                                   times["soup"] * 1000, times["stream"] * 1000,
+                                                   times["soup"] / max(times["stream"], 1e-9)))
+
+    print("%-28s %10s %12.2f %12.2f %7.1fx" % ("total", "", totals["soup"] * 1000,
+                                               totals["stream"] * 1000,
+                                               totals["soup"] / max(totals["stream"], 1e-9)))
+    print("%d of %d pages parsed identically" % (len(pages) - mismatches, len(pages)))
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,287 @@
+# The benchmark suite: end-to-end throughput and latency of /results, with
+# patft replaced by the local stand-in server (patft_server.py) serving the
+# benchmark corpus (make_corpus.py), and microbenchmarks of the hot paths:
+# USPTOLookup.clean_num, parse_us_pat, TextDistiller and gen_bigrams.
+# The app runs in its own process, with an empty temporary cache: the
+# "cold" phase looks up each corpus patent once, fetching its page from the
+# stand-in; the "warm" phase then repeats lookups that the cache answers.
+# Results can be saved as JSON, and compared with those of another commit.
+#
+# Usage:
+#   python benchmarks/bench_suite.py
+#   python benchmarks/bench_suite.py --output before.json
+#   python benchmarks/bench_suite.py --compare before.json --output after.json
+#   python benchmarks/bench_suite.py --server gunicorn --workers 4 --concurrency 16
+#   python benchmarks/bench_suite.py --skip-e2e
+
+# Import necessary modules
+import argparse
+import concurrent.futures
+import json
+import os
+import platform
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+PACKAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "patenttools")
+sys.path.insert(0, PACKAGE_DIR)
+
+from bench_normalize import PATENT_NUMBERS
+from bench_parsers import parse
+from make_corpus import CORPUS_DIR, load_manifest
+from patft_server import start_server
+from lookup import USPTOLookup, RECORD_FIELDS
+from distiller import TextDistiller
+import config
+
+# Serves the app with werkzeug's threaded server, for --server werkzeug.
+WERKZEUG_SCRIPT = """
+import sys
+from werkzeug.serving import run_simple
+import frontend
+run_simple("127.0.0.1", int(sys.argv[1]), frontend.app, threaded = True)
+"""
+
+# Metrics where a higher value is better; for all others, lower is better.
+HIGHER_IS_BETTER = ("requests_per_second",)
+
+
+def percentile(values, fraction):
+    # The nearest-rank percentile of a list of values.
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def median_time(function, repeats):
+    # Median wall time of one call of a function, in seconds.
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def load_pages(corpus_dir):
+    # The corpus as a list of (number, kind, html) tuples.
+    pages = []
+    for entry in load_manifest(corpus_dir):
+        with open(os.path.join(corpus_dir, entry["file"]), encoding = "utf-8") as page:
+            pages.append((entry["number"], entry["kind"], page.read()))
+    return pages
+
+
+def page_sections(patent_html):
+    # The sections the results page distills, as parsed from a page.
+    outcome, values = parse(config.parser_engine, patent_html)
+    fields = dict(zip(RECORD_FIELDS, values))
+    return {section : fields[section] for section in ("abstract", "claims", "description")}
+
+
+def microbenchmarks(pages, repeats):
+    # Median milliseconds per call of each hot path, by corpus page.
+    results = {}
+    results["clean_num"] = median_time(lambda: [USPTOLookup.clean_num(number) for number in PATENT_NUMBERS],
+                                       repeats) / len(PATENT_NUMBERS) * 1000
+    for number, kind, patent_html in pages:
+        name = "%s[%s]" % (kind, number)
+        sections = page_sections(patent_html)
+        results["parse_us_pat " + name] = median_time(lambda: parse(config.parser_engine, patent_html),
+                                                      repeats) * 1000
+
+        # TextDistiller: cleaning and tokenizing the sections.
+        def distill():
+            return TextDistiller(sections, visuals = False).crp_toks
+        results["TextDistiller " + name] = median_time(distill, repeats) * 1000
+
+        # gen_bigrams: counting and ranking, from tokens already computed.
+        distillers = [TextDistiller(sections, visuals = False) for _ in range(repeats)]
+        for distiller in distillers:
+            distiller.crp_toks
+        remaining = iter(distillers)
+        results["gen_bigrams " + name] = median_time(lambda: next(remaining).gen_bigrams(), repeats) * 1000
+    return results
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def start_app(server, workers, patft_url, cache_dir):
+    # Start the app in its own process, reading pages from the stand-in
+    # server into an empty cache. Returns the process and the app's URL.
+    port = free_port()
+    env = dict(os.environ, PATENTTOOLS_PATFT_URL = patft_url, PATENTTOOLS_CACHE_DIR = cache_dir)
+    env.pop("PATENTTOOLS_OFFLINE", None)
+    if server == "gunicorn":
+        # gunicorn.conf.py, in the package directory, preloads the app.
+        command = ["gunicorn", "--bind", "127.0.0.1:%d" % port, "--workers", str(workers), "frontend:app"]
+    else:
+        command = [sys.executable, "-c", WERKZEUG_SCRIPT, str(port)]
+    process = subprocess.Popen(command, cwd = PACKAGE_DIR, env = env,
+                               stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL)
+    app_url = "http://127.0.0.1:%d" % port
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("the app exited with status %d" % process.returncode)
+        try:
+            requests.get(app_url + "/", timeout = 1)
+            return process, app_url
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("the app did not start within 60 seconds")
+
+
+def run_phase(app_url, numbers, concurrency, bigram_freq_filter):
+    # POST a results request for each number, from concurrent clients.
+    # Returns throughput, latency percentiles and the number of errors.
+    def fetch(number):
+        start = time.perf_counter()
+        response = requests.post(app_url + "/results", timeout = 120,
+                                 data = {"raw_pat_num" : number, "bigram_freq_filter" : bigram_freq_filter})
+        # With background jobs, /results redirects to a page that is
+        # polled until the results are ready.
+        while response.ok and "PatentTools: Working" in response.text:
+            time.sleep(0.05)
+            response = requests.get(response.url, timeout = 120)
+        elapsed = time.perf_counter() - start
+        # Errors are reported in a page, rather than with an error status.
+        failed = not response.ok or "An error occured" in response.text or "Error:" in response.text
+        return elapsed, failed
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers = concurrency) as executor:
+        outcomes = list(executor.map(fetch, numbers))
+    wall = time.perf_counter() - start
+    latencies = [elapsed for elapsed, failed in outcomes]
+    return {"requests" : len(outcomes),
+            "errors" : sum(failed for elapsed, failed in outcomes),
+            "requests_per_second" : len(outcomes) / wall,
+            "p50_ms" : percentile(latencies, 0.50) * 1000,
+            "p99_ms" : percentile(latencies, 0.99) * 1000}
+
+
+def end_to_end(args, pages):
+    patft = start_server(args.corpus, delay = args.upstream_delay)
+    cache_dir = tempfile.mkdtemp()
+    process, app_url = start_app(args.server, args.workers, patft.base_url, cache_dir)
+    try:
+        numbers = [number for number, kind, patent_html in pages]
+        results = {"cold" : run_phase(app_url, numbers, args.concurrency, args.bigram_freq_filter)}
+        warm_numbers = (numbers * (args.requests // len(numbers) + 1))[:args.requests]
+        results["warm"] = run_phase(app_url, warm_numbers, args.concurrency, args.bigram_freq_filter)
+        results["upstream_requests"] = patft.requests
+    finally:
+        process.terminate()
+        process.wait()
+        patft.shutdown()
+        shutil.rmtree(cache_dir, ignore_errors = True)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd = PACKAGE_DIR,
+                              capture_output = True, text = True, check = True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten(results):
+    # The comparable numbers in a results file, as {name: value}.
+    values = {"micro " + name : value for name, value in results.get("micro", {}).items()}
+    for phase, phase_results in results.get("end_to_end", {}).items():
+        if isinstance(phase_results, dict):
+            for name in ("requests_per_second", "p50_ms", "p99_ms"):
+                values["%s %s" % (phase, name)] = phase_results[name]
+    return values
+
+
+def compare(baseline, current, threshold):
+    # Print each number beside the baseline's, marking changes beyond the
+    # threshold. Returns the number of regressions.
+    base_values, values = flatten(baseline), flatten(current)
+    print()
+    print("compared with %s (%s):" % (baseline["meta"].get("commit"), baseline["meta"].get("timestamp")))
+    print("%-44s %12s %12s %8s" % ("metric", "baseline", "current", "ratio"))
+    regressions = 0
+    for name in sorted(set(base_values) & set(values)):
+        ratio = values[name] / base_values[name] if base_values[name] else float("inf")
+        worse = ratio < 1 - threshold if name.endswith(HIGHER_IS_BETTER) else ratio > 1 + threshold
+        better = ratio > 1 + threshold if name.endswith(HIGHER_IS_BETTER) else ratio < 1 - threshold
+        regressions += worse
+        print("%-44s %12.3f %12.3f %7.2fx %s" % (name, base_values[name], values[name], ratio,
+                                                "slower" if worse else "faster" if better else ""))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Benchmark PatentTools end to end and its hot paths.")
+    parser.add_argument("--corpus", default = CORPUS_DIR, help = "corpus directory")
+    parser.add_argument("--repeats", type = int, default = 20, help = "runs per microbenchmark")
+    parser.add_argument("--requests", type = int, default = 200, help = "requests in the warm phase")
+    parser.add_argument("--concurrency", type = int, default = 8, help = "concurrent clients")
+    parser.add_argument("--server", choices = ("werkzeug", "gunicorn"), default = "werkzeug")
+    parser.add_argument("--workers", type = int, default = 4, help = "gunicorn workers")
+    parser.add_argument("--upstream-delay", type = float, default = 0.0,
+                        help = "seconds the stand-in patft server waits before each response")
+    parser.add_argument("--bigram-freq-filter", type = int, default = config.bg_min_freq)
+    parser.add_argument("--skip-e2e", action = "store_true", help = "run only the microbenchmarks")
+    parser.add_argument("--output", help = "write the results to this JSON file")
+    parser.add_argument("--compare", help = "compare with the results in this JSON file")
+    parser.add_argument("--threshold", type = float, default = 0.1,
+                        help = "relative change reported as faster or slower")
+    args = parser.parse_args()
+
+    pages = load_pages(args.corpus)
+    if not pages:
+        print("No pages in %s; run make_corpus.py first." % args.corpus)
+        return 1
+
+    results = {"meta" : {"commit" : git_commit(),
+                         "timestamp" : time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                         "python" : platform.python_version(),
+                         "platform" : platform.platform(),
+                         "args" : vars(args)}}
+
+    results["micro"] = microbenchmarks(pages, args.repeats)
+    print("%-44s %12s" % ("microbenchmark", "median ms"))
+    for name, milliseconds in results["micro"].items():
+        print("%-44s %12.4f" % (name, milliseconds))
+
+    if not args.skip_e2e:
+        results["end_to_end"] = end_to_end(args, pages)
+        print()
+        print("%-8s %9s %7s %10s %10s %10s" % ("phase", "requests", "errors", "req/s", "p50 ms", "p99 ms"))
+        for phase in ("cold", "warm"):
+            phase_results = results["end_to_end"][phase]
+            print("%-8s %9d %7d %10.1f %10.1f %10.1f" % (phase, phase_results["requests"],
+                                                         phase_results["errors"],
+                                                         phase_results["requests_per_second"],
+                                                         phase_results["p50_ms"], phase_results["p99_ms"]))
+        print("%d requests reached the stand-in patft server" % results["end_to_end"]["upstream_requests"])
+
+    if args.output:
+        with open(args.output, "w", encoding = "utf-8") as output:
+            json.dump(results, output, indent = 2)
+            output.write("\n")
+    if args.compare:
+        with open(args.compare, encoding = "utf-8") as baseline:
+            compare(json.load(baseline), results, args.threshold)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+# Compare the throughput of TextDistiller's two tokenizers, in tokens per
+# second, and check that both produce identical tokens.
+#
+# Usage:
+#   python benchmarks/bench_tokenizers.py page1.html page2.html ...
+#   python benchmarks/bench_tokenizers.py --dir saved_pages/
+#   python benchmarks/bench_tokenizers.py --cache patenttools/cache --limit 50
+#   python benchmarks/bench_tokenizers.py --words 50000
+
+# Import necessary modules
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "patenttools"))
+
+from bench_parsers import load_pages, parse
+from distiller import TextDistiller
+from lookup import RECORD_FIELDS
+
+MODES = ("nltk", "fast")
+
+VOCABULARY = ("The sensor of claim 1, wherein the signal (e.g., a voltage) is coupled to "
+              "the housing; FIG. 3 shows a U.S. embodiment that cannot exceed 5 mV. "
+              "Data packets are transmitted over the network to a processor-based unit.").split()
+
+
+def load_texts(args):
+    # The claims and description of each page, or synthetic text.
+    texts = []
+    for name, patent_html in load_pages(args):
+        outcome, fields = parse("stream", patent_html)
+        record = dict(zip(RECORD_FIELDS, fields))
+        if outcome is None and record["claims"] is not None and record["description"] is not None:
+            texts.append((name, " ".join(record["claims"] + [record["description"]])))
+    if not texts:
+        rng = random.Random(0)
+        texts.append(("synthetic", " ".join(rng.choice(VOCABULARY) for _ in range(args.words))))
+    return texts
+
+
+def tokenize(mode, text):
+    return TextDistiller(text, visuals = False, tokenizer = mode).crp_toks
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Compare the nltk and fast tokenizers.")
+    parser.add_argument("pages", nargs = "*", help = "saved patent pages")
+    parser.add_argument("--dir", help = "a directory of saved patent pages")
+    parser.add_argument("--cache", help = "a PatentCache directory to read pages from")
+    parser.add_argument("--limit", type = int, default = None, help = "pages to read from the cache")
+    parser.add_argument("--words", type = int, default = 50000, help = "words of synthetic text")
+    parser.add_argument("--repeats", type = int, default = 5)
+    args = parser.parse_args()
+
+    texts = load_texts(args)
+    mismatches = 0
+    tokens = 0
+    totals = dict.fromkeys(MODES, 0.0)
+    for name, text in texts:
+        results = {mode : tokenize(mode, text) for mode in MODES}
+        if results["nltk"] != results["fast"]:
+            mismatches += 1
+            print("%s: the tokenizers disagree" % name)
+        tokens += len(results["fast"])
+
+        for mode in MODES:
+            best = None
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                tokenize(mode, text)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            totals[mode] += best
+
+    print("%d texts, %d tokens after stop word removal" % (len(texts), tokens))
+    for mode in MODES:
+        print("%-6s %12.0f tokens/s" % (mode, tokens / max(totals[mode], 1e-9)))
+    print("speedup %.1fx" % (totals["nltk"] / max(totals["fast"], 1e-9)))
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
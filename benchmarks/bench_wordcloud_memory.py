@@ -0,0 +1,100 @@
+# Render many word clouds in a row and watch the process's resident memory,
+# to check that rendering does not leak. RSS should level off after the
+# first few hundred renders and stay flat from then on.
+#
+# Usage:
+#   python benchmarks/bench_wordcloud_memory.py --renders 10000
+#   python benchmarks/bench_wordcloud_memory.py --page saved_page.html --threads 4
+
+# Import necessary modules
+import argparse
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "patenttools"))
+
+from distiller import TextDistiller
+from lookup import USPTOLookup, RECORD_FIELDS
+
+VOCABULARY = ("sensor signal device housing member layer substrate circuit controller "
+              "electrode voltage current display touch panel surface contact region portion "
+              "module network data packet memory processor unit plurality configured coupled "
+              "adjacent disposed method system apparatus optical fiber light source beam lens "
+              "polymer resin composition weight temperature pressure").split()
+
+
+def rss_mb():
+    # Current resident set size of this process, in MB.
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load_text(args):
+    # Text of a saved patent page's claims and description, or else
+    # synthetic text of about the same size.
+    if args.page:
+        lookup = USPTOLookup.__new__(USPTOLookup)
+        for field in RECORD_FIELDS:
+            setattr(lookup, field, None)
+        lookup.engine = "stream"
+        with open(args.page, encoding = "utf-8", errors = "replace") as page:
+            lookup.parse_us_pat(page.read())
+        return " ".join(lookup.claims) + lookup.description
+
+    rng = random.Random(0)
+    return " ".join(rng.choice(VOCABULARY) for _ in range(args.words))
+
+
+def render(text):
+    return len(TextDistiller(text).wordcloud_png)
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Check word cloud rendering for memory growth.")
+    parser.add_argument("--renders", type = int, default = 10000)
+    parser.add_argument("--threads", type = int, default = 1, help = "render from this many threads at once")
+    parser.add_argument("--page", help = "a saved patent page to take the text from")
+    parser.add_argument("--words", type = int, default = 5000, help = "words of synthetic text")
+    parser.add_argument("--every", type = int, default = 500, help = "renders between RSS samples")
+    parser.add_argument("--warmup", type = int, default = 200, help = "renders before the baseline sample")
+    parser.add_argument("--tolerance", type = float, default = 20.0,
+                        help = "allowed RSS growth after warmup, in MB")
+    args = parser.parse_args()
+
+    text = load_text(args)
+    pool = ThreadPoolExecutor(max_workers = args.threads)
+
+    for _ in pool.map(render, [text] * args.warmup):
+        pass
+    baseline = rss_mb()
+    print("%8s %10s %10s" % ("renders", "RSS MB", "renders/s"))
+    print("%8d %10.1f %10s" % (0, baseline, ""))
+
+    done = 0
+    peak = baseline
+    while done < args.renders:
+        batch = min(args.every, args.renders - done)
+        start = time.perf_counter()
+        for _ in pool.map(render, [text] * batch):
+            pass
+        elapsed = time.perf_counter() - start
+        done += batch
+        current = rss_mb()
+        peak = max(peak, current)
+        print("%8d %10.1f %10.1f" % (done, current, batch / elapsed))
+
+    pool.shutdown()
+    growth = peak - baseline
+    print("RSS grew by %.1f MB after warmup (tolerance %.1f MB)" % (growth, args.tolerance))
+    return 1 if growth > args.tolerance else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,212 @@
+# Write the benchmark corpus in benchmarks/corpus: patent pages in the
+# markup patft serves, covering a typical patent, a short one, a huge one,
+# one without an assignee and one without citations, plus manifest.json
+# describing each page.
+# The pages are synthetic: their layout follows patft's, but their text is
+# random words from a small vocabulary, and their inventors, assignee,
+# dates, classes and citations are drawn from small lists of real-looking
+# values, all generated from fixed seeds so that the corpus is the same on
+# every run. They stand in for real pages, which patft no longer serves
+# since the USPTO retired it. With --record, pages are instead
+# fetched from patft (or PATENTTOOLS_PATFT_URL) and added to the corpus as
+# recorded pages.
+#
+# Usage:
+#   python benchmarks/make_corpus.py
+#   python benchmarks/make_corpus.py --record 8622391 9000001
+
+# Import necessary modules
+import argparse
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "patenttools"))
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+
+WORDS = ("sensor signal device housing member layer substrate circuit controller electrode "
+         "voltage current display touch panel surface contact region portion module network "
+         "data packet memory processor unit first second third plurality configured coupled "
+         "adjacent disposed wherein method system apparatus receiving transmitting optical fiber "
+         "light source beam lens polymer resin composition weight percent temperature pressure").split()
+
+# Values the bibliographic fields of synthetic pages are drawn from.
+INVENTORS = ("Diehl; Mike", "Nakamura; Hiroshi", "Garcia; Ana", "Okafor; Chidi", "Lindqvist; Erik",
+             "Chen; Wei", "Kowalski; Anna", "Patel; Ravi", "Dubois; Claire", "Moreau; Luc")
+ASSIGNEES = (("Apple   Inc.", "Cupertino, \nCA"), ("Sony Corporation", "Tokyo, \nJP"),
+             ("Siemens Aktiengesellschaft", "Munich, \nDE"), ("3M Innovative Properties Company",
+                                                              "St. Paul, \nMN"),
+             ("Corning Incorporated", "Corning, \nNY"), ("Samsung Electronics Co., Ltd.", "Suwon-si, \nKR"))
+MONTHS = ("January", "February", "March", "April", "May", "June", "July", "August", "September",
+          "October", "November", "December")
+US_CLASSES = ("345/173", "345/156", "385/123", "428/220", "523/400", "370/329", "600/300", "438/478",
+              "74/606R", "280/735")
+CPC_CLASSES = ("G06F 3/0488", "G06F 3/04883", "H04L 9/32", "H04W 72/04", "G02B 6/02", "B32B 27/08",
+               "C08L 63/00", "A61B 5/00", "H01L 21/02", "F16H 57/02", "B60R 21/01", "G01N 33/53")
+FOREIGN_DOCUMENTS = (("1 133 057", "EP"), ("2002-342033", "JP"), ("10 2004 012 345", "DE"),
+                     ("2 345 678", "GB"), ("WO 01/23456", "WO"), ("1020050012345", "KR"))
+EXAMINERS = ("Smith; John", "Nguyen; Thu", "Brown; Karen", "Rossi; Marco")
+
+# The synthetic pages: number, kind, and the settings of synthetic_page.
+SYNTHETIC_PAGES = (("8622391", "typical", {"claims" : 20, "paragraphs" : 60, "seed" : 0}),
+                   ("8622392", "typical", {"claims" : 25, "paragraphs" : 80, "seed" : 1}),
+                   ("8622393", "typical", {"claims" : 15, "paragraphs" : 40, "seed" : 2}),
+                   ("7000002", "short", {"claims" : 3, "paragraphs" : 4, "seed" : 3}),
+                   ("9000001", "huge", {"claims" : 120, "paragraphs" : 1000, "seed" : 4}),
+                   ("7000001", "no-assignee", {"claims" : 10, "paragraphs" : 30, "seed" : 5,
+                                               "assignee" : False}),
+                   ("7000003", "no-citations", {"claims" : 10, "paragraphs" : 30, "seed" : 6,
+                                                "citations" : False}))
+
+
+def words(rng, count):
+    return " ".join(rng.choice(WORDS) for _ in range(count))
+
+
+def date(rng, first_year, last_year):
+    return "%s %d, %d" % (rng.choice(MONTHS), rng.randint(1, 28), rng.randint(first_year, last_year))
+
+
+def synthetic_page(number, claims, paragraphs, seed, assignee = True, citations = True):
+    # Build a patent page as patft lays it out, with random text. The
+    # bibliographic fields have a random generator of their own, so that
+    # the text stays the same whichever fields a page has.
+    rng = random.Random(seed)
+    fields = random.Random("fields-%d" % seed)
+    inventors = fields.sample(INVENTORS, fields.randint(1, 3))
+    company, location = fields.choice(ASSIGNEES)
+    us_classes = fields.sample(US_CLASSES, fields.randint(1, 3))
+    cpc_classes = fields.sample(CPC_CLASSES, fields.randint(1, 4))
+    year = fields.randint(2011, 2016)
+    parts = ['<HTML>\n<HEAD>\n<TITLE>United States Patent: %s</TITLE></HEAD>\n<!-- BUF1=%s -->\n'
+             '<BODY bgcolor="#FFFFFF">\n' % (number, number),
+             '<TABLE WIDTH="100%%">\n<TR><TD ALIGN="LEFT" WIDTH="50%%"><B>United States Patent </B></TD>\n'
+             '<TD ALIGN="RIGHT" WIDTH="50%%"><B><A NAME="h1" HREF="#h0"></A><A  HREF="#h2"></A><B><I></I></B>'
+             '%s</B></TD></TR>\n' % number,
+             '<TR><TD ALIGN="LEFT" WIDTH="50%%"><b>%s%s</B></TD>\n<TD ALIGN="RIGHT" WIDTH="50%%"> <B>\n'
+             '     %s\n</B></TD></TR>\n</TABLE>\n<HR>\n' % (inventors[0].split(";")[0],
+                                                       ",   et al." if len(inventors) > 1 else "",
+                                                       date(fields, year, year)),
+             '<font size="+1">%s\n</font><BR>\n' % words(rng, 6).capitalize(),
+             '<BR><CENTER><B>Abstract</B></CENTER>\n<P>%s.  *  %s\n  more.</P>\n<HR>\n' % (words(rng, 40),
+                                                                                           words(rng, 20)),
+             '<TABLE WIDTH="100%%">\n <TR> <TH scope="row" ALIGN="LEFT" VALIGN="TOP" WIDTH="10%%">Inventors:</TH> '
+             '<TD ALIGN="LEFT" WIDTH="90%%">\n %s</TD></TR>\n'
+             % ", ".join("<B>%s</B> (%s)" % (inventor, location.replace(" \n", " ")) for inventor in inventors)]
+    if assignee:
+        parts.append('<TR> <TH scope="row" VALIGN="TOP" ALIGN="LEFT" WIDTH="10%%">Assignee:</TH>\n'
+                     '<TD ALIGN="LEFT" WIDTH="90%%">\n\n<B>%s</B>\n (%s)\n<BR>\n\n</TD></TR>\n'
+                     % (company, location))
+    parts += ['<TR><TH scope="row" VALIGN="TOP" ALIGN="LEFT" WIDTH="10%%" NOWRAP>Appl. No.:\n</TH>'
+              '<TD ALIGN="LEFT" WIDTH="90%%">\n<B>%d/%03d,%03d</B></TD></TR>\n'
+              % (fields.choice((11, 12, 13)), fields.randint(0, 999), fields.randint(0, 999)),
+              '<TR><TH scope="row" VALIGN="TOP" ALIGN="LEFT" WIDTH="10%%">Filed:\n</TH>'
+              '<TD ALIGN="LEFT" WIDTH="90%%">\n<B>%s</B></TD></TR>\n</TABLE>\n' % date(fields, year - 4, year - 2),
+              '<P>\n<TABLE WIDTH="100%%">\n<TR><TD VALIGN="TOP" ALIGN="LEFT" WIDTH="40%%"><B>Current U.S. Class:</B></TD>\n'
+              '<TD VALIGN="TOP" ALIGN="RIGHT" WIDTH="80%%"><B>%s</B>%s</TD></TR>\n'
+              % (us_classes[0], "".join("; " + us_class for us_class in us_classes[1:])),
+              '<TR><TD VALIGN="TOP" ALIGN="LEFT" WIDTH="40%%"><B>Current CPC Class: </B></TD>\n'
+              '<TD VALIGN="TOP" ALIGN="RIGHT" WIDTH="80%%">%s</TD></TR>\n'
+              % "; ".join("%s (%d0101)" % (cpc_class, year) for cpc_class in cpc_classes),
+              '<TR><TD VALIGN="TOP" ALIGN="LEFT" WIDTH="40%%"><B>Current International Class: </B></TD>\n'
+              '<TD VALIGN="TOP" ALIGN="RIGHT" WIDTH="80%%">%s (20060101)</TD></TR>\n</TABLE>\n'
+              % cpc_classes[0].split("/")[0] + "/00"]
+    if citations:
+        parts += ['<HR><CENTER><B>References Cited  <A href="/netacgi/nph-Parser?Query=ref/%s">[Referenced By]</A>'
+                  '</B></CENTER> <HR>\n' % number,
+                  '<CENTER><B>U.S. Patent Documents</B></CENTER>\n<TABLE WIDTH="100%"> <TR><TD WIDTH="25%"></TD>'
+                  '<TD WIDTH="25%"></TD><TD WIDTH="25%"></TD><TD WIDTH="25%"></TD></TR>\n']
+        for _ in range(rng.randint(3, 12)):
+            cited = str(rng.randint(4000000, 9000000))
+            parts.append('<TR> <TD align="left">\n<a href="/netacgi/nph-Parser?Sect2=PTO1&Sect2=HITOFF&p=1&'
+                         'u=/netahtml/PTO/search-bool.html&r=1&f=G&l=50&d=PALL&RefSrch=yes&Query=PN/%s">%s</a>'
+                         '</TD><TD align="left">\nJanuary 1996</TD><TD align="left">Yasutake</TD>'
+                         '<TD align="left"></TD></TR>\n' % (cited, cited))
+        parts += ['</TABLE>\n<CENTER><B>Foreign Patent Documents</B></CENTER>\n<TABLE WIDTH="100%"> '
+                  '<TR><TD WIDTH="25%"></TD><TD WIDTH="25%"></TD><TD WIDTH="25%"></TD><TD WIDTH="25%"></TD>'
+                  '<TD WIDTH="25%"></TD></TR>\n',
+                  "".join('<TR><TD align="left">\n%s</TD><TD></TD><TD align="left">\n%s %d</TD><TD></TD>'
+                          '<TD align="left">%s</TD></TR>\n' % (document, fields.choice(MONTHS)[:3],
+                                                              fields.randint(1995, year - 3), country)
+                          for document, country in fields.sample(FOREIGN_DOCUMENTS, fields.randint(1, 3)))
+                  + '</TABLE>\n',
+                  '<TABLE WIDTH="90%"> <BR><CENTER><B>Other References</B></CENTER>\n'
+                  '<TR><TD><align=left>Foo et al., &quot;Paper&quot;, 2001. cited by applicant</TD></TR></TABLE>\n']
+    parts += ['<BR>\n<I>Primary Examiner:</I> %s\n<BR>\n<I>Attorney, Agent or Firm:</I> Law Firm LLP\n'
+              '<BR>\n<HR>\n' % fields.choice(EXAMINERS),
+              '<CENTER><B><I>Claims</B></I></CENTER> <HR> <BR><BR>What is claimed is: <BR><BR>']
+    for claim in range(1, claims + 1):
+        if claim == 1 or rng.random() < 0.2:
+            parts.append(' %d. A %s, comprising: a %s; and a <I>%s</I> %s.  <BR><BR>'
+                         % (claim, rng.choice(WORDS), words(rng, 12), rng.choice(WORDS), words(rng, 10)))
+        else:
+            parts.append(' %d. The %s of claim %d, wherein %s.  <BR><BR>'
+                         % (claim, rng.choice(WORDS), rng.randint(1, claim - 1), words(rng, 15)))
+    parts.append(' <HR> <CENTER><B><I>Description</B></I></CENTER> <HR> <BR><BR>'
+                 'CROSS-REFERENCE TO RELATED APPLICATIONS <BR><BR> This application is a continuation. ')
+    for paragraph in range(paragraphs):
+        parts.append('<BR><BR> %s (FIG. %d), *  %s\n%s.  ' % (words(rng, 30).capitalize(), paragraph,
+                                                             words(rng, 25), words(rng, 20)))
+    parts.append('<BR><BR> * * * * * </BR></BR>\n<HR>\n<CENTER>\n<A href="/netahtml/PTO/srchnum.htm">'
+                 '<IMG border="0" src="/netaicon/PTO/search.gif" alt="[Image]"></A>\n</CENTER>\n</BODY>\n</HTML>\n')
+    return "".join(parts)
+
+
+def load_manifest(corpus_dir = CORPUS_DIR):
+    # The description of each page in the corpus, as a list of dicts.
+    path = os.path.join(corpus_dir, "manifest.json")
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding = "utf-8") as manifest:
+        return json.load(manifest)
+
+
+def save_page(corpus_dir, manifest, number, kind, html, synthetic):
+    # Write a page and record it in the manifest, replacing any page with
+    # the same number.
+    filename = "%s.html" % number
+    with open(os.path.join(corpus_dir, filename), "w", encoding = "utf-8") as page:
+        page.write(html)
+    manifest[:] = [entry for entry in manifest if entry["number"] != number]
+    manifest.append({"number" : number, "kind" : kind, "file" : filename,
+                     "synthetic" : synthetic, "bytes" : len(html.encode("utf-8"))})
+    return
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Write the benchmark corpus of patent pages.")
+    parser.add_argument("--dir", default = CORPUS_DIR, help = "corpus directory")
+    parser.add_argument("--record", nargs = "+", metavar = "NUMBER",
+                        help = "fetch these patents from patft and add them to the corpus")
+    args = parser.parse_args()
+
+    os.makedirs(args.dir, exist_ok = True)
+    manifest = load_manifest(args.dir)
+    if args.record:
+        # lookup is imported only here, so that other benchmarks can import
+        # this module before choosing the configuration PatentTools reads.
+        from lookup import USPTOLookup, USER_AGENT, session, is_patent_page
+        for raw_num in args.record:
+            number = USPTOLookup.clean_num(raw_num)
+            response = session.get(USPTOLookup(number, fetch = False).url, headers = USER_AGENT, timeout = 30)
+            if not response.ok or not is_patent_page(response.text):
+                print("%s: not found" % raw_num)
+                continue
+            save_page(args.dir, manifest, number, "recorded", response.text, synthetic = False)
+            print("%s: recorded" % number)
+    else:
+        for number, kind, settings in SYNTHETIC_PAGES:
+            save_page(args.dir, manifest, number, kind, synthetic_page(number, **settings), synthetic = True)
+
+    manifest.sort(key = lambda entry: entry["number"])
+    with open(os.path.join(args.dir, "manifest.json"), "w", encoding = "utf-8") as manifest_file:
+        json.dump(manifest, manifest_file, indent = 2)
+        manifest_file.write("\n")
+    print("%d pages in %s" % (len(manifest), args.dir))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+# A local stand-in for the USPTO's patft server, serving the pages of the
+# benchmark corpus at the URLs USPTOLookup requests, so that lookups can be
+# benchmarked without the network. Patents not in the corpus get patft's
+# "No patents have matched" page. An optional delay imitates the time the
+# real server takes to respond.
+# Point PatentTools at it with PATENTTOOLS_PATFT_URL.
+#
+# Usage:
+#   python benchmarks/patft_server.py --port 8081 --delay 0.2
+#   PATENTTOOLS_PATFT_URL=http://127.0.0.1:8081 gunicorn frontend:app
+
+# Import necessary modules
+import argparse
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from make_corpus import CORPUS_DIR, load_manifest
+
+NOT_FOUND_PAGE = """<HTML><HEAD><TITLE>Results of Search in US Patent Collection db for:
+</TITLE></HEAD><BODY><BR><CENTER><B>No patents have matched your query</B></CENTER></BODY></HTML>
+"""
+
+
+def load_corpus(corpus_dir = CORPUS_DIR):
+    # The pages of the corpus as a dict of patent number -> HTML bytes.
+    pages = {}
+    for entry in load_manifest(corpus_dir):
+        with open(os.path.join(corpus_dir, entry["file"]), "rb") as page:
+            pages[entry["number"]] = page.read()
+    return pages
+
+
+def requested_number(path):
+    # The patent number in a patft query, as in "s1=8622391.PN.".
+    query = parse_qs(urlsplit(path).query)
+    for value in query.get("s1", []) + query.get("OS", []):
+        number = value.replace(".PN.", "").replace("PN/", "").strip()
+        if number:
+            return number
+    return None
+
+
+class PatftHandler(BaseHTTPRequestHandler):
+
+    """
+    Instances of this class answer one request to the stand-in server from
+    its pages, which are set on the server as server.pages.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        self.server.requests += 1
+        page = self.server.pages.get(requested_number(self.path))
+        body = page if page is not None else NOT_FOUND_PAGE.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=UTF-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        return
+
+    def log_message(self, format, *args):
+        # Requests are counted rather than logged.
+        return
+
+
+def start_server(corpus_dir = CORPUS_DIR, port = 0, delay = 0.0):
+    # Serve the corpus from a background thread. Returns the server, whose
+    # base_url is the value for PATENTTOOLS_PATFT_URL; stop it with
+    # server.shutdown().
+    server = ThreadingHTTPServer(("127.0.0.1", port), PatftHandler)
+    server.daemon_threads = True
+    server.pages = load_corpus(corpus_dir)
+    server.delay = delay
+    server.requests = 0
+    server.base_url = "http://127.0.0.1:%d" % server.server_address[1]
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Serve the benchmark corpus as patft would.")
+    parser.add_argument("--dir", default = CORPUS_DIR, help = "corpus directory")
+    parser.add_argument("--port", type = int, default = 8081)
+    parser.add_argument("--delay", type = float, default = 0.0, help = "seconds to wait before each response")
+    args = parser.parse_args()
+
+    server = start_server(args.dir, args.port, args.delay)
+    print("Serving %d pages at %s" % (len(server.pages), server.base_url))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
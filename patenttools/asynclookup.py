@@ -0,0 +1,128 @@
+# An asyncio-native way to retrieve and parse US patents.
+# AsyncPatentFetcher sends all of its requests through one aiohttp session,
+# so connections to the USPTO are pooled and reused. Requests have connect
+# and read timeouts, are retried with jittered backoff after server errors
+# or connection failures, and are limited in number. Cache access and
+# parsing run in executors, so the event loop is never blocked.
+
+# Import necessary modules
+import asyncio
+import random
+import aiohttp
+from lookup import USPTOLookup, USER_AGENT, is_patent_page
+from cache import OfflineCacheMiss
+from metrics import registry  # Per-stage timings and upstream error counts
+import config     # User-definable configuration
+
+
+def load_page(patent_info, patent_html):
+    # Parse a page into a USPTOLookup in an executor. The lookup is returned
+    # so that this also works in a process pool, which parses a copy.
+    patent_info.load_html(patent_html)
+    return patent_info
+
+
+class AsyncPatentFetcher:
+
+    """
+    Instances of this class look up patents concurrently from a running
+    event loop. Use them as async context managers, e.g.
+
+        async with AsyncPatentFetcher(cache = page_cache) as fetcher:
+            patents = await asyncio.gather(*map(fetcher.lookup, raw_nums))
+
+    Parsing runs in parse_executor, which may be a process pool; None uses
+    the loop's default thread pool.
+    """
+
+    def __init__(self, cache = None, engine = config.parser_engine,
+                 concurrency = config.fetch_concurrency,
+                 connect_timeout = config.fetch_connect_timeout,
+                 read_timeout = config.fetch_read_timeout,
+                 retries = config.fetch_retries, backoff = config.fetch_backoff,
+                 parse_executor = None):
+        self.cache = cache
+        self.engine = engine
+        self.concurrency = concurrency
+        self.timeout = aiohttp.ClientTimeout(sock_connect = connect_timeout,
+                                             sock_read = read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.parse_executor = parse_executor
+        self.session = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        # The session and semaphore are created here, inside the event loop
+        # that will use them.
+        connector = aiohttp.TCPConnector(limit = self.concurrency)
+        self.session = aiohttp.ClientSession(connector = connector, timeout = self.timeout,
+                                             headers = USER_AGENT)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.session.close()
+        self.session = None
+        return
+
+    async def fetch(self, url):
+        # Return the status and text of the page at url. Server errors and
+        # connection failures are retried; the last server error is returned
+        # as is, and the last connection failure is raised.
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._semaphore:
+                    registry.count("patenttools_upstream_requests_total")
+                    with registry.timed("fetch"):
+                        async with self.session.get(url) as response:
+                            # Decode as requests does, so both paths see the same text.
+                            body = await response.read()
+                            patent_html = body.decode(response.charset or "ISO-8859-1", errors = "replace")
+                if response.status >= 400:
+                    registry.count("patenttools_upstream_errors_total", kind = "status %d" % response.status)
+                if response.status < 500 or attempt == self.retries:
+                    return response.status, patent_html
+            except asyncio.TimeoutError:
+                registry.count("patenttools_upstream_errors_total", kind = "timeout")
+                if attempt == self.retries:
+                    raise
+            except aiohttp.ClientError:
+                registry.count("patenttools_upstream_errors_total", kind = "connection")
+                if attempt == self.retries:
+                    raise
+
+            # Full jitter keeps workers that failed together from retrying
+            # in lockstep.
+            await asyncio.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+    async def lookup(self, raw_num):
+        # Look up one patent, returning a USPTOLookup just as the synchronous
+        # constructor would.
+        loop = asyncio.get_running_loop()
+        patent_info = await loop.run_in_executor(
+            None, lambda: USPTOLookup(raw_num, cache = self.cache, engine = self.engine,
+                                      fetch = False))
+
+        # Stop if the number was not understood or a cached record was found.
+        if patent_info.number == "unrecognized input" or patent_info.title is not None:
+            return patent_info
+
+        patent_html = None
+        if self.cache is not None:
+            patent_html = await loop.run_in_executor(None, self.cache.get, patent_info.number)
+            if patent_html is None and self.cache.offline:
+                raise OfflineCacheMiss(patent_info.number)
+
+        if patent_html is None:
+            status, patent_html = await self.fetch(patent_info.url)
+            if self.cache is not None and status < 400 and is_patent_page(patent_html):
+                await loop.run_in_executor(None, self.cache.put, patent_info.number, patent_html)
+
+        patent_info = await loop.run_in_executor(self.parse_executor, load_page,
+                                                 patent_info, patent_html)
+
+        # The record is stored from this process, never from a parse worker.
+        if self.cache is not None:
+            await loop.run_in_executor(None, patent_info.store_record, self.cache)
+        return patent_info
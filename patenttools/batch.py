@@ -0,0 +1,126 @@
+# Tools for looking up many patents at once.
+# batch_lookup cleans and dedupes a list of patent numbers, then looks them
+# up concurrently with a bounded pool of worker threads. Requests to the
+# USPTO are spaced out by a per-host rate limit, and results are yielded as
+# soon as each lookup completes.
+
+# Import necessary modules
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
+from requests.exceptions import ConnectionError, Timeout
+from lookup import USPTOLookup
+from cache import OfflineCacheMiss
+from metrics import registry
+import config     # User-definable configuration
+
+logger = logging.getLogger(__name__)
+
+# Fields reported for each patent in a batch. Claims and descriptions are
+# left out to keep batch results small.
+SUMMARY_FIELDS = ("title", "filing_date", "assignee", "abstract", "primary_cpc",
+                  "primary_class", "cpc_codes", "cited_us", "cited_for", "cited_us_numbers")
+
+
+class HostRateLimiter:
+
+    """
+    Instances of this class space out requests so that no host receives
+    more than a given number of requests per second. A single instance may
+    be shared by many threads.
+    """
+
+    def __init__(self, rate = config.batch_host_rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        # Block until a request to url's host is allowed. Each caller
+        # reserves the next free slot, then sleeps outside the lock.
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+
+        if slot > now:
+            time.sleep(slot - now)
+        return
+
+
+def dedupe_numbers(raw_nums):
+    # Clean each raw patent number and group the raw inputs by cleaned
+    # number, keeping the order in which numbers first appear. Inputs that
+    # cannot be interpreted are returned separately.
+    numbers = {}
+    unrecognized = []
+    for raw_num in raw_nums:
+        number = USPTOLookup.clean_num(raw_num)
+        if number == "unrecognized input":
+            unrecognized.append(raw_num)
+        else:
+            numbers.setdefault(number, []).append(raw_num)
+    return numbers, unrecognized
+
+
+def summarize(number, inputs, patent_info = None, error = None):
+    # Build the result reported for one patent in a batch.
+    result = {"number" : number, "inputs" : inputs, "error" : error}
+    for field in SUMMARY_FIELDS:
+        result[field] = getattr(patent_info, field, None)
+    return result
+
+
+def lookup_one(number, inputs, cache, limiter, graph = None):
+    # Look up a single patent, reporting any failure in the result rather
+    # than raising it. If a CitationGraph is given, the patent's citations
+    # are recorded in it.
+    try:
+        patent_info = USPTOLookup(number, cache = cache, limiter = limiter)
+    except (ConnectionError, Timeout):
+        return summarize(number, inputs, error = "The USPTO server is unreachable.")
+    except OfflineCacheMiss:
+        return summarize(number, inputs, error = "Offline, and the patent is not cached.")
+    except Exception:
+        # Log the error with its traceback, and count it, rather than lose
+        # it, as frontend does.
+        logger.exception("Error looking up %r in a batch", number)
+        registry.count("patenttools_errors_total", route = "batch")
+        return summarize(number, inputs, error = "An error occured.")
+
+    if patent_info.title is None:
+        return summarize(number, inputs, patent_info, error = "The patent could not be found.")
+    if graph is not None:
+        graph.add(patent_info.number, patent_info.cited_us_numbers)
+    return summarize(number, inputs, patent_info)
+
+
+def batch_lookup(raw_nums, cache = None, workers = config.batch_workers, limiter = None, graph = None):
+    # Look up every patent in raw_nums, yielding one result dict per unique
+    # patent number in order of completion. Inputs that cannot be
+    # interpreted are reported first.
+    numbers, unrecognized = dedupe_numbers(raw_nums)
+    for raw_num in unrecognized:
+        yield summarize(None, [raw_num], error = "The patent number could not be interpreted.")
+
+    if not numbers:
+        return
+    if limiter is None:
+        limiter = HostRateLimiter()
+
+    pool = ThreadPoolExecutor(max_workers = workers)
+    futures = [pool.submit(lookup_one, number, inputs, cache, limiter, graph)
+               for number, inputs in numbers.items()]
+    try:
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        # If the caller stops early, e.g. because a client disconnected,
+        # drop the lookups that have not started yet.
+        for future in futures:
+            future.cancel()
+        pool.shutdown(wait = False)
+    return
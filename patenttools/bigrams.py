@@ -0,0 +1,202 @@
+# A counting engine for ranking the bigrams of a document or corpus.
+# Tokens are encoded as integer ids, and the (possibly non-contiguous)
+# bigrams within each window are counted with NumPy in one pass. The
+# counts are kept, so ranking again with another frequency threshold,
+# bigram count or association measure only filters and scores arrays.
+# Rankings are the same as those of NLTK's BigramCollocationFinder: scores
+# are computed in bulk to find the candidates for the top of the ranking,
+# which are then scored exactly as NLTK scores them and sorted the same way.
+# The exact scores follow NLTK's BigramAssocMeasures operation for operation,
+# so that ranking does not need NLTK, which is slow to import.
+
+# Import necessary modules
+import math
+from collections import Counter
+import numpy as np
+import config     # User-definable configuration
+
+# The association measures available for ranking bigrams.
+MEASURES = ("pmi", "likelihood_ratio", "chi_sq")
+
+# As in NLTK, a tiny constant keeps the likelihood ratio finite.
+SMALL = 1e-20
+
+# Bulk scores may differ from NLTK's in the last few bits. Every bigram
+# scoring within this relative margin of the cutoff is scored exactly.
+SCORE_MARGIN = 1e-6
+
+
+class BigramCounts:
+
+    """
+    Instances of this class hold the word and windowed bigram counts of a
+    document or corpus as arrays, and rank the bigrams by an association
+    measure.
+    """
+
+    def __init__(self, words, word_counts, left, right, counts, window_size = config.bg_win):
+        self.words = words                 # Word of each id
+        self.word_counts = word_counts     # Count of each word, by id
+        self.left = left                   # Ids of each bigram's first word
+        self.right = right                 # Ids of each bigram's second word
+        self.counts = counts               # Count of each bigram
+        self.window_size = window_size
+        self.total = int(word_counts.sum())
+        self._scores = {}
+
+    @classmethod
+    def from_tokens(cls, tokens, window_size = config.bg_win):
+        # Count words and bigrams as BigramCollocationFinder.from_words does:
+        # each token is paired with each of the next window_size - 1 tokens.
+        vocabulary = {}
+        ids = np.fromiter((vocabulary.setdefault(token, len(vocabulary)) for token in tokens),
+                          dtype = np.int64, count = len(tokens))
+        words = list(vocabulary)
+        word_counts = np.bincount(ids, minlength = len(words))
+
+        # Each pair of ids is encoded as one integer, so that equal pairs
+        # can be counted together.
+        size = max(len(words), 1)
+        codes = np.concatenate([ids[:-offset] * size + ids[offset:]
+                                for offset in range(1, window_size) if offset < len(ids)]
+                               or [np.empty(0, dtype = np.int64)])
+        codes, counts = np.unique(codes, return_counts = True)
+        return cls(words, word_counts, codes // size, codes % size, counts, window_size)
+
+    @classmethod
+    def from_freqs(cls, word_freqs, bigram_freqs, window_size = config.bg_win):
+        # Take counts that have already been made, such as the totals kept
+        # by CorpusDistiller.
+        vocabulary = {}
+        word_counts = []
+        for word, count in word_freqs.items():
+            vocabulary[word] = len(vocabulary)
+            word_counts.append(count)
+        left = []
+        right = []
+        counts = []
+        for (first, second), count in bigram_freqs.items():
+            for word in (first, second):
+                if word not in vocabulary:
+                    vocabulary[word] = len(vocabulary)
+                    word_counts.append(0)
+            left.append(vocabulary[first])
+            right.append(vocabulary[second])
+            counts.append(count)
+        return cls(list(vocabulary), np.array(word_counts, dtype = np.int64),
+                   np.array(left, dtype = np.int64), np.array(right, dtype = np.int64),
+                   np.array(counts, dtype = np.int64), window_size)
+
+    def __len__(self):
+        return len(self.counts)
+
+    def freqdist(self):
+        # The bigram counts as a Counter of (word, word) tuples, with the
+        # counts of the ngram_fd of a BigramCollocationFinder.
+        return Counter(dict(zip(self.bigrams(range(len(self))), self.counts.tolist())))
+
+    def bigrams(self, indices):
+        # The (word, word) tuples of the bigrams at the given indices.
+        return [(self.words[first], self.words[second])
+                for first, second in zip(self.left[indices].tolist(), self.right[indices].tolist())]
+
+    def scores(self, measure = config.bg_measure):
+        # Score every bigram at once. Scores are kept for each measure, and
+        # scores that are undefined are ranked last.
+        if measure not in self._scores:
+            if measure not in MEASURES:
+                raise ValueError("unknown association measure: %r" % measure)
+
+            # As in NLTK, bigram counts are scaled by 1 / (window_size - 1).
+            n_ii = self.counts / (self.window_size - 1.0)
+            n_ix = self.word_counts[self.left].astype(np.float64)
+            n_xi = self.word_counts[self.right].astype(np.float64)
+            n_xx = float(self.total)
+            with np.errstate(all = "ignore"):
+                if measure == "pmi":
+                    scores = np.log2(n_ii * n_xx) - np.log2(n_ix * n_xi)
+                else:
+                    n_oi = n_xi - n_ii
+                    n_io = n_ix - n_ii
+                    n_oo = n_xx - n_ii - n_oi - n_io
+                    if measure == "chi_sq":
+                        scores = n_xx * (n_ii * n_oo - n_io * n_oi) ** 2 / (
+                            (n_ii + n_io) * (n_ii + n_oi) * (n_io + n_oo) * (n_oi + n_oo))
+                    else:
+                        # Each cell's expected value is the product of its
+                        # row and column totals over the number of words.
+                        cells = (n_ii, n_oi, n_io, n_oo)
+                        scores = 0
+                        for cell in range(4):
+                            observed = cells[cell]
+                            expected = ((observed + cells[cell ^ 1]) * (observed + cells[cell ^ 2])
+                                        / n_xx)
+                            scores = scores + observed * np.log(observed / (expected + SMALL) + SMALL)
+                        scores = 2 * scores
+            self._scores[measure] = np.where(np.isnan(scores), -np.inf, scores)
+        return self._scores[measure]
+
+    def rank(self, min_freq = config.bg_min_freq, count = config.bg_count,
+             measure = config.bg_measure):
+        # Return the count best bigrams seen at least min_freq times, as
+        # BigramCollocationFinder's apply_freq_filter and nbest would.
+        if measure not in MEASURES:
+            raise ValueError("unknown association measure: %r" % measure)
+        candidates = np.flatnonzero(self.counts >= min_freq)
+        if count <= 0 or len(candidates) == 0:
+            return []
+
+        # Keep only the bigrams that can reach the top of the ranking.
+        scores = self.scores(measure)[candidates]
+        if count < len(candidates):
+            cutoff = np.partition(scores, len(candidates) - count)[len(candidates) - count]
+            if np.isfinite(cutoff):
+                candidates = candidates[scores >= cutoff - SCORE_MARGIN * max(1.0, abs(cutoff))]
+
+        # Score the candidates exactly as NLTK does, and break ties by the
+        # bigram itself.
+        score_fn = EXACT_MEASURES[measure]
+        scored = []
+        for bigram, bigram_count, first, second in zip(self.bigrams(candidates),
+                                                       self.counts[candidates].tolist(),
+                                                       self.left[candidates].tolist(),
+                                                       self.right[candidates].tolist()):
+            n_ii = bigram_count / (self.window_size - 1.0)
+            scored.append((bigram, score_fn(n_ii, (int(self.word_counts[first]),
+                                                   int(self.word_counts[second])), self.total)))
+        scored.sort(key = lambda item: (-item[1], item[0]))
+        return [bigram for bigram, score in scored[:count]]
+
+
+def contingency(n_ii, n_ix_xi_tuple, n_xx):
+    # The contingency table of a bigram, from its marginals.
+    (n_ix, n_xi) = n_ix_xi_tuple
+    n_oi = n_xi - n_ii
+    n_io = n_ix - n_ii
+    return (n_ii, n_oi, n_io, n_xx - n_ii - n_oi - n_io)
+
+
+def pmi(n_ii, n_ix_xi_tuple, n_xx):
+    # Pointwise mutual information, as BigramAssocMeasures.pmi.
+    (n_ix, n_xi) = n_ix_xi_tuple
+    return math.log2(n_ii * n_xx ** 1) - math.log2(1 * n_ix * n_xi)
+
+
+def likelihood_ratio(n_ii, n_ix_xi_tuple, n_xx):
+    # The likelihood ratio, as BigramAssocMeasures.likelihood_ratio.
+    cont = contingency(n_ii, n_ix_xi_tuple, n_xx)
+    n_all = sum(cont)
+    expected = [(cont[i] + cont[i ^ 1]) * (cont[i] + cont[i ^ 2]) / n_all for i in range(4)]
+    return 2 * sum(obs * math.log(obs / (exp + SMALL) + SMALL) for obs, exp in zip(cont, expected))
+
+
+def chi_sq(n_ii, n_ix_xi_tuple, n_xx):
+    # Pearson's chi-square, as BigramAssocMeasures.chi_sq: phi-square
+    # multiplied by the number of words.
+    n_ii, n_io, n_oi, n_oo = contingency(n_ii, n_ix_xi_tuple, n_xx)
+    return n_xx * ((n_ii * n_oo - n_io * n_oi) ** 2 / (
+        (n_ii + n_io) * (n_ii + n_oi) * (n_io + n_oo) * (n_oi + n_oo)))
+
+
+# The exact scoring function of each measure in MEASURES.
+EXACT_MEASURES = {"pmi" : pmi, "likelihood_ratio" : likelihood_ratio, "chi_sq" : chi_sq}
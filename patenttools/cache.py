@@ -0,0 +1,443 @@
+# An on-disk cache of patent pages retrieved from the USPTO.
+# Pages are stored as compressed, content-addressed blobs. A small SQLite
+# index maps each normalized patent number to its blob and records when it
+# was fetched and last used, which provides TTL expiry and LRU eviction.
+# SQLite's file locking makes the cache safe to share between gunicorn
+# worker processes. A hit only reads the index: hit and miss counts and
+# access times are kept in memory and written to it in batches, every few
+# seconds, as the metrics are.
+# Alongside each page, the cache can hold the parsed patent record in a
+# compact binary form, so that repeat lookups skip HTML parsing entirely.
+# Rendered images, such as word clouds, are kept in a separate table with
+# its own size bound.
+
+# Import necessary modules
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+import zlib
+import sqlite_store
+import config     # User-definable configuration
+
+# Parsed records start with a magic tag and the version of the parser that
+# produced them, followed by the zlib-compressed JSON of the fields.
+RECORD_HEADER = struct.Struct(">4sH")
+RECORD_MAGIC = b"PTRC"
+
+
+class OfflineCacheMiss(LookupError):
+
+    """
+    Raised when the cache is in offline mode and does not hold the
+    requested patent.
+    """
+
+
+class PatentCache:
+
+    """
+    Instances of this class store and retrieve raw patent HTML, keyed by the
+    normalized patent number produced by USPTOLookup.clean_num.
+    """
+
+    def __init__(self, cache_dir = config.cache_dir, ttl = config.cache_ttl,
+                 max_bytes = config.cache_max_bytes, offline = config.offline_mode,
+                 image_max_bytes = config.image_cache_max_bytes,
+                 flush_interval = config.cache_flush_interval):
+        self.cache_dir = cache_dir
+        self.blob_dir = os.path.join(cache_dir, "blobs")
+        self.db_path = os.path.join(cache_dir, "index.sqlite3")
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.image_max_bytes = image_max_bytes
+        self.offline = offline
+
+        # Hits and misses seen by this instance. Totals across all worker
+        # processes are available from stats().
+        self.hits = 0
+        self.misses = 0
+        self.record_hits = 0
+        self.record_misses = 0
+        self.image_hits = 0
+        self.image_misses = 0
+
+        # Counts and access times not yet written to the index, by this
+        # process: stat -> count, and (table, key) -> access time.
+        self.flush_interval = flush_interval
+        self._pending_stats = {}
+        self._pending_access = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._timer = None
+
+        os.makedirs(self.blob_dir, exist_ok = True)
+        db = sqlite_store.connect(self.db_path, create = True)
+        try:
+            with db:
+                db.execute("""CREATE TABLE IF NOT EXISTS pages (
+                                  number TEXT PRIMARY KEY,
+                                  digest TEXT NOT NULL,
+                                  size INTEGER NOT NULL,
+                                  fetched REAL NOT NULL,
+                                  accessed REAL NOT NULL,
+                                  record BLOB)""")
+                columns = [row[1] for row in db.execute("PRAGMA table_info(pages)")]
+                if "record" not in columns:
+                    db.execute("ALTER TABLE pages ADD COLUMN record BLOB")
+                db.execute("CREATE INDEX IF NOT EXISTS pages_accessed ON pages (accessed)")
+                db.execute("""CREATE TABLE IF NOT EXISTS images (
+                                  key TEXT PRIMARY KEY,
+                                  data BLOB NOT NULL,
+                                  created REAL NOT NULL,
+                                  accessed REAL NOT NULL)""")
+                db.execute("CREATE INDEX IF NOT EXISTS images_accessed ON images (accessed)")
+                db.execute("""CREATE TABLE IF NOT EXISTS stats (
+                                  name TEXT PRIMARY KEY,
+                                  value INTEGER NOT NULL)""")
+                db.execute("""INSERT OR IGNORE INTO stats VALUES ('hits', 0), ('misses', 0),
+                              ('record_hits', 0), ('record_misses', 0),
+                              ('image_hits', 0), ('image_misses', 0)""")
+        finally:
+            db.close()
+        atexit.register(self.flush)
+
+    def _connect(self):
+        return sqlite_store.connect(self.db_path)
+
+    def _blob_path(self, digest):
+        return os.path.join(self.blob_dir, digest[:2], digest)
+
+    def get(self, number):
+        # Return the cached HTML for a patent number, or None on a miss.
+        # Expired entries count as misses, except in offline mode where a
+        # stale page is better than no page at all.
+        now = time.time()
+        db = self._connect()
+        try:
+            row = db.execute("SELECT digest, fetched FROM pages WHERE number = ?",
+                             (number,)).fetchone()
+            html = None
+            if row is not None and (self.offline or now - row[1] < self.ttl):
+                try:
+                    with open(self._blob_path(row[0]), "rb") as blob:
+                        html = zlib.decompress(blob.read()).decode("utf-8")
+                except (OSError, zlib.error):
+                    # The blob vanished or is damaged; forget the entry.
+                    with sqlite_store.write_transaction(db):
+                        db.execute("DELETE FROM pages WHERE number = ? AND digest = ?", (number, row[0]))
+        finally:
+            db.close()
+
+        if html is None:
+            self.misses += 1
+            self._record_use("misses")
+        else:
+            self.hits += 1
+            self._record_use("hits", ("pages", number), now)
+        return html
+
+    def _record_use(self, stat, entry = None, accessed = None):
+        # Count a hit or miss, and note when an entry, given as (table, key),
+        # was used. Both are written to the index by the next flush, which
+        # is due within flush_interval seconds.
+        with self._lock:
+            self._check_fork()
+            self._pending_stats[stat] = self._pending_stats.get(stat, 0) + 1
+            if entry is not None:
+                self._pending_access[entry] = accessed
+            self._schedule_flush()
+        return
+
+    def _schedule_flush(self):
+        # Flush in flush_interval seconds, unless a flush is already due.
+        # The lock must be held.
+        if self._timer is None:
+            self._timer = threading.Timer(self.flush_interval, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+        return
+
+    def _check_fork(self):
+        # A process forked from one with pending counts starts afresh, so
+        # that they are only counted once. The lock must be held.
+        if os.getpid() != self._pid:
+            self._pending_stats = {}
+            self._pending_access = {}
+            self._timer = None
+            self._pid = os.getpid()
+        return
+
+    def _take_pending(self):
+        with self._lock:
+            self._check_fork()
+            pending = (self._pending_stats, self._pending_access)
+            self._pending_stats = {}
+            self._pending_access = {}
+            self._timer = None
+        return pending
+
+    def _write_pending(self, db, pending):
+        # Apply pending counts and access times within a write transaction.
+        # Access times only move forward, since another worker may have
+        # used an entry since.
+        pending_stats, pending_access = pending
+        db.executemany("UPDATE stats SET value = value + ? WHERE name = ?",
+                       [(count, stat) for stat, count in pending_stats.items()])
+        db.executemany("UPDATE pages SET accessed = MAX(accessed, ?) WHERE number = ?",
+                       [(accessed, key) for (table, key), accessed in pending_access.items()
+                        if table == "pages"])
+        db.executemany("UPDATE images SET accessed = MAX(accessed, ?) WHERE key = ?",
+                       [(accessed, key) for (table, key), accessed in pending_access.items()
+                        if table == "images"])
+        return
+
+    def _restore_pending(self, pending):
+        # Keep pending values that could not be written for the next flush.
+        pending_stats, pending_access = pending
+        with self._lock:
+            for stat, count in pending_stats.items():
+                self._pending_stats[stat] = self._pending_stats.get(stat, 0) + count
+            for entry, accessed in pending_access.items():
+                self._pending_access[entry] = max(accessed, self._pending_access.get(entry, accessed))
+            self._schedule_flush()
+        return
+
+    def flush(self):
+        # Write this process's pending counts and access times to the index.
+        # If it is busy, they are kept for the next flush.
+        pending = self._take_pending()
+        if not any(pending):
+            return
+        db = self._connect()
+        try:
+            with sqlite_store.write_transaction(db):
+                self._write_pending(db, pending)
+        except sqlite3.OperationalError:
+            self._restore_pending(pending)
+        finally:
+            db.close()
+        return
+
+    def put(self, number, html):
+        # Store the HTML for a patent number, then evict the least recently
+        # used pages if the cache has grown beyond its size bound.
+        raw = html.encode("utf-8")
+        digest = hashlib.sha256(raw).hexdigest()
+        data = zlib.compress(raw)
+        now = time.time()
+
+        pending = self._take_pending()
+        db = self._connect()
+        try:
+            # The blob is written inside the write transaction so that a
+            # concurrent eviction cannot remove it before it is indexed.
+            # Pending access times are written first, for the eviction.
+            with sqlite_store.write_transaction(db):
+                self._write_pending(db, pending)
+                replaced = db.execute("SELECT digest FROM pages WHERE number = ?",
+                                      (number,)).fetchone()
+                blob_path = self._blob_path(digest)
+                if not os.path.exists(blob_path):
+                    os.makedirs(os.path.dirname(blob_path), exist_ok = True)
+                    fd, tmp_path = tempfile.mkstemp(dir = os.path.dirname(blob_path))
+                    with os.fdopen(fd, "wb") as tmp:
+                        tmp.write(data)
+                    os.replace(tmp_path, blob_path)
+                # Any parsed record belongs to the old page and is discarded.
+                db.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, NULL)",
+                           (number, digest, len(data), now, now))
+                if replaced is not None and replaced[0] != digest:
+                    self._drop_unreferenced(db, [replaced[0]])
+                self._evict(db)
+        except BaseException:
+            self._restore_pending(pending)
+            raise
+        finally:
+            db.close()
+
+        return
+
+    def _evict(self, db):
+        # Drop least recently used entries until the cache fits within
+        # max_bytes.
+        total = db.execute("""SELECT COALESCE(SUM(size + COALESCE(LENGTH(record), 0)), 0)
+                              FROM pages""").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        dropped = set()
+        for number, digest, size in db.execute(
+                """SELECT number, digest, size + COALESCE(LENGTH(record), 0)
+                   FROM pages ORDER BY accessed""").fetchall():
+            if total <= self.max_bytes:
+                break
+            db.execute("DELETE FROM pages WHERE number = ?", (number,))
+            dropped.add(digest)
+            total -= size
+
+        self._drop_unreferenced(db, dropped)
+        return
+
+    def _drop_unreferenced(self, db, digests):
+        # Delete the blobs among digests that no entry refers to any more.
+        for digest in digests:
+            in_use = db.execute("SELECT 1 FROM pages WHERE digest = ? LIMIT 1",
+                                (digest,)).fetchone()
+            if in_use is None:
+                try:
+                    os.remove(self._blob_path(digest))
+                except FileNotFoundError:
+                    pass
+        return
+
+    def get_record(self, number, version):
+        # Return the parsed fields stored for a patent number as a dict, or
+        # None if there are none, they have expired, or they were produced by
+        # a different parser version.
+        now = time.time()
+        db = self._connect()
+        try:
+            row = db.execute("SELECT record, fetched FROM pages WHERE number = ?",
+                             (number,)).fetchone()
+            fields = None
+            if row is not None and row[0] is not None and (self.offline or now - row[1] < self.ttl):
+                fields = unpack_record(row[0], version)
+        finally:
+            db.close()
+
+        if fields is None:
+            self.record_misses += 1
+            self._record_use("record_misses")
+        else:
+            self.record_hits += 1
+            self._record_use("record_hits", ("pages", number), now)
+        return fields
+
+    def put_record(self, number, version, fields):
+        # Attach parsed fields to the cached page for a patent number. Records
+        # are only kept for pages that are themselves in the cache.
+        pending = self._take_pending()
+        db = self._connect()
+        try:
+            with sqlite_store.write_transaction(db):
+                self._write_pending(db, pending)
+                db.execute("UPDATE pages SET record = ? WHERE number = ?",
+                           (pack_record(version, fields), number))
+                self._evict(db)
+        except BaseException:
+            self._restore_pending(pending)
+            raise
+        finally:
+            db.close()
+
+        return
+
+    def get_image(self, key):
+        # Return the image bytes stored under key, or None if there are none
+        # or they have expired.
+        now = time.time()
+        db = self._connect()
+        try:
+            row = db.execute("SELECT data, created FROM images WHERE key = ?",
+                             (key,)).fetchone()
+            data = None
+            if row is not None and (self.offline or now - row[1] < self.ttl):
+                data = row[0]
+        finally:
+            db.close()
+
+        if data is None:
+            self.image_misses += 1
+            self._record_use("image_misses")
+        else:
+            self.image_hits += 1
+            self._record_use("image_hits", ("images", key), now)
+        return data
+
+    def put_image(self, key, data):
+        # Store image bytes under key, then evict the least recently used
+        # images if they have grown beyond image_max_bytes.
+        now = time.time()
+        pending = self._take_pending()
+        db = self._connect()
+        try:
+            with sqlite_store.write_transaction(db):
+                self._write_pending(db, pending)
+                db.execute("INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?)",
+                           (key, data, now, now))
+                total = db.execute("SELECT COALESCE(SUM(LENGTH(data)), 0) FROM images").fetchone()[0]
+                if total > self.image_max_bytes:
+                    for old_key, size in db.execute("""SELECT key, LENGTH(data) FROM images
+                                                       ORDER BY accessed""").fetchall():
+                        if total <= self.image_max_bytes:
+                            break
+                        db.execute("DELETE FROM images WHERE key = ?", (old_key,))
+                        total -= size
+        except BaseException:
+            self._restore_pending(pending)
+            raise
+        finally:
+            db.close()
+
+        return
+
+    def pages(self, limit = None):
+        # Yield (number, html) for cached pages, largest first, without
+        # counting them as hits or refreshing them. Used by the benchmarks.
+        db = self._connect()
+        try:
+            rows = db.execute("SELECT number, digest FROM pages ORDER BY size DESC LIMIT ?",
+                              (-1 if limit is None else limit,)).fetchall()
+        finally:
+            db.close()
+
+        for number, digest in rows:
+            try:
+                with open(self._blob_path(digest), "rb") as blob:
+                    yield number, zlib.decompress(blob.read()).decode("utf-8")
+            except (OSError, zlib.error):
+                continue
+
+    def stats(self):
+        # Summarize the cache as shared by all processes, including this
+        # process's pending counts.
+        self.flush()
+        db = self._connect()
+        try:
+            counters = dict(db.execute("SELECT name, value FROM stats").fetchall())
+            entries, size = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM pages").fetchone()
+        finally:
+            db.close()
+
+        return {"hits" : counters.get("hits", 0),
+                "misses" : counters.get("misses", 0),
+                "record_hits" : counters.get("record_hits", 0),
+                "record_misses" : counters.get("record_misses", 0),
+                "image_hits" : counters.get("image_hits", 0),
+                "image_misses" : counters.get("image_misses", 0),
+                "entries" : entries,
+                "bytes" : size}
+
+
+def pack_record(version, fields):
+    # Serialize a dict of parsed patent fields into a versioned binary record.
+    payload = json.dumps(fields, separators = (",", ":")).encode("utf-8")
+    return RECORD_HEADER.pack(RECORD_MAGIC, version) + zlib.compress(payload)
+
+
+def unpack_record(record, version):
+    # Deserialize a binary record. Records written by another parser version,
+    # or that cannot be read, are treated as absent.
+    try:
+        magic, record_version = RECORD_HEADER.unpack_from(record)
+        if magic != RECORD_MAGIC or record_version != version:
+            return None
+        return json.loads(zlib.decompress(record[RECORD_HEADER.size:]).decode("utf-8"))
+    except (struct.error, zlib.error, ValueError):
+        return None
@@ -0,0 +1,327 @@
+# A persistent graph of the citations between patents that have been
+# looked up, with forward ("which patents does this one cite?") and
+# backward ("which patents cite this one?") queries.
+# Citations are recorded in an SQLite database next to the page cache, so
+# that every gunicorn worker can add to them. The citations of one patent,
+# either way, are read from the database by index. Multi-hop queries are
+# answered from a compact snapshot of the graph in CSR form: for each
+# direction, the sorted patent numbers, the offset of each patent's
+# neighbours, and the neighbours themselves, as flat NumPy arrays.
+# Snapshots are written to disk and memory-mapped, so all workers share
+# them. Since writing one takes time in proportion to the whole graph, a
+# snapshot is rebuilt at most once every citation_rebuild_interval seconds,
+# so multi-hop queries may miss citations added since.
+# Optionally, a CitationPrefetcher fetches the pages of cited patents into
+# the cache in the background, so that following a citation is fast.
+
+# Import necessary modules
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from requests.exceptions import ConnectionError, Timeout
+from lookup import USPTOLookup
+from cache import OfflineCacheMiss
+import sqlite_store
+import config     # User-definable configuration
+
+# The arrays of a snapshot. Patent numbers are stored as 32-bit integers.
+DIRECTIONS = ("forward", "backward")
+ARRAYS = ("nodes", "indptr", "indices")
+
+
+class CitationGraph:
+
+    """
+    Instances of this class record which patents cite which, and answer
+    forward, backward and k-hop citation queries over all of the patents
+    that have been added.
+    """
+
+    def __init__(self, path = config.citation_path, refresh = config.citation_refresh,
+                 rebuild_interval = config.citation_rebuild_interval):
+        self.path = path
+        self.db_path = os.path.join(path, "edges.sqlite3")
+        self.refresh = refresh
+        self.rebuild_interval = rebuild_interval
+        self._lock = threading.Lock()
+        self._version = None
+        self._arrays = None
+        self._checked = None      # When the stored version was last read
+
+        os.makedirs(path, exist_ok = True)
+        db = sqlite_store.connect(self.db_path, create = True)
+        try:
+            with db:
+                db.execute("""CREATE TABLE IF NOT EXISTS meta (
+                                  name TEXT PRIMARY KEY,
+                                  value INTEGER NOT NULL)""")
+                db.execute("""CREATE TABLE IF NOT EXISTS patents (
+                                  number INTEGER PRIMARY KEY)""")
+                db.execute("""CREATE TABLE IF NOT EXISTS citations (
+                                  citing INTEGER NOT NULL,
+                                  cited INTEGER NOT NULL,
+                                  PRIMARY KEY (citing, cited)) WITHOUT ROWID""")
+                db.execute("CREATE INDEX IF NOT EXISTS citations_cited ON citations (cited, citing)")
+                db.execute("INSERT OR IGNORE INTO meta VALUES ('version', 0)")
+        finally:
+            db.close()
+
+    def _connect(self):
+        return sqlite_store.connect(self.db_path)
+
+    def __len__(self):
+        db = self._connect()
+        try:
+            return db.execute("SELECT COUNT(*) FROM patents").fetchone()[0]
+        finally:
+            db.close()
+
+    def __contains__(self, number):
+        db = self._connect()
+        try:
+            return db.execute("SELECT 1 FROM patents WHERE number = ?",
+                              (int(number),)).fetchone() is not None
+        finally:
+            db.close()
+
+    def add(self, number, cited_numbers):
+        # Record the US patents a patent cites, replacing any citations
+        # recorded for it before. Nothing is written if they are unchanged,
+        # or unknown (None), as for a patent that could not be found. Since
+        # every lookup records its citations, and most are unchanged, they
+        # are compared first without taking the write lock.
+        if cited_numbers is None:
+            return
+        number = int(number)
+        cited = set(int(cited_num) for cited_num in cited_numbers)
+        db = self._connect()
+        try:
+            if self._recorded(db, number) == cited:
+                return
+            with sqlite_store.write_transaction(db):
+                if self._recorded(db, number) == cited:
+                    return
+                db.execute("INSERT OR IGNORE INTO patents VALUES (?)", (number,))
+                db.execute("DELETE FROM citations WHERE citing = ?", (number,))
+                db.executemany("INSERT INTO citations VALUES (?, ?)",
+                               [(number, cited_num) for cited_num in sorted(cited)])
+                db.execute("UPDATE meta SET value = value + 1 WHERE name = 'version'")
+        finally:
+            db.close()
+
+        # Let the next multi-hop query check whether a new snapshot is due.
+        self._checked = None
+        return
+
+    def _recorded(self, db, number):
+        # The patents recorded as cited by a patent, as a set, or None if the
+        # patent itself has not been recorded.
+        if db.execute("SELECT 1 FROM patents WHERE number = ?", (number,)).fetchone() is None:
+            return None
+        return set(row[0] for row in db.execute("SELECT cited FROM citations WHERE citing = ?", (number,)))
+
+    def _snapshot_dir(self, version):
+        return os.path.join(self.path, "csr-%d" % version)
+
+    def _snapshots(self):
+        # The versions of the snapshots on disk, oldest first.
+        return sorted(int(name[len("csr-"):]) for name in os.listdir(self.path)
+                      if name.startswith("csr-") and name[len("csr-"):].isdigit())
+
+    def _write_snapshot(self, db, version):
+        # Build the CSR arrays for both directions from the recorded
+        # citations and write them to the snapshot directory for a version.
+        # The directory is renamed into place once complete, so other
+        # workers never read a partial snapshot.
+        edges = np.array(db.execute("SELECT citing, cited FROM citations ORDER BY citing, cited").fetchall(),
+                         dtype = np.uint32).reshape(-1, 2)
+        temp_dir = tempfile.mkdtemp(dir = self.path, prefix = ".csr-")
+        try:
+            for direction, (source, target) in zip(DIRECTIONS, ((0, 1), (1, 0))):
+                order = np.lexsort((edges[:, target], edges[:, source]))
+                sources = edges[order, source]
+                nodes, starts = np.unique(sources, return_index = True)
+                arrays = {"nodes" : nodes,
+                          "indptr" : np.append(starts, len(sources)).astype(np.int64),
+                          "indices" : edges[order, target]}
+                for name in ARRAYS:
+                    np.save(os.path.join(temp_dir, "%s-%s.npy" % (direction, name)), arrays[name])
+            os.rename(temp_dir, self._snapshot_dir(version))
+        except OSError:
+            # Another worker wrote the same snapshot first.
+            shutil.rmtree(temp_dir, ignore_errors = True)
+        return
+
+    def _remove_old_snapshots(self, versions, now):
+        # A snapshot is removed once a newer one has been in place for a
+        # full rebuild interval, by when every worker has moved on to it.
+        for version, newer in zip(versions, versions[1:]):
+            try:
+                replaced = os.path.getmtime(self._snapshot_dir(newer))
+            except OSError:
+                continue
+            if now - replaced > self.rebuild_interval + self.refresh:
+                shutil.rmtree(self._snapshot_dir(version), ignore_errors = True)
+        return
+
+    def _load_snapshot(self, version):
+        return {(direction, name) : np.load(os.path.join(self._snapshot_dir(version),
+                                                         "%s-%s.npy" % (direction, name)), mmap_mode = "r")
+                for direction in DIRECTIONS for name in ARRAYS}
+
+    def arrays(self):
+        # Return the memory-mapped CSR arrays of the latest snapshot, as a
+        # dict of (direction, name) -> array. A new snapshot is written when
+        # the graph has changed and the latest is more than rebuild_interval
+        # seconds old. Other workers' snapshots are noticed within
+        # self.refresh seconds.
+        with self._lock:
+            now = time.monotonic()
+            if self._checked is not None and now - self._checked < self.refresh:
+                return self._arrays
+
+            db = self._connect()
+            try:
+                version = db.execute("SELECT value FROM meta WHERE name = 'version'").fetchone()[0]
+                versions = self._snapshots()
+                latest = versions[-1] if versions else None
+                if latest != version:
+                    stale = latest is None or time.time() - os.path.getmtime(self._snapshot_dir(latest)) \
+                                              >= self.rebuild_interval
+                    if stale:
+                        self._write_snapshot(db, version)
+                        versions = self._snapshots()
+                        latest = versions[-1]
+                if latest != self._version:
+                    try:
+                        self._arrays = self._load_snapshot(latest)
+                        self._version = latest
+                    except FileNotFoundError:
+                        # Removed by another worker as we read it; the
+                        # next query loads a newer snapshot.
+                        pass
+                self._remove_old_snapshots(versions, time.time())
+            finally:
+                db.close()
+            self._checked = now
+            return self._arrays
+
+    def _neighbors(self, numbers, direction):
+        # The neighbours of an array of patent numbers in one direction, as
+        # one array (with repeats if the patents share neighbours).
+        arrays = self.arrays()
+        nodes = arrays[(direction, "nodes")]
+        indptr = arrays[(direction, "indptr")]
+        if len(nodes) == 0 or len(numbers) == 0:
+            return np.empty(0, dtype = np.uint32)
+        positions = np.searchsorted(nodes, numbers).clip(max = len(nodes) - 1)
+        positions = positions[nodes[positions] == numbers]
+        starts = indptr[positions]
+        lengths = indptr[positions + 1] - starts
+
+        # Gather every patent's slice of the neighbour array at once.
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        return np.asarray(arrays[(direction, "indices")][offsets + np.arange(lengths.sum())])
+
+    def cites(self, number):
+        # The patents a patent cites, as a sorted list of patent numbers.
+        db = self._connect()
+        try:
+            return [str(row[0]) for row in db.execute("SELECT cited FROM citations WHERE citing = ? ORDER BY cited",
+                                                      (int(number),))]
+        finally:
+            db.close()
+
+    def cited_by(self, number):
+        # The patents citing a patent, as a sorted list of patent numbers.
+        db = self._connect()
+        try:
+            return [str(row[0]) for row in db.execute("SELECT citing FROM citations WHERE cited = ? ORDER BY citing",
+                                                      (int(number),))]
+        finally:
+            db.close()
+
+    def expand(self, numbers, hops = 1, direction = "forward"):
+        # Find the patents within a number of citation hops of the given
+        # patents, following citations "forward", "backward" or "both" ways,
+        # in the latest snapshot. Returns a dict of patent number -> hops
+        # away, including the given patents themselves at 0.
+        directions = DIRECTIONS if direction == "both" else (direction,)
+        if any(each not in DIRECTIONS for each in directions):
+            raise ValueError("direction must be 'forward', 'backward' or 'both'")
+
+        frontier = np.unique(np.array([int(number) for number in numbers], dtype = np.uint32))
+        distances = {str(number) : 0 for number in frontier}
+        visited = frontier
+        for hop in range(1, hops + 1):
+            reached = np.unique(np.concatenate([self._neighbors(frontier, each) for each in directions]))
+            frontier = np.setdiff1d(reached, visited, assume_unique = True)
+            if len(frontier) == 0:
+                break
+            distances.update((str(number), hop) for number in frontier)
+            visited = np.union1d(visited, frontier)
+        return distances
+
+
+class CitationPrefetcher:
+
+    """
+    Instances of this class look up cited patents in the background, so
+    that their pages and parsed records are in the cache before anyone
+    follows the citation. Lookups share a HostRateLimiter with other
+    requests to the USPTO.
+    """
+
+    def __init__(self, cache, graph = None, limiter = None,
+                 workers = config.citation_prefetch_workers,
+                 max_per_patent = config.citation_prefetch_max,
+                 backlog = config.citation_prefetch_backlog):
+        self.cache = cache
+        self.graph = graph
+        self.limiter = limiter
+        self.max_per_patent = max_per_patent
+        self.backlog = backlog
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers = workers, thread_name_prefix = "prefetch")
+
+    def submit(self, numbers):
+        # Queue lookups of up to max_per_patent of the given patent numbers.
+        # Patents already queued are skipped, as are all patents once the
+        # backlog is full or when the cache is offline.
+        if self.cache.offline:
+            return
+        for number in numbers[:self.max_per_patent]:
+            with self._lock:
+                if number in self._pending or len(self._pending) >= self.backlog:
+                    continue
+                self._pending.add(number)
+            self._pool.submit(self._prefetch, number)
+        return
+
+    def _prefetch(self, number):
+        # Look up one patent, which stores its page and record in the cache,
+        # and record its own citations.
+        try:
+            patent_info = USPTOLookup(number, cache = self.cache, limiter = self.limiter)
+            if self.graph is not None and patent_info.title is not None:
+                self.graph.add(patent_info.number, patent_info.cited_us_numbers or [])
+        except (ConnectionError, Timeout, OfflineCacheMiss):
+            pass
+        except Exception:
+            # A prefetch is only a hint. Any error will be reported if the
+            # patent is looked up itself.
+            pass
+        finally:
+            with self._lock:
+                self._pending.discard(number)
+        return
+
+    def shutdown(self):
+        # Drop queued lookups and wait for those in progress.
+        self._pool.shutdown(wait = True, cancel_futures = True)
+        return
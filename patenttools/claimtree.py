@@ -0,0 +1,110 @@
+# The structure of a patent's claims.
+# parse_us_pat reads the claims as a flat list of text fragments, split
+# wherever the page has markup, and including blank strings. A
+# ClaimTreeBuilder is fed each fragment as it is cleaned, in the same pass,
+# and assembles numbered claims: each claim's text, its word count, and the
+# earlier claims it depends on ("The method of claim 3, wherein ...").
+# The result is a list of plain dicts, so that it can be cached with the
+# other parsed fields, and the functions below read the dependency graph
+# from it without looking at the claim text again.
+
+# Import necessary modules
+import re
+
+# A claim starts with its number, as in "12. The device of claim 1, ...".
+CLAIM_NUMBER = re.compile(r"(\d+)\s*\.\s*")
+
+# References to other claims: "claim 3", "claims 1 or 2", "claims 1-5",
+# "any one of claims 1 to 4", "claims 1, 2 and 6".
+CLAIM_REFERENCE = re.compile(r"\bclaims?\s+(\d+(?:\s*(?:,|-|–|to|through|or|and|and/or)\s*(?:claims?\s+)?\d+)*)",
+                             re.IGNORECASE)
+CLAIM_RANGE = re.compile(r"(\d+)\s*(?:-|–|to|through)\s*(?:claims?\s+)?(\d+)")
+DIGITS = re.compile(r"\d+")
+
+
+class ClaimTreeBuilder:
+
+    """
+    Instances of this class are fed the cleaned fragments of a patent's
+    claims section in order, and assemble them into numbered claims.
+    """
+
+    def __init__(self):
+        self.claims = []
+        self._parts = []          # Fragments of the claim being read
+
+    def add(self, fragment):
+        # Take the next fragment. A fragment that starts with the next claim
+        # number begins a new claim; any other continues the current claim.
+        # Fragments before the first claim, like "What is claimed is:", and
+        # blank fragments are skipped.
+        if not fragment:
+            return
+        match = CLAIM_NUMBER.match(fragment)
+        if match is not None and int(match.group(1)) == len(self.claims) + 1:
+            self._finish()
+            self.claims.append({"number" : len(self.claims) + 1})
+            fragment = fragment[match.end():]
+            if not fragment:
+                return
+        if self.claims:
+            self._parts.append(fragment)
+        return
+
+    def _finish(self):
+        # Complete the claim being read, if any.
+        if not self.claims or "text" in self.claims[-1]:
+            return
+        claim = self.claims[-1]
+        claim["text"] = " ".join(self._parts)
+        claim["words"] = len(claim["text"].split())
+        claim["depends_on"] = self._references(claim["text"], claim["number"])
+        self._parts = []
+        return
+
+    def _references(self, text, number):
+        # Return the earlier claims a claim's text refers to, in order. A
+        # claim can only depend on claims before it, so other numbers are
+        # ignored, and a range such as "claims 1-999999" stops at the claim
+        # before this one.
+        referenced = []
+        for match in CLAIM_REFERENCE.finditer(text):
+            numbers = match.group(1)
+            for first, last in CLAIM_RANGE.findall(numbers):
+                referenced.extend(range(int(first), min(int(last), number - 1) + 1))
+            referenced.extend(int(digits) for digits in DIGITS.findall(CLAIM_RANGE.sub(" ", numbers)))
+        return sorted(reference for reference in set(referenced) if 0 < reference < number)
+
+    def tree(self):
+        # Return the claims read so far, as a list of dicts in claim order.
+        self._finish()
+        return self.claims
+
+
+def independent_claims(claim_tree):
+    # The numbers of the claims that depend on no other claim.
+    return [claim["number"] for claim in claim_tree if not claim["depends_on"]]
+
+
+
+def dependency_graph(claim_tree):
+    # Map each claim number to the numbers of the claims that depend on it
+    # directly.
+    dependents = {claim["number"] : [] for claim in claim_tree}
+    for claim in claim_tree:
+        for parent in claim["depends_on"]:
+            dependents[parent].append(claim["number"])
+    return dependents
+
+
+def claim_roots(claim_tree):
+    # Map each claim number to the independent claims it ultimately depends
+    # on. An independent claim is its own root.
+    roots = {}
+    for claim in claim_tree:
+        if claim["depends_on"]:
+            roots[claim["number"]] = sorted(set(root for parent in claim["depends_on"]
+                                                for root in roots[parent]))
+        else:
+            roots[claim["number"]] = [claim["number"]]
+    return roots
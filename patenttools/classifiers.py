@@ -1,5 +1,18 @@
 # These CPC codes are international classifiers for patents.
-# This dict is imported by patenttools.lookup and is used to provide the "patent class".
+# These dicts are the source of cpctree.bin, which patenttools.lookup reads
+# to provide the "patent class". Run cpctree.py after changing them.
+cpc_sections = {
+    'A': 'HUMAN NECESSITIES',
+    'B': 'PERFORMING OPERATIONS, TRANSPORTING',
+    'C': 'CHEMISTRY, METALLURGY',
+    'D': 'TEXTILES, PAPER',
+    'E': 'FIXED CONSTRUCTIONS',
+    'F': 'MECHANICAL ENGINEERING, LIGHTING, HEATING, WEAPONS, BLASTING',
+    'G': 'PHYSICS',
+    'H': 'ELECTRICITY',
+    'Y': 'GENERAL TAGGING OF NEW TECHNOLOGICAL DEVELOPMENTS'
+}
+
 cpc_codes = {
     'B29L': 'INDEXING SCHEME ASSOCIATED WITH SUBCLASS B29C, RELATING TO PARTICULAR ARTICLES',
     'D01D': 'MECHANICAL METHODS OR APPARATUS IN THE MANUFACTURE OF ARTIFICIAL FILAMENTS, THREADS, FIBRES, BRISTLES OR RIBBONS',
@@ -1,6 +1,8 @@
 # User-definable configuration for PatentTools.
 # Variables defined here are imported by outside functions as needed.
 
+import os
+
 # Define stop words to be ignored in word frequency counts and related
 # analyses.
 tech_stopwords = ["comprising", 
@@ -219,3 +221,136 @@ eng_stopwords = ['i',
 bg_win = 3         # Window size for bigrams
 bg_min_freq = 4    # Frequency threshold for bigrams
 bg_count = 10      # Total number of bigrams to find
+bg_measure = "pmi" # Ranking measure: "pmi", "likelihood_ratio" or "chi_sq"
+
+# Define parameters for identifying key phrases of several words: phrase
+# lengths, minimum frequency threshold for inclusion, and total number to
+# find. Phrases are counted approximately, in a count-min sketch of depth x
+# width counters, and at most ngram_capacity candidate phrases are kept,
+# which bounds the memory used for a document of any length.
+ngram_sizes = (3, 4)        # Lengths of phrases, in words
+ngram_min_freq = 3          # Frequency threshold for phrases
+ngram_count = 10            # Total number of phrases to find
+ngram_sketch_width = 2 ** 17
+ngram_sketch_depth = 4
+ngram_capacity = 2000
+
+# Select the tokenizer used by TextDistiller: "fast" splits cleaned text
+# itself, "nltk" uses NLTK's word_tokenize. Both give the same tokens.
+tokenizer = "fast"
+
+# Define parameters for the on-disk cache of patent pages fetched from the
+# USPTO. The cache directory may be shared by several gunicorn workers; by
+# default it is patenttools/cache, wherever the app is run from.
+cache_dir = os.environ.get("PATENTTOOLS_CACHE_DIR",
+                           os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache"))
+cache_ttl = 7 * 24 * 60 * 60        # Seconds before a cached page is refetched
+cache_max_bytes = 256 * 1024 ** 2   # Size bound for cached pages (LRU eviction)
+image_cache_max_bytes = 64 * 1024 ** 2  # Size bound for cached word cloud images
+cache_flush_interval = 5            # Seconds between writes of hit counts and access times
+offline_mode = os.environ.get("PATENTTOOLS_OFFLINE", "") == "1"  # Serve only from the cache
+
+# Select the engine used to parse patent pages: "stream" reads each page in
+# a single pass, "soup" walks a BeautifulSoup tree. Both give the same fields.
+parser_engine = "stream"
+
+# Define parameters for batch lookups: the number of patents looked up at
+# once, the maximum number of requests per second sent to any one host, and
+# the largest batch accepted by the /batch route.
+batch_workers = 8
+batch_host_rate = 4.0
+batch_max_size = 2000
+
+# Define the server patent pages are fetched from. The benchmarks point this
+# at a local stand-in for patft (see benchmarks/patft_server.py).
+patft_base_url = os.environ.get("PATENTTOOLS_PATFT_URL", "http://patft.uspto.gov")
+
+# Define parameters for fetching pages from the USPTO: timeouts in seconds
+# for connecting and for each read, and, for asynchronous lookups, the
+# number of retries after a server error or connection failure, the base
+# delay between retries, and the maximum number of requests in flight.
+fetch_connect_timeout = 5
+fetch_read_timeout = 30
+fetch_retries = 3
+fetch_backoff = 0.5
+fetch_concurrency = 16
+
+# Define how long browsers and proxies may reuse a word cloud image, in
+# seconds.
+wordcloud_max_age = 24 * 60 * 60
+
+# Define parameters for the index of similar patents: where it is stored,
+# the number of MinHash permutations and LSH bands (patents whose token sets
+# overlap by more than about (1 / bands) ** (bands / perms) are likely to
+# be found), how much of it to memory-map, and how many similar patents to
+# show on the results page.
+simindex_path = os.path.join(cache_dir, "similarity.sqlite3")
+simindex_perms = 128
+simindex_bands = 32
+simindex_mmap_bytes = 256 * 1024 ** 2
+similar_count = 5
+
+# Define parameters for the graph of citations between looked-up patents:
+# where it is stored, how often (in seconds) each worker checks for a newer
+# snapshot of it for multi-hop queries, and how often (in seconds) at most
+# a snapshot is rebuilt with the citations added since the last one. With
+# citation_prefetch, the pages of the patents a looked-up patent cites (up
+# to citation_prefetch_max of them) are fetched into the cache in the
+# background, by citation_prefetch_workers threads per worker, with at most
+# citation_prefetch_backlog pages waiting.
+citation_path = os.path.join(cache_dir, "citations")
+citation_refresh = 5
+citation_rebuild_interval = 60
+citation_prefetch = os.environ.get("PATENTTOOLS_PREFETCH", "") == "1"
+citation_prefetch_max = 25
+citation_prefetch_workers = 2
+citation_prefetch_backlog = 200
+
+# Define parameters for latency metrics: where the totals of all workers
+# are kept, how soon (in seconds) each worker adds its own to them, and the
+# upper bounds of the histogram buckets for the time taken by each stage.
+metrics_path = os.path.join(cache_dir, "metrics.sqlite3")
+metrics_flush_interval = 5
+metrics_buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Define parameters for coalescing concurrent requests for the same patent:
+# the directory of the lock files that let workers wait for one another,
+# the number of lock files, which keys share by hash, and the longest time
+# (in seconds) a request waits for another worker before doing the work
+# itself.
+singleflight_dir = os.path.join(cache_dir, "flights")
+singleflight_slots = 256
+singleflight_timeout = 60
+
+# Define parameters for the JSON API: the seconds for which clients and
+# proxies may reuse a response, and the smallest response (in bytes) that
+# is gzipped for clients that accept it, at the given compression level.
+api_max_age = 300
+api_gzip_min_bytes = 1024
+api_gzip_level = 6
+
+# Define parameters for background jobs, which look up and distill patents
+# for results pages in jobs_workers runner processes shared by all workers
+# (0 to do the work within the request instead): where the queue of jobs
+# is kept, the most unfinished jobs allowed before requests are refused,
+# the seconds for which finished jobs are kept, the seconds after which an
+# unfinished job, or a job that no runner has started, is given up, how
+# long (in seconds) /results waits for a job before sending the browser to
+# a waiting page, how often that page is refreshed, how often an idle
+# runner checks for jobs, and how often it records that it is alive. Under gunicorn, the master forks the runners
+# after preloading the app; otherwise, a worker that finds no runner alive
+# starts its own, with jobs_start_method ("forkserver", since a process
+# forked from a threaded server can inherit a lock that is never released),
+# and waits jobs_runner_start_time seconds for them before trying again.
+jobs_path = os.path.join(cache_dir, "jobs.sqlite3")
+jobs_workers = 2
+jobs_max_depth = 32
+jobs_ttl = 10 * 60
+jobs_timeout = 5 * 60
+jobs_start_timeout = 30
+jobs_inline_wait = 0.5
+jobs_poll_interval = 1
+jobs_poll = 0.05
+jobs_heartbeat = 2
+jobs_start_method = "forkserver"
+jobs_runner_start_time = 30
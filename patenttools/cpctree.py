@@ -0,0 +1,224 @@
+# The Cooperative Patent Classification (CPC) hierarchy.
+# A CPC code such as "G06F 3/0488" names a section (G), a class (G06), a
+# subclass (G06F), a main group (G06F 3/00) and a subgroup (G06F 3/0488).
+# Titles are known for sections and subclasses. They are kept in a small
+# prebuilt binary file, cpctree.bin, which is memory-mapped rather than
+# parsed when a worker starts, and indexed so that finding a title takes a
+# fixed number of steps however many codes there are:
+#   header     "<4sIII": magic, number of classes, number of subclasses,
+#              offset of the titles
+#   classes    int16 per possible class (9 sections x 100 class numbers):
+#              the class's row in the subclass table, or -1
+#   subclasses (uint32 offset, uint32 length) of the title of each of the 26
+#              subclasses of each class present, or NO_TITLE
+#   sections   (uint32 offset, uint32 length) of each section's title
+#   codes      the subclass codes present, sorted, 4 ASCII bytes each, for
+#              prefix queries
+#   titles     UTF-8 text
+# Run this module to rebuild the file from classifiers.py.
+
+# Import necessary modules
+import bisect
+import mmap
+import os
+import re
+import struct
+import sys
+
+TREE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cpctree.bin")
+
+MAGIC = b"CPC1"
+HEADER = struct.Struct("<4sIII")
+ENTRY = struct.Struct("<II")
+SECTIONS = "ABCDEFGHY"
+NO_TITLE = 0xFFFFFFFF
+
+# A full or partial CPC code: a section letter, then optionally a two-digit
+# class number, a subclass letter, and a group as in "3/0488".
+CPC_CODE = re.compile(r"([A-HY])(?:(\d\d)(?:([A-Z])(?:\s*(\d{1,4})(?:\s*/\s*(\d{2,6}))?)?)?)?$")
+
+
+def normalize_code(code):
+    # Write a code as the USPTO does, e.g. "g06f3/488" -> "G06F 3/488".
+    # Returns None if the text is not a CPC code.
+    match = CPC_CODE.match(code.strip().upper())
+    if match is None:
+        return None
+    section, class_num, letter, group, subgroup = match.groups()
+    normalized = section + (class_num or "") + (letter or "")
+    if group is not None:
+        normalized += " " + group + ("/" + subgroup if subgroup is not None else "")
+    return normalized
+
+
+def hierarchy(code):
+    # The codes above a code and the code itself, from its section down,
+    # e.g. "G06F 3/0488" -> ["G", "G06", "G06F", "G06F 3/00", "G06F 3/0488"].
+    code = normalize_code(code)
+    if code is None:
+        return []
+    levels = [code[:1]]
+    if len(code) >= 3:
+        levels.append(code[:3])
+    if len(code) >= 4:
+        levels.append(code[:4])
+    if " " in code:
+        main_group = code[:4] + " " + code[5:].split("/")[0] + "/00"
+        levels.append(main_group)
+        if code != main_group:
+            levels.append(code)
+    return levels
+
+
+def split_codes(text):
+    # Read every CPC code from the text of a patent's "Current CPC Class"
+    # field, e.g. "G06F 3/0488 (20130101); H04L 9/32 (20130101)", in order
+    # and without repeats.
+    codes = []
+    for part in text.split(";"):
+        code = normalize_code(re.sub(r"\(.*?\)", " ", part))
+        if code is not None and code not in codes:
+            codes.append(code)
+    return codes
+
+
+def class_slot(code):
+    # The position of a code's class in the class table, or None.
+    if len(code) < 3 or code[0] not in SECTIONS or not code[1:3].isdigit():
+        return None
+    return SECTIONS.index(code[0]) * 100 + int(code[1:3])
+
+
+class CpcTree:
+
+    """
+    Instances of this class read the CPC hierarchy from a prebuilt,
+    memory-mapped file, and look up the titles of codes.
+    """
+
+    def __init__(self, path = TREE_PATH):
+        if not os.path.exists(path):
+            build_tree(path)
+        with open(path, "rb") as tree_file:
+            self._map = mmap.mmap(tree_file.fileno(), 0, access = mmap.ACCESS_READ)
+
+        magic, self.n_classes, self.n_subclasses, self._titles = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError("%s is not a CPC hierarchy file" % path)
+        self._classes = HEADER.size
+        self._subclasses = self._classes + 2 * len(SECTIONS) * 100
+        self._sections = self._subclasses + ENTRY.size * 26 * self.n_classes
+        self._codes = self._sections + ENTRY.size * len(SECTIONS)
+
+    def __len__(self):
+        return self.n_subclasses
+
+    def __contains__(self, code):
+        return self._entry(code.strip().upper()) is not None
+
+    def _entry(self, code):
+        # The (offset, length) of the title of a section or subclass code,
+        # without the group, or None if it is not in the file.
+        if len(code) == 1:
+            if code not in SECTIONS:
+                return None
+            entry = ENTRY.unpack_from(self._map, self._sections + ENTRY.size * SECTIONS.index(code))
+        else:
+            slot = class_slot(code)
+            if slot is None or len(code) < 4 or not "A" <= code[3] <= "Z":
+                return None
+            row = struct.unpack_from("<h", self._map, self._classes + 2 * slot)[0]
+            if row < 0:
+                return None
+            entry = ENTRY.unpack_from(self._map, self._subclasses + ENTRY.size * (26 * row + ord(code[3]) - 65))
+        return None if entry[0] == NO_TITLE else entry
+
+    def title(self, code):
+        # The title of a code's subclass, or of its section if the code names
+        # only a section, or None if it is unknown. Groups and classes have
+        # no titles of their own here.
+        code = code.strip().upper()
+        entry = self._entry(code[:4] if len(code) >= 4 else code)
+        if entry is None:
+            return None
+        offset, length = entry
+        return self._map[self._titles + offset:self._titles + offset + length].decode("utf-8")
+
+    def _code(self, index):
+        start = self._codes + 4 * index
+        return self._map[start:start + 4].decode("ascii")
+
+    def with_prefix(self, prefix):
+        # The subclass codes that start with a prefix, such as "H04" or "G",
+        # in order. Codes are found by binary search on the sorted table.
+        prefix = prefix.strip().upper()[:4]
+        codes = _CodeView(self)
+        first = bisect.bisect_left(codes, prefix)
+        last = bisect.bisect_left(codes, prefix + "\x7f", lo = first)
+        return [self._code(index) for index in range(first, last)]
+
+    def close(self):
+        self._map.close()
+        return
+
+
+class _CodeView:
+
+    """
+    A read-only sequence view of the sorted subclass codes, for bisect.
+    """
+
+    def __init__(self, tree):
+        self.tree = tree
+
+    def __len__(self):
+        return self.tree.n_subclasses
+
+    def __getitem__(self, index):
+        return self.tree._code(index)
+
+
+def build_tree(path = TREE_PATH, subclass_titles = None, section_titles = None):
+    # Write the hierarchy file from dicts of subclass and section code ->
+    # title, by default those in classifiers.py. The file is written under a
+    # temporary name and renamed into place.
+    if subclass_titles is None or section_titles is None:
+        import classifiers
+        subclass_titles = subclass_titles or classifiers.cpc_codes
+        section_titles = section_titles or classifiers.cpc_sections
+
+    titles = bytearray()
+
+    def add_title(title):
+        encoded = title.encode("utf-8")
+        titles.extend(encoded)
+        return ENTRY.pack(len(titles) - len(encoded), len(encoded))
+
+    codes = sorted(code for code in subclass_titles if class_slot(code) is not None and len(code) == 4)
+    class_codes = sorted(set(code[:3] for code in codes))
+    class_rows = {class_code : row for row, class_code in enumerate(class_codes)}
+
+    class_table = [-1] * (len(SECTIONS) * 100)
+    for class_code, row in class_rows.items():
+        class_table[class_slot(class_code)] = row
+    subclass_table = [ENTRY.pack(NO_TITLE, 0)] * (26 * len(class_codes))
+    for code in codes:
+        subclass_table[26 * class_rows[code[:3]] + ord(code[3]) - 65] = add_title(subclass_titles[code])
+    section_table = [add_title(section_titles[section]) if section in section_titles else ENTRY.pack(NO_TITLE, 0)
+                     for section in SECTIONS]
+
+    body = b"".join([struct.pack("<%dh" % len(class_table), *class_table),
+                     b"".join(subclass_table),
+                     b"".join(section_table),
+                     "".join(codes).encode("ascii")])
+    header = HEADER.pack(MAGIC, len(class_codes), len(codes), HEADER.size + len(body))
+
+    temp_path = "%s.%d.tmp" % (path, os.getpid())
+    with open(temp_path, "wb") as tree_file:
+        tree_file.write(header + body + bytes(titles))
+    os.replace(temp_path, path)
+    return
+
+
+if __name__ == "__main__":
+    build_tree(sys.argv[1] if len(sys.argv) > 1 else TREE_PATH)
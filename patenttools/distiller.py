@@ -1,19 +1,73 @@
 # A set of tools for extracting simple, summary-type features
 # from a corpus.
-# The tools are available for instances of the TextDistiller class.
+# The tools are available for instances of the TextDistiller class, and
+# for corpora of many patents through the CorpusDistiller class.
 
-# Import necessary modules
-import re
-from nltk.tokenize import word_tokenize
-from nltk.probability import FreqDist
+# Import necessary modules. NLTK and wordcloud take over a second to
+# import, so they are imported where first used, or ahead of time by
+# startup.preload (see gunicorn.conf.py). Word and bigram counts are kept
+# in Counters, which NLTK's FreqDist extends, so that counting does not
+# need NLTK at all.
 import config     # User-definable configuration
-from nltk.collocations import BigramCollocationFinder
-from nltk.metrics import BigramAssocMeasures
-from wordcloud import WordCloud, get_single_color_func
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
+import normalize  # Shared text normalization
+from bigrams import BigramCounts  # Windowed bigram counting and ranking
+from keyphrases import PhraseSketch  # Bounded-memory key phrase counting
+from metrics import registry  # Per-stage timings
 import io
 import base64
+from collections import Counter
+import hashlib
+import json
+
+# Settings for drawing word clouds.
+WORDCLOUD_PARAMS = {"max_words" : 250,
+                    "margin" : 10,
+                    "random_state" : 1,
+                    "mode" : "RGBA",
+                    "background_color" : None,
+                    "collocations" : False}
+WORDCLOUD_COLOR = "midnightblue"
+
+# The tokenization pipeline is built once, at import: a hashed set of stop
+# words, and the precompiled patterns in normalize for cleaning text.
+STOPWORDS = frozenset(config.tech_stopwords + config.eng_stopwords)
+
+# Cleaned text holds only lowercase letters and spaces. For such text, NLTK's
+# word_tokenize splits on whitespace, except that it also splits these
+# words in two. The fast tokenizer does the same, without NLTK.
+SPLIT_WORDS = {"cannot" : ("can", "not"),
+               "gimme" : ("gim", "me"),
+               "gonna" : ("gon", "na"),
+               "gotta" : ("got", "ta"),
+               "lemme" : ("lem", "me"),
+               "wanna" : ("wan", "na")}
+
+
+def fast_tokenize(clean_text):
+    # Tokenize text produced by TextDistiller.clean_text, exactly as
+    # word_tokenize would.
+    tokens = clean_text.split()
+    if SPLIT_WORDS.keys().isdisjoint(tokens):
+        return tokens
+    
+    split_tokens = []
+    for token in tokens:
+        if token in SPLIT_WORDS:
+            split_tokens.extend(SPLIT_WORDS[token])
+        else:
+            split_tokens.append(token)
+    return split_tokens
+
+
+def section_text(text):
+    # The text of one section, which may be given as a list of strings, or
+    # as None if the section is missing.
+    if text is None:
+        return ""
+    if isinstance(text, str):
+        return text
+    return " ".join(text)
+
 
 class TextDistiller:
 
@@ -22,58 +76,289 @@ class TextDistiller:
     basic NLP techniques.
     """
     
-    def __init__(self, raw_fulltext):
-        self.crp_raw = raw_fulltext
-        self.crp_clean = self.clean_text(self.crp_raw)
-        stopword_list = config.tech_stopwords + config.eng_stopwords
+    def __init__(self, raw_fulltext, visuals = True, tokenizer = config.tokenizer):
+        # The text may be one string, or a mapping of section names (such as
+        # "claims" and "description") to their text, in document order. A
+        # section's text may also be a list of strings, like the claims.
+        if isinstance(raw_fulltext, str):
+            self.section_raw = {}
+            self.crp_raw = raw_fulltext
+        else:
+            self.section_raw = {name : section_text(text) for name, text in raw_fulltext.items()}
+            self.crp_raw = " ".join(self.section_raw.values())
+        self.tokenizer = tokenizer
+        
+        # Each section is cleaned once. The cleaned sections, joined by
+        # spaces, are the cleaned text of the whole document.
+        self.section_clean = {name : self.clean_text(text) for name, text in self.section_raw.items()}
+        if self.section_raw:
+            self.crp_clean = " ".join(self.section_clean.values())
+        else:
+            self.crp_clean = self.clean_text(self.crp_raw)
+        
+        # The tokens, word frequencies and word cloud are computed on first
+        # use and then kept. With visuals = False, no word cloud is drawn.
+        self.visuals = visuals
+        self._crp_toks = None
+        self._section_toks = None
+        self._sections = {}
+        self._word_freqs = None
+        self._bigram_counts = None
+        self._bigram_freqs = None
+        self._phrase_sketch = None
+        self._wordcloud_png = None
+        self._wordcloud = None
+    
+    @property
+    def crp_toks(self):
+        if self._crp_toks is None:
+            if self.section_raw:
+                # Cleaned text holds only letters and spaces, so the tokens
+                # of the whole document are the sections' tokens in turn.
+                self._crp_toks = [word for words in self.section_toks.values() for word in words]
+            else:
+                self._crp_toks = self.tokenize(self.crp_clean)
+        return self._crp_toks
+    
+    @property
+    def section_toks(self):
+        # The tokens of each section, from one tokenization of each.
+        if self._section_toks is None:
+            with registry.timed("tokenize"):
+                self._section_toks = {name : self.tokenize(text) for name, text in self.section_clean.items()}
+        return self._section_toks
+    
+    def tokenize(self, clean_text):
+        # Split cleaned text into tokens with the selected tokenizer.
+        if self.tokenizer == "fast":
+            words = fast_tokenize(clean_text)
+        else:
+            from nltk.tokenize import word_tokenize
+            words = word_tokenize(clean_text)
         
         # When tokenizing the corpus, ignore stop words and words of
         # length = 1, which also excludes abbreviations like "e.g."
         # once the punctuation has been stripped.
-        self.crp_toks = [word for word in word_tokenize(self.crp_clean)
-                         if word not in stopword_list
-                         and len(word) > 1]
-        self.word_freqs = FreqDist(word for word in self.crp_toks)
-        self.wordcloud = self.gen_wordcloud()
+        return [word for word in words
+                if word not in STOPWORDS
+                and len(word) > 1]
+    
+    def section(self, name):
+        # A TextDistiller for one section alone, such as the claims, for
+        # section bigrams or word clouds. It shares this distiller's tokens,
+        # so the section is not cleaned or tokenized again.
+        if name not in self._sections:
+            section_distiller = TextDistiller("", visuals = self.visuals, tokenizer = self.tokenizer)
+            section_distiller.crp_raw = self.section_raw[name]
+            section_distiller.crp_clean = self.section_clean[name]
+            section_distiller._crp_toks = self.section_toks[name]
+            self._sections[name] = section_distiller
+        return self._sections[name]
+    
+    @property
+    def word_freqs(self):
+        if self._word_freqs is None:
+            self._word_freqs = Counter(self.crp_toks)
+        return self._word_freqs
+    
+    @property
+    def bigram_counts(self):
+        # Counts of the (possibly non-contiguous) bigrams within windows of
+        # config.bg_win tokens, made once and reused by every ranking.
+        if self._bigram_counts is None:
+            self._bigram_counts = BigramCounts.from_tokens(self.crp_toks, config.bg_win)
+        return self._bigram_counts
+    
+    @property
+    def bigram_freqs(self):
+        # The same counts as a Counter, for merging into a CorpusDistiller.
+        if self._bigram_freqs is None:
+            self._bigram_freqs = self.bigram_counts.freqdist()
+        return self._bigram_freqs
+    
+    @property
+    def phrase_sketch(self):
+        # Approximate counts of the phrases of config.ngram_sizes tokens,
+        # made once and reused by every ranking.
+        if self._phrase_sketch is None:
+            self._phrase_sketch = PhraseSketch.from_tokens(self.crp_toks)
+        return self._phrase_sketch
+    
+    @property
+    def wordcloud_png(self):
+        if self._wordcloud_png is None and self.visuals:
+            self._wordcloud_png = self.gen_wordcloud_png()
+        return self._wordcloud_png
+    
+    @property
+    def wordcloud(self):
+        if self._wordcloud is None and self.visuals:
+            self._wordcloud = self.gen_wordcloud()
+        return self._wordcloud
     
     def clean_text(self, raw_text):
         # This function scrubs extra white spaces and non-letter characters from
         # the input text, and converts it to lowercase. 
 
-        processed_text = re.sub(r"\s+", " ", raw_text)  # Delete extra white spaces
-        processed_text = processed_text.lower()         # Convert to lowercase
-        processed_text = re.sub(r"[^a-zA-Z]", " ", processed_text) # allow only letters 
-        return processed_text
+        # Delete extra white spaces, convert to lowercase, and allow only letters
+        return normalize.letters_only(raw_text)
 
-    def gen_bigrams(self, min_freq = config.bg_min_freq):
+    def gen_bigrams(self, min_freq = config.bg_min_freq, count = config.bg_count,
+                    measure = config.bg_measure):
         # Generate ranked bigrams as a list of tuples from the tokenized corpus.
-        
-        bg_finder = BigramCollocationFinder.from_words(self.crp_toks,
-                                                       window_size = config.bg_win)
-        bg_finder.apply_freq_filter(min_freq)
-        bg_ranked = bg_finder.nbest(BigramAssocMeasures.pmi, config.bg_count)
-        return bg_ranked
+        with registry.timed("bigrams"):
+            return self.bigram_counts.rank(min_freq, count, measure)
     
-    def gen_wordcloud(self):
+    def gen_keyphrases(self, min_freq = config.ngram_min_freq, count = config.ngram_count):
+        # Generate the most frequent phrases of several words, as a list of
+        # tuples, from the tokenized corpus.
+        with registry.timed("keyphrases"):
+            return self.phrase_sketch.top(min_freq, count)
+    
+    def gen_wordcloud_png(self):
         # Build a word cloud using the tokenized patent text. Stopwords have been removed by this point.
+        return render_wordcloud(self.word_freqs)
+    
+    def gen_wordcloud(self):
+        # Encode the word cloud PNG image to a base64 data URI, for pages
+        # that embed the image inline.
+        return png_data_uri(self.wordcloud_png)
+
+
+class CorpusDistiller:
+
+    """
+    Instances of this class distill a corpus of many patents, which are
+    added, and may be removed, one at a time. Only each document's word and
+    bigram counts are kept, and the corpus totals are updated incrementally,
+    so the corpus is never held as one text or tokenized again.
+    """
+    
+    def __init__(self, visuals = True, tokenizer = config.tokenizer):
+        self.visuals = visuals
+        self.tokenizer = tokenizer
+        self.doc_freqs = {}            # (word_freqs, bigram_freqs) of each document
+        self.word_freqs = Counter()
+        self.bigram_freqs = Counter()
+        self._bigram_counts = None
+        self._wordcloud_png = None
+        self._wordcloud = None
+    
+    def __len__(self):
+        return len(self.doc_freqs)
+    
+    def __contains__(self, doc_id):
+        return doc_id in self.doc_freqs
+    
+    @property
+    def bigram_counts(self):
+        # The corpus totals as a BigramCounts, rebuilt after documents are
+        # added or removed.
+        if self._bigram_counts is None:
+            self._bigram_counts = BigramCounts.from_freqs(self.word_freqs, self.bigram_freqs,
+                                                          config.bg_win)
+        return self._bigram_counts
+    
+    @property
+    def wordcloud_png(self):
+        if self._wordcloud_png is None and self.visuals:
+            self._wordcloud_png = self.gen_wordcloud_png()
+        return self._wordcloud_png
+    
+    @property
+    def wordcloud(self):
+        if self._wordcloud is None and self.visuals:
+            self._wordcloud = self.gen_wordcloud()
+        return self._wordcloud
+    
+    def add(self, doc_id, raw_fulltext):
+        # Add one patent's text under doc_id, such as its patent number,
+        # replacing any document already added under that id.
+        self.add_distiller(doc_id, TextDistiller(raw_fulltext, visuals = False,
+                                                 tokenizer = self.tokenizer))
+        return
+    
+    def add_distiller(self, doc_id, distiller):
+        # Add the counts of a TextDistiller that has already been created.
+        if doc_id in self.doc_freqs:
+            self.remove(doc_id)
         
-        # Generate the word cloud & convert to a matplotlib plot
-        wc = WordCloud(max_words=250,
-                       margin=10,
-                       random_state=1,
-                       mode = "RGBA",
-                       background_color = None,
-                       collocations = False).generate(" ".join(self.crp_toks))
-        recolor = get_single_color_func("midnightblue")
-        wc_plt = plt.imshow(wc.recolor(color_func = recolor))
+        # Bigrams are counted within each document, so none span two.
+        word_freqs, bigram_freqs = distiller.word_freqs, distiller.bigram_freqs
+        self.doc_freqs[doc_id] = (word_freqs, bigram_freqs)
+        self.word_freqs += word_freqs
+        self.bigram_freqs += bigram_freqs
+        self._bigram_counts = None
+        self._wordcloud_png = None
+        self._wordcloud = None
+        return
+    
+    def remove(self, doc_id):
+        # Remove a document, raising KeyError if there is none under doc_id.
+        # Words and bigrams whose counts drop to zero are forgotten.
+        word_freqs, bigram_freqs = self.doc_freqs.pop(doc_id)
+        self.word_freqs -= word_freqs
+        self.bigram_freqs -= bigram_freqs
+        self._bigram_counts = None
+        self._wordcloud_png = None
+        self._wordcloud = None
+        return
+    
+    def gen_bigrams(self, min_freq = config.bg_min_freq, count = config.bg_count,
+                    measure = config.bg_measure):
+        # Generate ranked bigrams for the whole corpus.
+        return self.bigram_counts.rank(min_freq, count, measure)
+    
+    def gen_wordcloud_png(self):
+        # Build a word cloud for the whole corpus.
+        return render_wordcloud(self.word_freqs)
+    
+    def gen_wordcloud(self):
+        return png_data_uri(self.wordcloud_png)
+
+
+def png_data_uri(png):
+    # Encode PNG image bytes to base64 string, then return the string.
+    wc_png_img_str = "data:image/png;base64,"
+    wc_png_img_str += base64.b64encode(png).decode('utf8')
+    return wc_png_img_str
+
+
+def wordcloud_counts(word_freqs):
+    # Prepare word counts for a word cloud as WordCloud.generate would
+    # prepare the text they came from: drop WordCloud's own stop words, then
+    # fold each plural into its singular if both occur. Words stay in order
+    # of first appearance, which decides ties in the layout.
+    from wordcloud import STOPWORDS as WORDCLOUD_STOPWORDS
+    counts = {word : count for word, count in word_freqs.items() if word not in WORDCLOUD_STOPWORDS}
+    for word in list(counts):
+        if word.endswith("s") and not word.endswith("ss") and word[:-1] in counts:
+            counts[word[:-1]] += counts.pop(word)
+    return counts
+
+
+def render_wordcloud(word_freqs):
+    # Draw a word cloud from word counts and return it as PNG bytes.
+    from wordcloud import WordCloud, get_single_color_func
+    
+    with registry.timed("wordcloud"):
+        # Generate the word cloud. Recoloring with a fixed seed, rather than
+        # the global random module, makes the image repeatable.
+        wc = WordCloud(**WORDCLOUD_PARAMS).generate_from_frequencies(wordcloud_counts(word_freqs))
+        recolor = get_single_color_func(WORDCLOUD_COLOR)
+        wc.recolor(color_func = recolor, random_state = WORDCLOUD_PARAMS["random_state"])
         
-        # Convert plot to PNG image
+        # Encode the image as PNG straight from the word cloud's own buffer.
+        # Nothing here touches pyplot's global state, so any number of
+        # threads may render at once.
         wc_png_img = io.BytesIO()
-        wc_plt.write_png(wc_png_img)
+        wc.to_image().save(wc_png_img, format = "PNG")
+        return wc_png_img.getvalue()
 
-        # Encode PNG image to base64 string, then return the string.
-        wc_png_img_str = "data:image/png;base64,"
-        wc_png_img_str += base64.b64encode(wc_png_img.getvalue()).decode('utf8')
-        
-        return wc_png_img_str
 
+def wordcloud_tag():
+    # Summarize everything besides the patent text that shapes a word cloud.
+    # Images cached under the same patent number and tag are identical.
+    settings = [sorted((name, repr(value)) for name, value in WORDCLOUD_PARAMS.items()),
+                WORDCLOUD_COLOR, config.tech_stopwords, config.eng_stopwords]
+    return hashlib.sha256(json.dumps(settings).encode("utf-8")).hexdigest()[:16]
@@ -1,13 +1,251 @@
 # A Flask-based web frontend for PatentTools.
 
 # Import the necessary modules and instantiate the app
-from flask import Flask, render_template, request
-from lookup import USPTOLookup
-from distiller import TextDistiller
-from requests.exceptions import ConnectionError
+import gzip
+import hashlib
+import json
+import time
+from flask import Flask, Response, redirect, render_template, request, stream_with_context, url_for
+from lookup import USPTOLookup, PARSER_VERSION, RECORD_FIELDS
+from batch import batch_lookup, HostRateLimiter, SUMMARY_FIELDS
+from distiller import TextDistiller, wordcloud_tag
+from cache import PatentCache, OfflineCacheMiss
+from simindex import SimilarityIndex
+from claimtree import independent_claims
+from citations import CitationGraph, CitationPrefetcher
+from metrics import registry, cache_lines
+from singleflight import SingleFlight
+from jobs import JobQueue, QueueFull
+from requests.exceptions import ConnectionError, Timeout
+import config     # User-definable configuration
 
 app = Flask(__name__)
 
+# Patent pages are cached on disk and shared by all workers.
+page_cache = PatentCache()
+
+# Stage timings and error counts are added up across all workers, and
+# served at /metrics.
+registry.share()
+
+# Patents that have been looked up are indexed for similarity queries. Like
+# the cache, the index is stored on disk and shared by all workers.
+similar_index = SimilarityIndex()
+
+# Batch lookups made by this worker share one rate limit for the USPTO.
+batch_limiter = HostRateLimiter()
+
+# The citations of patents that have been looked up are recorded in a
+# graph, also shared by all workers. Optionally, the patents they cite are
+# fetched into the cache in the background, under the same rate limit.
+citation_graph = CitationGraph()
+citation_prefetcher = None
+if config.citation_prefetch:
+    citation_prefetcher = CitationPrefetcher(page_cache, citation_graph, batch_limiter)
+
+# Concurrent requests for the same patent, or the same word cloud, share
+# one lookup and analysis, within each worker and across workers.
+flights = SingleFlight()
+
+# Results pages are prepared in background jobs, run by runner processes
+# shared by all workers, unless config.jobs_workers is 0. Any worker can
+# report on any job, since the state of jobs is shared like the cache.
+job_queue = JobQueue() if config.jobs_workers > 0 else None
+
+# Messages shown instead of a results page.
+UNRECOGNIZED_ERROR = """The patent number you provided could not be interpreted.<p>
+        Please <a href = '/'>enter a new query</a>."""
+UNREACHABLE_ERROR = """<b>Error: The USPTO server is unreachable.</b><p>Please try again later."""
+OFFLINE_ERROR = """<b>PatentTools is running offline, and this patent has not been looked up before.</b><p>
+                    Please <a href = '/'>enter a new query</a>."""
+UNEXPECTED_ERROR = """An error occured.<p>
+                    Please <a href = '/'>enter a new query</a><br>
+                    <a href = "https://forms.gle/nZT9JLJbA9akGpeE8" target = "_blank">or share feedback about the problem.</a>"""
+NOT_FOUND_ERROR = """The USPTO has no patent with this number.<p>
+                    Please <a href = '/'>enter a new query</a>."""
+EXPIRED_ERROR = """These results have expired.<p>
+                    Please <a href = '/'>enter a new query</a>."""
+TIMEOUT_ERROR = """<b>Preparing these results took too long.</b><p>
+                    Please try again later, or <a href = '/'>enter a new query</a>."""
+NOT_STARTED_ERROR = """<b>PatentTools is busy, and could not start preparing these results.</b><p>
+                    Please try again in a few seconds."""
+
+# The message for a failed job, by the name of the exception it raised.
+JOB_ERRORS = {"ConnectionError" : UNREACHABLE_ERROR,
+              "Timeout" : UNREACHABLE_ERROR,
+              "OfflineCacheMiss" : OFFLINE_ERROR,
+              "Expired" : TIMEOUT_ERROR,
+              "NotStarted" : NOT_STARTED_ERROR}
+
+# Word cloud images are cached per patent number, parser version and word
+# cloud settings. The cache key also serves as the image's ETag.
+WORDCLOUD_TAG = "%d-%s" % (PARSER_VERSION, wordcloud_tag())
+
+# The sections of a patent's text that are distilled, in document order.
+# The whole patent's results are those of the sections taken together.
+SECTIONS = ("abstract", "claims", "description")
+
+def patent_sections(patent_info):
+    return {section : getattr(patent_info, section) for section in SECTIONS}
+
+def wordcloud_key(pat_num, section = None):
+    return "wordcloud-%s-%s-%s" % (pat_num, section or "all", WORDCLOUD_TAG)
+
+def wordcloud_response(png, etag):
+    # Wrap a word cloud image in a response that browsers and proxies may
+    # cache, answering conditional requests with 304 Not Modified.
+    response = Response(png, mimetype = "image/png")
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = config.wordcloud_max_age
+    return response.make_conditional(request)
+
+def lookup_patent(pat_num):
+    # Look up a patent, and record the patents it cites in the citation
+    # graph, so that requests that only read the graph never write to it.
+    # Patents that could not be found are not recorded.
+    with registry.timed("lookup"):
+        patent_info = USPTOLookup(pat_num, cache = page_cache)
+    if patent_info.title is not None:
+        with registry.timed("citations"):
+            citation_graph.add(patent_info.number, patent_info.cited_us_numbers)
+    return patent_info
+
+def analyze_patent(pat_num):
+    # Look up a patent and count its words, bigrams and phrases: the work
+    # that concurrent requests for the same patent share. Returns
+    # (None, None) if the USPTO has no such patent.
+    
+    # Instantiate a USPTOLookup to parse basic patent information
+    patent_info = lookup_patent(pat_num)
+    if patent_info.title is None:
+        return None, None
+    
+    # Instantiate a TextDistiller to extract bigrams. The word
+    # cloud is drawn separately, when the browser requests it.
+    # The counts are made here, once, so that each request sharing the
+    # distiller only ranks them.
+    pat_distiller = TextDistiller(patent_sections(patent_info), visuals = False)
+    pat_distiller.word_freqs
+    pat_distiller.bigram_counts
+    pat_distiller.phrase_sketch
+    return patent_info, pat_distiller
+
+def results_context(patent_info, pat_distiller, bigram_freq_filter):
+    # Everything a results page shows of an analyzed patent, except the
+    # word cloud URLs, as plain values that a background job can return.
+    bigrams = pat_distiller.gen_bigrams(min_freq = bigram_freq_filter)   
+    keyphrases = pat_distiller.gen_keyphrases()
+    
+    # Find previously seen patents like this one, then add this
+    # one to the index for later queries, if it was found and has text.
+    with registry.timed("similar"):
+        pat_signature = similar_index.signature(pat_distiller.word_freqs)
+        similar_patents = similar_index.query(pat_distiller.word_freqs, exclude = patent_info.number,
+                                              signature = pat_signature)
+        if (patent_info.title is not None and pat_distiller.word_freqs
+                and patent_info.number not in similar_index):
+            similar_index.add(patent_info.number, patent_info.title, pat_distiller.word_freqs,
+                              signature = pat_signature)
+    
+    # Find the patents looked up before that cite this one. Its own
+    # citations were recorded when it was looked up.
+    with registry.timed("citations"):
+        cited_by = citation_graph.cited_by(patent_info.number)
+    
+    return {"pat_num" : patent_info.number,
+            "pat_title" : patent_info.title,
+            "pat_url" : patent_info.url,
+            "pat_class" : patent_info.primary_class,
+            "pat_cpc_codes" : patent_info.cpc_codes,
+            "pat_assignee" : patent_info.assignee,
+            "pat_file_date" : patent_info.filing_date,
+            "citations_us" : patent_info.cited_us,
+            "citations_for" : patent_info.cited_for,
+            "pat_cited_us_numbers" : patent_info.cited_us_numbers,
+            "cited_by" : cited_by,
+            "pat_claim_tree" : patent_info.claim_tree,
+            "pat_independent_claims" : independent_claims(patent_info.claim_tree),
+            "pat_bigrams" : bigrams,
+            "pat_keyphrases" : keyphrases,
+            "similar_patents" : similar_patents,
+            "bigram_freq_filter" : bigram_freq_filter}
+
+def render_results(context):
+    # Render a results page from results_context's values. The patents it
+    # cites are prefetched here, by this worker's prefetcher.
+    if citation_prefetcher is not None:
+        citation_prefetcher.submit(context["pat_cited_us_numbers"])
+    
+    with registry.timed("render"):
+        display = render_template("results.html",
+                      wordcloud = url_for("wordcloud_image", pat_num = context["pat_num"]),
+                      claims_wordcloud = url_for("wordcloud_image", pat_num = context["pat_num"],
+                                                 section = "claims"),
+                      **context)
+    return display
+
+def results_page(raw_pat_num, bigram_freq_filter):
+    # Look up and analyze a patent, and render its results page. Each stage
+    # is timed for /metrics; lookup and analysis stages are timed within
+    # USPTOLookup and TextDistiller.
+    pat_num = USPTOLookup.clean_num(raw_pat_num)
+    if pat_num == "unrecognized input":
+        return UNRECOGNIZED_ERROR
+    
+    patent_info, pat_distiller = flights.do("results-" + pat_num, lambda: analyze_patent(pat_num))
+    if patent_info is None:
+        return NOT_FOUND_ERROR
+    return render_results(results_context(patent_info, pat_distiller, bigram_freq_filter))
+
+def results_job(progress, pat_num, bigram_freq_filter):
+    # Look up and analyze a patent in a background job, run by a job
+    # runner, reporting each stage as it starts. Returns None if the USPTO
+    # has no such patent.
+    progress("Looking up the patent")
+    patent_info = lookup_patent(pat_num)
+    if patent_info.title is None:
+        return None
+    
+    progress("Analyzing its text")
+    pat_distiller = TextDistiller(patent_sections(patent_info), visuals = False)
+    pat_distiller.bigram_counts
+    
+    progress("Finding similar and citing patents")
+    return results_context(patent_info, pat_distiller, bigram_freq_filter)
+
+def finished_job_page(job):
+    # The page for a finished job: its results, or why there are none.
+    if job["state"] == "done":
+        if job["result"] is None:
+            return NOT_FOUND_ERROR
+        return render_results(job["result"])
+    return JOB_ERRORS.get(job["error"], UNEXPECTED_ERROR)
+
+def queue_results(raw_pat_num, bigram_freq_filter):
+    # Queue a background job for a results page. Concurrent requests for
+    # the same results share one job. Most jobs, such as those for patents
+    # already in the cache, finish within moments, so the job's page is
+    # returned at once if it finishes within config.jobs_inline_wait
+    # seconds; otherwise the browser is sent to the page that shows its
+    # progress.
+    pat_num = USPTOLookup.clean_num(raw_pat_num)
+    if pat_num == "unrecognized input":
+        return UNRECOGNIZED_ERROR
+    
+    try:
+        job_id = job_queue.submit("results-%s-%d" % (pat_num, bigram_freq_filter),
+                                  results_job, pat_num, bigram_freq_filter)
+    except QueueFull:
+        error = """<b>PatentTools is busy.</b><p>
+                    Please try again in a few seconds."""
+        return Response(error, status = 429, headers = {"Retry-After" : str(config.jobs_poll_interval * 5)})
+    
+    job = job_queue.wait(job_id, config.jobs_inline_wait)
+    if job is not None and job["state"] in ("done", "failed"):
+        return finished_job_page(job)
+    return redirect(url_for("job_page", job_id = job_id), code = 303)
+
 # Define routes
 @app.route("/")
 def build_search():
@@ -30,42 +268,25 @@ def display_results():
         if raw_pat_num != "":
             
             try:
-                # Instantiate a USPTOLookup to parse basic patent information
-                patent_info = USPTOLookup(raw_pat_num)
-                
-                if patent_info.number == "unrecognized input":
-                    error = """The patent number you provided could not be interpreted.<p>
-                    Please <a href = '/'>enter a new query</a>."""
-                    return error
-                
-                # Instantiate a TextDistiller to extract bigrams
-                pat_distiller = TextDistiller(" ".join(patent_info.claims) + patent_info.description)
-                bigrams = pat_distiller.gen_bigrams(min_freq = bigram_freq_filter)   
-                
-                
-                display = render_template("results.html",
-                              pat_num = patent_info.number,
-                              pat_title = patent_info.title,
-                              pat_url = patent_info.url,
-                              pat_class = patent_info.primary_class,
-                              pat_assignee = patent_info.assignee,
-                              pat_file_date = patent_info.filing_date,
-                              citations_us = patent_info.cited_us,
-                              citations_for = patent_info.cited_for,            
-                              pat_bigrams = bigrams,
-                              wordcloud = pat_distiller.wordcloud)
-                return display
+                with registry.timed("results"):
+                    # Lookups and analyses run in background jobs if
+                    # there is a job queue, and otherwise within the request.
+                    if job_queue is not None:
+                        return queue_results(raw_pat_num, bigram_freq_filter)
+                    return results_page(raw_pat_num, bigram_freq_filter)
             
-            except ConnectionError:
-                conn_err1 = "<b>Error: The USPTO server is unreachable.</b><p>"
-                conn_err2 = "Please try again later."
-                return conn_err1 + conn_err_2
+            except (ConnectionError, Timeout):
+                return UNREACHABLE_ERROR
             
-            except:
-                error = """An error occured.<p>
-                    Please <a href = '/'>enter a new query</a><br>
-                    <a href = "https://forms.gle/nZT9JLJbA9akGpeE8" target = "_blank">or share feedback about the problem.</a>"""
-                return error 
+            except OfflineCacheMiss:
+                return OFFLINE_ERROR
+            
+            except Exception:
+                # Log the error with its traceback, and count it, rather
+                # than lose it.
+                app.logger.exception("Error looking up %r", raw_pat_num)
+                registry.count("patenttools_errors_total", route = "results")
+                return UNEXPECTED_ERROR
 
         else:
             error = """No query entered.<p>
@@ -76,6 +297,252 @@ def display_results():
                     Please <a href = '/'>enter a new query</a>."""
         return error 
 
+@app.route("/jobs/<job_id>")
+def job_page(job_id):
+    
+    # Show the results of a background job once it is done, and until then
+    # a page that reloads itself to check again. A job that is not done by
+    # its deadline has failed, and its page then says why instead.
+    job = job_queue.get(job_id) if job_queue is not None else None
+    
+    if job is None:
+        return Response(EXPIRED_ERROR, status = 404)
+    if job["state"] in ("done", "failed"):
+        return finished_job_page(job)
+    
+    display = render_template("job.html", stage = job["stage"] or "Waiting to start",
+                              elapsed = time.time() - job["created"],
+                              remaining = max(job_queue.deadline(job) - time.time(), 0),
+                              refresh = config.jobs_poll_interval)
+    return display
+
+@app.route("/api/v1/jobs/<job_id>")
+def api_job(job_id):
+    
+    # Report the state of a background job as JSON, for clients that poll
+    # for it rather than reloading /jobs/<job_id>.
+    job = job_queue.get(job_id) if job_queue is not None else None
+    if job is None:
+        return api_error("The job is unknown or has expired.", 404)
+    values = {"id" : job_id, "state" : job["state"], "stage" : job["stage"], "error" : job["error"],
+              "results_url" : url_for("job_page", job_id = job_id)}
+    return Response(json.dumps(values) + "\n", mimetype = "application/json")
+
+@app.route("/wordcloud/<pat_num>.png")
+def wordcloud_image(pat_num):
+    
+    # Serve the word cloud for a patent, or for one section of it if the
+    # "section" parameter names one. Each image is drawn once and then
+    # served from the cache, which all workers share.
+    pat_num = USPTOLookup.clean_num(pat_num)
+    if pat_num == "unrecognized input":
+        return Response("Unknown patent.\n", status = 404)
+    
+    section = request.args.get("section")
+    if section is not None and section not in SECTIONS:
+        return Response("Unknown section.\n", status = 404)
+    
+    etag = wordcloud_key(pat_num, section)
+    if etag in request.if_none_match:
+        return wordcloud_response(b"", etag)
+    
+    png = page_cache.get_image(etag)
+    if png is None:
+        try:
+            png = flights.do(etag, lambda: draw_wordcloud(pat_num, section, etag))
+        except (ConnectionError, Timeout):
+            return Response("The USPTO server is unreachable.\n", status = 503)
+        except OfflineCacheMiss:
+            return Response("Unknown patent.\n", status = 404)
+        
+        if png is None:
+            return Response("Unknown patent.\n", status = 404)
+    
+    return wordcloud_response(png, etag)
+
+def draw_wordcloud(pat_num, section, etag):
+    # Draw a word cloud and cache it, unless another worker has just done
+    # so. Returns None for a patent without text.
+    png = page_cache.get_image(etag)
+    if png is not None:
+        return png
+    
+    patent_info = USPTOLookup(pat_num, cache = page_cache)
+    if patent_info.claims is None or patent_info.description is None:
+        return None
+    
+    pat_distiller = TextDistiller(patent_sections(patent_info))
+    if section is not None:
+        pat_distiller = pat_distiller.section(section)
+    png = pat_distiller.wordcloud_png
+    page_cache.put_image(etag, png)
+    return png
+
+@app.route("/batch", methods = ["POST"])
+def batch_results():
+    
+    # Patent numbers may be posted as a JSON list, or as text with one
+    # number per line (either as the request body or a "numbers" form field).
+    # Results are streamed back as newline-delimited JSON, one line per
+    # patent, in the order in which the lookups complete.
+    if request.is_json:
+        raw_nums = request.get_json(silent = True)
+        if not isinstance(raw_nums, list):
+            return Response("Expected a JSON list of patent numbers.\n", status = 400)
+        raw_nums = [str(raw_num) for raw_num in raw_nums]
+    else:
+        text = request.form.get("numbers") or request.get_data(as_text = True)
+        raw_nums = text.splitlines()
+    
+    raw_nums = [raw_num.strip() for raw_num in raw_nums if raw_num.strip() != ""]
+    if not raw_nums:
+        return Response("No patent numbers entered.\n", status = 400)
+    if len(raw_nums) > config.batch_max_size:
+        return Response("At most %d patent numbers may be looked up at once.\n" % config.batch_max_size,
+                        status = 413)
+    
+    def generate():
+        for result in batch_lookup(raw_nums, cache = page_cache, limiter = batch_limiter,
+                                   graph = citation_graph):
+            yield json.dumps(result) + "\n"
+    
+    return Response(stream_with_context(generate()), mimetype = "application/x-ndjson")
+
+# Fields of the JSON API. Fields of the patent record only need a lookup,
+# which is usually answered from the cache; bigrams, keyphrases and
+# similar patents distill the whole patent, and claims_bigrams and
+# claims_keyphrases distill the claims alone. Word clouds are given as the
+# URLs of their images, which are drawn when first requested.
+API_FIELDS = ("number", "url") + RECORD_FIELDS + ("independent_claims", "cited_by", "similar",
+                                                  "bigrams", "keyphrases", "claims_bigrams",
+                                                  "claims_keyphrases", "wordcloud", "claims_wordcloud")
+API_DEFAULT_FIELDS = ("number",) + SUMMARY_FIELDS
+API_DISTILLED_FIELDS = ("similar", "bigrams", "keyphrases")
+
+def api_error(message, status):
+    return Response(json.dumps({"error" : message}) + "\n", status = status, mimetype = "application/json")
+
+def patent_fields(patent_info, fields, min_freq):
+    # The requested fields of a patent that has been looked up, doing only
+    # the work they need.
+    pat_num = patent_info.number
+    values = {}
+    pat_distiller = None
+    claims_distiller = None
+    if any(field in API_DISTILLED_FIELDS for field in fields):
+        patent_info, pat_distiller = flights.do("results-" + pat_num, lambda: analyze_patent(pat_num))
+    if any(field in ("claims_bigrams", "claims_keyphrases") for field in fields):
+        if pat_distiller is not None:
+            claims_distiller = pat_distiller.section("claims")
+        else:
+            claims_distiller = TextDistiller({"claims" : patent_info.claims}, visuals = False)
+    
+    for field in fields:
+        if field == "number":
+            values[field] = pat_num
+        elif field == "url":
+            values[field] = patent_info.url
+        elif field in RECORD_FIELDS:
+            values[field] = getattr(patent_info, field)
+        elif field == "independent_claims":
+            values[field] = independent_claims(patent_info.claim_tree or [])
+        elif field == "cited_by":
+            with registry.timed("citations"):
+                values[field] = citation_graph.cited_by(pat_num)
+        elif field == "similar":
+            with registry.timed("similar"):
+                pat_signature = similar_index.signature(pat_distiller.word_freqs)
+                similar_patents = similar_index.query(pat_distiller.word_freqs, exclude = pat_num,
+                                                      signature = pat_signature)
+                if pat_distiller.word_freqs and pat_num not in similar_index:
+                    similar_index.add(pat_num, patent_info.title, pat_distiller.word_freqs,
+                                      signature = pat_signature)
+            values[field] = [{"number" : number, "title" : title, "similarity" : similarity}
+                             for number, title, similarity in similar_patents]
+        elif field == "bigrams":
+            values[field] = pat_distiller.gen_bigrams(min_freq = min_freq)
+        elif field == "keyphrases":
+            values[field] = pat_distiller.gen_keyphrases()
+        elif field == "claims_bigrams":
+            values[field] = claims_distiller.gen_bigrams(min_freq = min_freq)
+        elif field == "claims_keyphrases":
+            values[field] = claims_distiller.gen_keyphrases()
+        elif field == "wordcloud":
+            values[field] = url_for("wordcloud_image", pat_num = pat_num)
+        elif field == "claims_wordcloud":
+            values[field] = url_for("wordcloud_image", pat_num = pat_num, section = "claims")
+    return values
+
+def json_response(values):
+    # Wrap values in a JSON response that may be cached, gzipped for
+    # clients that accept it, and answered with 304 Not Modified when the
+    # client already holds it. Each encoding has its own ETag.
+    body = json.dumps(values).encode("utf-8")
+    etag = hashlib.sha1(body).hexdigest()
+    compress = request.accept_encodings["gzip"] > 0 and len(body) >= config.api_gzip_min_bytes
+    if compress:
+        etag += "-gzip"
+    
+    response = Response(mimetype = "application/json")
+    response.set_etag(etag)
+    response.vary.add("Accept-Encoding")
+    response.cache_control.public = True
+    response.cache_control.max_age = config.api_max_age
+    if etag in request.if_none_match:
+        return response.make_conditional(request)
+    
+    if compress:
+        body = gzip.compress(body, compresslevel = config.api_gzip_level)
+        response.content_encoding = "gzip"
+    response.set_data(body)
+    return response.make_conditional(request)
+
+@app.route("/api/v1/patents/<raw_pat_num>")
+def api_patent(raw_pat_num):
+    
+    # Return the fields of a patent named in the "fields" parameter (by
+    # default, a summary like that of /batch) as JSON. Bigrams are ranked
+    # among those seen at least "min_freq" times.
+    pat_num = USPTOLookup.clean_num(raw_pat_num)
+    if pat_num == "unrecognized input":
+        return api_error("The patent number could not be interpreted.", 400)
+    
+    fields = API_DEFAULT_FIELDS
+    if request.args.get("fields"):
+        fields = [field.strip() for field in request.args["fields"].split(",") if field.strip()]
+        unknown = [field for field in fields if field not in API_FIELDS]
+        if unknown:
+            return api_error("Unknown fields: %s. Fields are: %s." % (", ".join(unknown), ", ".join(API_FIELDS)),
+                             400)
+    try:
+        min_freq = int(request.args.get("min_freq", config.bg_min_freq))
+    except ValueError:
+        return api_error("min_freq must be a whole number.", 400)
+    
+    try:
+        patent_info = lookup_patent(pat_num)
+        if patent_info.title is None:
+            return api_error("The patent could not be found.", 404)
+        values = patent_fields(patent_info, fields, min_freq)
+    except (ConnectionError, Timeout):
+        return api_error("The USPTO server is unreachable.", 503)
+    except OfflineCacheMiss:
+        return api_error("Offline, and the patent is not cached.", 404)
+    except Exception:
+        app.logger.exception("Error looking up %r", raw_pat_num)
+        registry.count("patenttools_errors_total", route = "api")
+        return api_error("An error occured.", 500)
+    
+    return json_response(values)
+
+@app.route("/metrics")
+def metrics_text():
+    
+    # Report stage timings, error counts and cache hit counts, added up
+    # across all workers, in the Prometheus text format.
+    text = registry.exposition(cache_lines(page_cache.stats()))
+    return Response(text, mimetype = "text/plain; version=0.0.4")
+
 @app.route("/<unspecified_str>")
 def handle_unknown(unspecified_str):
     error = """Invalid path.<p>Please <a href = '/'>enter a new query</a>."""
@@ -0,0 +1,38 @@
+# Gunicorn settings for PatentTools, read by "gunicorn frontend:app" when it
+# is run from this directory, as in the Dockerfile.
+
+# Import necessary modules
+import gc
+import multiprocessing
+import config
+import jobs
+import startup
+
+# Import the app once, in the master process, and fork the workers from it.
+# Workers then start without importing anything, and share the memory of
+# the imported modules copy-on-write.
+preload_app = True
+
+
+def when_ready(server):
+    # Before the workers are forked, also import the modules that the app
+    # imports only when first used, so that no worker's first request has
+    # to. Then move every object made so far out of the garbage collector's
+    # reach, so that collections in the workers do not write to (and so
+    # copy) the pages they share with the master.
+    seconds = startup.preload()
+    gc.freeze()
+    server.log.info("Preloaded %s in %.2f s", ", ".join(startup.HEAVY_MODULES), seconds)
+
+    # Fork the job runners here too, once for all workers, so that they
+    # also start with everything loaded and share the master's memory.
+    if config.jobs_workers > 0:
+        server.job_runners = jobs.start_runners(config.jobs_path, config.jobs_workers,
+                                                multiprocessing.get_context("fork"))
+        server.log.info("Started %d job runners", config.jobs_workers)
+    return
+
+
+def on_exit(server):
+    jobs.stop_runners(getattr(server, "job_runners", []))
+    return
@@ -0,0 +1,296 @@
+# A queue of background jobs, such as looking up and distilling a patent
+# for a results page, run by a shared pool of runner processes so that a
+# long job does not tie up a web worker or run into its timeout.
+# The queue is an SQLite database next to the cache. Web workers add jobs
+# to it, runners take the oldest queued job in turn, and whichever worker a
+# client's next request reaches can report the job's progress and result.
+# The number of unfinished jobs is bounded; when the queue is full,
+# submit() raises QueueFull. A job that no runner has started within
+# jobs_start_timeout seconds, or that has not finished within jobs_timeout
+# seconds, is given up, so that clients waiting for it are told so.
+# Finished jobs are kept for a while for clients to collect, then expire.
+# Under gunicorn, the master starts the runners once, after preloading the
+# app (see gunicorn.conf.py), so that all workers share them, and they
+# share the master's memory copy-on-write. Elsewhere, such as under the
+# development server, a JobQueue starts runners itself when it finds none.
+
+# Import necessary modules
+import importlib
+import json
+import logging
+import multiprocessing
+import os
+import time
+import uuid
+from metrics import registry
+import sqlite_store
+import config     # User-definable configuration
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(RuntimeError):
+
+    """
+    Raised when a job is submitted while the queue already holds its
+    maximum number of unfinished jobs.
+    """
+
+
+def create_tables(path):
+    db = sqlite_store.connect(path, create = True)
+    try:
+        with db:
+            db.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                              id TEXT PRIMARY KEY,
+                              key TEXT NOT NULL,
+                              state TEXT NOT NULL,
+                              stage TEXT,
+                              created REAL NOT NULL,
+                              updated REAL NOT NULL,
+                              result TEXT,
+                              error TEXT,
+                              function TEXT,
+                              args TEXT)""")
+            columns = [row[1] for row in db.execute("PRAGMA table_info(jobs)")]
+            for column in ("function", "args"):
+                if column not in columns:
+                    db.execute("ALTER TABLE jobs ADD COLUMN %s TEXT" % column)
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key, state)")
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, created)")
+            db.execute("""CREATE TABLE IF NOT EXISTS runners (
+                              pid INTEGER PRIMARY KEY,
+                              seen REAL NOT NULL)""")
+    finally:
+        db.close()
+    return
+
+
+class JobQueue:
+
+    """
+    Instances of this class queue jobs for the runner processes and report
+    their state, progress and results, from a database shared by all
+    workers.
+    """
+
+    def __init__(self, path = config.jobs_path, workers = config.jobs_workers,
+                 max_depth = config.jobs_max_depth, ttl = config.jobs_ttl, timeout = config.jobs_timeout,
+                 start_timeout = config.jobs_start_timeout):
+        self.path = path
+        self.workers = workers
+        self.max_depth = max_depth
+        self.ttl = ttl
+        self.timeout = timeout
+        self.start_timeout = start_timeout
+        self._runners = []
+        self._started = None           # When this process last started runners
+        create_tables(path)
+
+    def submit(self, key, function, *args):
+        # Queue function(progress, *args), which must be a module-level
+        # function taking and returning JSON-serializable values, and return
+        # the job's id. If an unfinished job with the same key is queued, by
+        # any worker, its id is returned instead, so that concurrent
+        # requests for the same work share one job.
+        now = time.time()
+        shared = depth = None
+        db = sqlite_store.connect(self.path)
+        try:
+            with sqlite_store.write_transaction(db):
+                self._expire(db, now)
+                row = db.execute("SELECT id FROM jobs WHERE key = ? AND state IN ('queued', 'running')",
+                                 (key,)).fetchone()
+                if row is not None:
+                    shared = row[0]
+                else:
+                    depth = db.execute("SELECT COUNT(*) FROM jobs WHERE state IN ('queued', 'running')"
+                                       ).fetchone()[0]
+                    if depth < self.max_depth:
+                        job_id = uuid.uuid4().hex
+                        db.execute("""INSERT INTO jobs (id, key, state, created, updated, function, args)
+                                      VALUES (?, ?, 'queued', ?, ?, ?, ?)""",
+                                   (job_id, key, now, now,
+                                    "%s:%s" % (function.__module__, function.__qualname__), json.dumps(args)))
+        finally:
+            db.close()
+
+        if shared is not None:
+            registry.count("patenttools_jobs_total", result = "shared")
+            return shared
+        if depth >= self.max_depth:
+            registry.count("patenttools_jobs_total", result = "rejected")
+            raise QueueFull("%d jobs are already queued" % depth)
+        self._ensure_runners()
+        registry.count("patenttools_jobs_total", result = "queued")
+        return job_id
+
+    def _ensure_runners(self):
+        # Start runners in this process if no runner has been seen lately,
+        # e.g. outside gunicorn, unless it started some moments ago and
+        # they are still starting.
+        now = time.time()
+        if self._started is not None and now - self._started < config.jobs_runner_start_time:
+            return
+        db = sqlite_store.connect(self.path)
+        try:
+            alive = db.execute("SELECT COUNT(*) FROM runners WHERE seen > ?",
+                               (now - 3 * config.jobs_heartbeat,)).fetchone()[0]
+        finally:
+            db.close()
+        if alive == 0:
+            self._runners = [runner for runner in self._runners if runner.is_alive()]
+            self._runners += start_runners(self.path, self.workers - len(self._runners),
+                                           multiprocessing.get_context(config.jobs_start_method))
+            self._started = now
+        return
+
+    def _expire(self, db, now):
+        # Remove finished jobs older than the TTL, and give up on queued jobs
+        # that no runner started in time, and on unfinished jobs older than
+        # the timeout, e.g. because their runner was killed.
+        db.execute("DELETE FROM jobs WHERE state IN ('done', 'failed') AND updated < ?", (now - self.ttl,))
+        db.execute("""UPDATE jobs SET state = 'failed', error = 'NotStarted', updated = ?
+                      WHERE state = 'queued' AND created < ?""", (now, now - self.start_timeout))
+        db.execute("""UPDATE jobs SET state = 'failed', error = 'Expired', updated = ?
+                      WHERE state IN ('queued', 'running') AND created < ?""", (now, now - self.timeout))
+        db.execute("DELETE FROM runners WHERE seen < ?", (now - self.timeout,))
+        return
+
+    def get(self, job_id):
+        # The state of a job as a dict, or None if it is unknown or has
+        # expired. The result is only present once the job is done. A job
+        # that is overdue is reported as failed, with the reason as its
+        # error, even before the next submit() records it so.
+        db = sqlite_store.connect(self.path)
+        try:
+            row = db.execute("SELECT state, stage, created, updated, result, error FROM jobs WHERE id = ?",
+                             (job_id,)).fetchone()
+        finally:
+            db.close()
+        if row is None:
+            return None
+        state, stage, created, updated, result, error = row
+        if state in ("done", "failed") and updated < time.time() - self.ttl:
+            return None
+        if state == "queued" and created < time.time() - self.start_timeout:
+            state, error = "failed", "NotStarted"
+        if state in ("queued", "running") and created < time.time() - self.timeout:
+            state, error = "failed", "Expired"
+        return {"id" : job_id, "state" : state, "stage" : stage, "created" : created,
+                "result" : json.loads(result) if result is not None else None, "error" : error}
+
+    def deadline(self, job):
+        # When an unfinished job (as returned by get) will be given up.
+        if job["state"] == "queued":
+            return job["created"] + min(self.start_timeout, self.timeout)
+        return job["created"] + self.timeout
+
+    def wait(self, job_id, seconds):
+        # Wait up to seconds for a job to finish, and return its state as get
+        # does, finished or not.
+        deadline = time.monotonic() + seconds
+        job = self.get(job_id)
+        while job is not None and job["state"] in ("queued", "running") and time.monotonic() < deadline:
+            time.sleep(min(config.jobs_poll, max(deadline - time.monotonic(), 0)))
+            job = self.get(job_id)
+        return job
+
+    def shutdown(self):
+        # Stop the runners this process started, if any.
+        stop_runners(self._runners)
+        self._runners = []
+        return
+
+
+def update_job(path, job_id, **values):
+    # Set columns of a job's row, and its update time.
+    values["updated"] = time.time()
+    db = sqlite_store.connect(path)
+    try:
+        db.execute("UPDATE jobs SET %s WHERE id = ?" % ", ".join("%s = ?" % name for name in values),
+                   list(values.values()) + [job_id])
+    finally:
+        db.close()
+    return
+
+
+def claim_job(path, start_timeout = config.jobs_start_timeout):
+    # Mark the oldest queued job as running and return (id, function, args),
+    # or None if no job is queued. Jobs queued longer than start_timeout
+    # have been given up, and are left alone.
+    now = time.time()
+    db = sqlite_store.connect(path)
+    try:
+        with sqlite_store.write_transaction(db):
+            row = db.execute("""SELECT id, function, args FROM jobs WHERE state = 'queued' AND created >= ?
+                                ORDER BY created LIMIT 1""", (now - start_timeout,)).fetchone()
+            if row is not None:
+                db.execute("UPDATE jobs SET state = 'running', updated = ? WHERE id = ?", (now, row[0]))
+    finally:
+        db.close()
+    return row
+
+
+def run_job(path, job_id, function_name, args):
+    # Run a job, recording its progress and its result, or the name of the
+    # exception it raised.
+    def progress(stage):
+        update_job(path, job_id, stage = stage)
+        return
+
+    try:
+        module_name, qualname = function_name.split(":")
+        function = getattr(importlib.import_module(module_name), qualname)
+        with registry.timed("job"):
+            result = function(progress, *json.loads(args))
+        update_job(path, job_id, state = "done", result = json.dumps(result))
+    except Exception as error:
+        logger.exception("Job %s failed", job_id)
+        registry.count("patenttools_errors_total", route = "jobs")
+        update_job(path, job_id, state = "failed", error = type(error).__name__)
+    finally:
+        # Runners exit without running atexit handlers.
+        registry.flush()
+    return
+
+
+def run_jobs(path):
+    # The loop of a runner process: take queued jobs in turn, and record
+    # that the runner is alive, until the process that started it exits.
+    parent = os.getppid()
+    beat = 0
+    while os.getppid() == parent:
+        now = time.time()
+        if now - beat >= config.jobs_heartbeat:
+            db = sqlite_store.connect(path)
+            try:
+                db.execute("INSERT OR REPLACE INTO runners VALUES (?, ?)", (os.getpid(), now))
+            finally:
+                db.close()
+            beat = now
+        job = claim_job(path)
+        if job is None:
+            time.sleep(config.jobs_poll)
+            continue
+        run_job(path, *job)
+    return
+
+
+def start_runners(path, count, context):
+    # Start runner processes with a multiprocessing context, e.g. "fork"
+    # in the gunicorn master, where no other threads are running.
+    runners = []
+    for _ in range(count):
+        runner = context.Process(target = run_jobs, args = (path,), daemon = True, name = "patenttools-jobs")
+        runner.start()
+        runners.append(runner)
+    return runners
+
+
+def stop_runners(runners):
+    for runner in runners:
+        runner.terminate()
+    for runner in runners:
+        runner.join(timeout = 5)
+    return
@@ -0,0 +1,190 @@
+# Extraction of key phrases of several words, such as "first electrode
+# layer", in bounded memory.
+# Counting every n-gram of a long description exactly, as NLTK's
+# TrigramCollocationFinder does, keeps a tuple of strings for each distinct
+# n-gram. Here n-grams are instead hashed and counted in a count-min sketch,
+# a fixed-size table of counters that can only overestimate a count. Only
+# the phrases counted most often so far are kept as strings, in a candidate
+# table that is pruned whenever it outgrows its capacity. Tokens are
+# processed in chunks, so the memory used does not depend on the length
+# of the document. Tokens and n-grams are hashed to 64 bits, and the final
+# counts of the candidates are exact counts of their words, so phrases
+# whose hashes collide are never merged.
+
+# Import necessary modules
+import hashlib
+from collections import Counter
+import numpy as np
+import config     # User-definable configuration
+
+# Tokens are read in chunks of this many tokens.
+CHUNK_SIZE = 20000
+
+# Multiplier for combining token hashes into n-gram hashes, and the seed of
+# each sketch row's hash function.
+NGRAM_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+SKETCH_SEED = 1
+
+# A phrase seen only once is not a key phrase, and is not kept.
+MIN_CANDIDATE_COUNT = 2
+
+
+class PhraseSketch:
+
+    """
+    Instances of this class count the n-grams of a stream of tokens
+    approximately, in a count-min sketch of fixed size, and keep the most
+    frequent of them as candidate key phrases.
+    """
+
+    def __init__(self, sizes = config.ngram_sizes, width = config.ngram_sketch_width,
+                 depth = config.ngram_sketch_depth, capacity = config.ngram_capacity):
+        self.sizes = tuple(sizes)
+        self.width = width
+        self.capacity = capacity
+        self.table = np.zeros((depth, width), dtype = np.uint32)
+        self.candidates = {}           # Hash of each candidate -> its words
+        self.floor = MIN_CANDIDATE_COUNT
+        self.exact = None              # Exact count of each candidate phrase, once recounted
+        self._tail = []                # The last tokens of the previous chunk
+
+        rng = np.random.RandomState(SKETCH_SEED)
+        self._a = rng.randint(1, 2 ** 62, size = (depth, 1), dtype = np.int64).astype(np.uint64) | np.uint64(1)
+        self._b = rng.randint(0, 2 ** 62, size = (depth, 1), dtype = np.int64).astype(np.uint64)
+
+    @classmethod
+    def from_tokens(cls, tokens, **settings):
+        # Count the n-grams of a list of tokens, chunk by chunk.
+        # The candidates are then counted exactly.
+        sketch = cls(**settings)
+        for start in range(0, len(tokens), CHUNK_SIZE):
+            sketch.update(tokens[start:start + CHUNK_SIZE])
+        sketch.recount(tokens)
+        return sketch
+
+    def _columns(self, hashes):
+        # The counter used for each hash in each row of the sketch.
+        with np.errstate(over = "ignore"):
+            return (((self._a * hashes + self._b) >> np.uint64(32)) % np.uint64(self.width)).astype(np.intp)
+
+    def estimate(self, hashes):
+        # The estimated count of each of an array of n-gram hashes.
+        columns = self._columns(hashes)
+        return self.table[np.arange(len(self.table))[:, np.newaxis], columns].min(axis = 0)
+
+    def _ngram_hashes(self, tokens, carried):
+        # Hash the n-grams of each size in a chunk of tokens, the first
+        # carried of which end the previous chunk. N-grams that lie wholly
+        # within those were hashed with the previous chunk, and are skipped.
+        # Yields (size, first, hashes), where hashes[i] is the hash of the
+        # n-gram that starts at tokens[first + i].
+        token_hashes = hash_tokens(tokens)
+        for size in self.sizes:
+            first = max(carried - size + 1, 0)
+            starts = len(tokens) - size + 1 - first
+            if starts <= 0:
+                continue
+
+            hashes = token_hashes[first:first + starts].copy()
+            with np.errstate(over = "ignore"):
+                for offset in range(1, size):
+                    hashes = hashes * NGRAM_MULTIPLIER + token_hashes[first + offset:first + offset + starts]
+                hashes = hashes * NGRAM_MULTIPLIER + np.uint64(size)
+            yield size, first, hashes
+
+    def _carry(self, tokens):
+        # The last tokens of a chunk, which begin n-grams that end in the next.
+        return tokens[-(max(self.sizes) - 1):] if max(self.sizes) > 1 else []
+
+    def update(self, tokens):
+        # Count the n-grams that end in the next chunk of tokens. N-grams
+        # that span two chunks are counted once, in the later chunk.
+        tokens = self._tail + list(tokens)
+        carried = len(self._tail)
+        self._tail = self._carry(tokens)
+        self.exact = None
+
+        for size, first, hashes in self._ngram_hashes(tokens, carried):
+            columns = self._columns(hashes)
+            for row, row_columns in enumerate(columns):
+                row_columns, row_counts = np.unique(row_columns, return_counts = True)
+                self.table[row, row_columns] += row_counts.astype(np.uint32)
+
+            # Phrases now counted at least as often as the weakest candidate
+            # become candidates, up to capacity of them per chunk. Their
+            # words are only looked up for these.
+            unique, positions = np.unique(hashes, return_index = True)
+            estimates = self.estimate(unique)
+            admitted = np.flatnonzero(estimates >= self.floor)
+            if len(admitted) > self.capacity:
+                admitted = admitted[np.argpartition(-estimates[admitted].astype(np.int64),
+                                                    self.capacity - 1)[:self.capacity]]
+            for phrase_hash, position in zip(unique[admitted].tolist(), positions[admitted].tolist()):
+                if phrase_hash not in self.candidates:
+                    start = first + position
+                    self.candidates[phrase_hash] = tuple(tokens[start:start + size])
+
+        if len(self.candidates) > self.capacity:
+            self.prune()
+        return
+
+    def recount(self, tokens):
+        # Count the candidate phrases exactly, in a second pass over the
+        # tokens that were counted. The sketch can only overestimate, so
+        # the candidates are the phrases that can be the most frequent;
+        # counting only them takes no more memory than the candidate table.
+        # N-grams whose hash is a candidate's are compared word for word.
+        phrases = set(self.candidates.values())
+        sorted_hashes = np.sort(np.fromiter(self.candidates, dtype = np.uint64, count = len(self.candidates)))
+        exact = Counter()
+
+        tail = []
+        for start in range(0, len(tokens), CHUNK_SIZE):
+            chunk = tail + list(tokens[start:start + CHUNK_SIZE])
+            for size, first, chunk_hashes in self._ngram_hashes(chunk, len(tail)):
+                if not len(sorted_hashes):
+                    continue
+                found = np.searchsorted(sorted_hashes, chunk_hashes).clip(max = len(sorted_hashes) - 1)
+                for position in np.flatnonzero(sorted_hashes[found] == chunk_hashes).tolist():
+                    phrase = tuple(chunk[first + position:first + position + size])
+                    if phrase in phrases:
+                        exact[phrase] += 1
+            tail = self._carry(chunk)
+
+        self.exact = {phrase : exact[phrase] for phrase in phrases}
+        return
+
+    def prune(self):
+        # Keep the capacity candidates with the highest estimated counts, and
+        # admit new candidates only if they are counted as often.
+        hashes = np.fromiter(self.candidates, dtype = np.uint64, count = len(self.candidates))
+        counts = self.estimate(hashes)
+        kept = np.argsort(-counts.astype(np.int64), kind = "stable")[:self.capacity]
+        self.candidates = {phrase_hash : self.candidates[phrase_hash] for phrase_hash in hashes[kept].tolist()}
+        self.floor = max(int(counts[kept].min()), MIN_CANDIDATE_COUNT)
+        return
+
+    def counts(self):
+        # The count of each candidate phrase, as a dict: exact if the
+        # candidates have been recounted, otherwise estimated.
+        if self.exact is not None:
+            return dict(self.exact)
+        if not self.candidates:
+            return {}
+        hashes = np.fromiter(self.candidates, dtype = np.uint64, count = len(self.candidates))
+        return dict(zip(self.candidates.values(), self.estimate(hashes).tolist()))
+
+    def top(self, min_freq = config.ngram_min_freq, count = config.ngram_count):
+        # Return the count phrases seen most often, and at least min_freq
+        # times, as tuples of words. Ties are broken by the phrase itself.
+        ranked = sorted((item for item in self.counts().items() if item[1] >= min_freq),
+                        key = lambda item: (-item[1], item[0]))
+        return [phrase for phrase, phrase_count in ranked[:count]]
+
+
+def hash_tokens(tokens):
+    # 64-bit hashes of a list of tokens, as an array. Each distinct token
+    # is hashed once.
+    hashes = {token : int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size = 8).digest(), "little")
+              for token in set(tokens)}
+    return np.fromiter((hashes[token] for token in tokens), dtype = np.uint64, count = len(tokens))
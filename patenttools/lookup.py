@@ -4,8 +4,43 @@
 # Import necessary modules
 import re
 import requests
-from bs4 import BeautifulSoup
-from classifiers import cpc_codes
+import normalize  # Shared text normalization
+from cpctree import CpcTree, split_codes
+from cache import OfflineCacheMiss
+from pageparser import parse_patent_page
+from claimtree import ClaimTreeBuilder
+from metrics import registry  # Per-stage timings and upstream error counts
+import config     # User-definable configuration
+
+# Bump PARSER_VERSION whenever parse_us_pat changes what it extracts, so that
+# parsed records cached by an older parser are ignored.
+PARSER_VERSION = 4
+RECORD_FIELDS = ("title", "filing_date", "assignee", "abstract", "primary_cpc",
+                 "primary_class", "cpc_codes", "cited_us", "cited_for", "cited_us_numbers", "claims",
+                 "claim_tree", "description")
+
+# CPC titles are read from a prebuilt, memory-mapped file.
+cpc_tree = CpcTree()
+
+# Requests to the USPTO share one session, so that connections are kept
+# alive and reused between lookups.
+session = requests.Session()
+USER_AGENT = {"user-agent" : "Automated Python patent parsing tool, powered by requests 2.22.0"}
+
+
+URL_TEMPLATE = config.patft_base_url.rstrip("/") + re.sub(r"\s", "", """/netacgi/nph-Parser?Sect1=PTO1
+    &Sect2=HITOFF&d=PALL&p=1&u=%2Fnetahtml%2FPTO%2Fsrchnum.htm&r=1&f=G&
+    l=50&s1=num-goes-here.PN.&OS=PN/num-goes-here&RS=PN/num-goes-here""")
+
+
+def patent_url(number):
+    # Assemble the query URL for a cleaned patent number.
+    return URL_TEMPLATE.replace("num-goes-here", number)
+
+
+def is_patent_page(patent_html):
+    # Check whether the USPTO found the patent. Only such pages are cached.
+    return "No patents have matched" not in patent_html
 
 
 class USPTOLookup:
@@ -16,7 +51,8 @@ class USPTOLookup:
     At present, it only supports US patents.
     """
     
-    def __init__(self, patent_num):
+    def __init__(self, patent_num, cache = None, engine = config.parser_engine,
+                 limiter = None, fetch = True):
         
         # Define class variables, which will later be assigned when the 
         # parsing function is called.
@@ -24,38 +60,112 @@ class USPTOLookup:
         self.filing_date = None
         self.assignee = None
         self.abstract = None
+        self.primary_cpc = None
+        self.primary_class = None
+        self.cpc_codes = None
+        self.cited_us = None
+        self.cited_for = None
+        self.cited_us_numbers = None
         self.claims = None
+        self.claim_tree = None
         self.description = None
+        self.engine = engine
         
         
         # Pass to a cleaner function to remove letters, punctiuation
         self.number = self.clean_num(patent_num)
         
-        # If the patent number could not be interpreted, quit.
-        if self.clean_num == "unrecognized input":
-            quit()
+        # If the patent number could not be interpreted, stop here. Callers
+        # check self.number for "unrecognized input".
+        if self.number == "unrecognized input":
+            return
         
         # Assemble the query URL & access the patent.
-        url_template = """http://patft.uspto.gov/netacgi/nph-Parser?Sect1=PTO1
-        &Sect2=HITOFF&d=PALL&p=1&u=%2Fnetahtml%2FPTO%2Fsrchnum.htm&r=1&f=G&
-        l=50&s1=num-goes-here.PN.&OS=PN/num-goes-here&RS=PN/num-goes-here"""
+        self.url = patent_url(self.number)
+        
+        # A previously parsed record makes fetching and parsing unnecessary.
+        if cache is not None and self.load_record(cache):
+            return
         
-        self.url = re.sub(r"\s", "", url_template)
-        self.url = re.sub(r"num-goes-here", self.number, self.url)
-        cust_header = {"user-agent" : "Automated Python patent parsing tool, powered by requests 2.22.0"}
-        patent_html = requests.get(self.url, headers = cust_header).text
+        # Callers that fetch pages themselves, like AsyncPatentFetcher, stop
+        # here and pass the page to load_html.
+        if not fetch:
+            return
         
+        patent_html = self.fetch_html(cache, limiter)
+        self.load_html(patent_html, cache)
+        
+        return
+
+    def load_record(self, cache):
+        # Fill in the fields from a cached record, returning True on success.
+        record = cache.get_record(self.number, PARSER_VERSION)
+        if record is None:
+            return False
+        for field in RECORD_FIELDS:
+            setattr(self, field, record[field])
+        return True
+
+    def load_html(self, patent_html, cache = None):
         # pass to a parsing function to get title, abstract, claims, & description
-        # self.title, self.filing_date, self.assignee, self.abstract, self.claims, self.description = 
-        self.parse_us_pat(patent_html)
+        with registry.timed("parse"):
+            self.parse_us_pat(patent_html)
+        if cache is not None:
+            self.store_record(cache)
         
         return
 
+    def store_record(self, cache):
+        # Keep the parsed fields for next time, unless the lookup failed.
+        if self.title is not None:
+            cache.put_record(self.number, PARSER_VERSION,
+                             {field : getattr(self, field) for field in RECORD_FIELDS})
+        return
+
+    def fetch_html(self, cache = None, limiter = None):
+        # Retrieve the patent's HTML, preferring a PatentCache if one is
+        # provided. Only successful responses are cached. A HostRateLimiter,
+        # if provided, paces the requests sent to the USPTO.
+        if cache is not None:
+            patent_html = cache.get(self.number)
+            if patent_html is not None:
+                return patent_html
+            if cache.offline:
+                raise OfflineCacheMiss(self.number)
+        
+        if limiter is not None:
+            limiter.wait(self.url)
+        
+        registry.count("patenttools_upstream_requests_total")
+        try:
+            with registry.timed("fetch"):
+                response = session.get(self.url, headers = USER_AGENT,
+                                       timeout = (config.fetch_connect_timeout, config.fetch_read_timeout))
+                patent_html = response.text
+        except requests.exceptions.Timeout:
+            registry.count("patenttools_upstream_errors_total", kind = "timeout")
+            raise
+        except requests.exceptions.ConnectionError:
+            registry.count("patenttools_upstream_errors_total", kind = "connection")
+            raise
+        if not response.ok:
+            registry.count("patenttools_upstream_errors_total", kind = "status %d" % response.status_code)
+        
+        if cache is not None and response.ok and is_patent_page(patent_html):
+            cache.put(self.number, patent_html)
+        
+        return patent_html
+
     def parse_us_pat(self, patent_html):
         # This function does the heavy lifting of the Fetcher class. It uses
         # BeautifulSoup to parse the HTML patent into a title, filing date,
         # abstract, claims, and description.
+        # The single-pass engine extracts the same fields more cheaply.
+        if self.engine == "stream":
+            return self.parse_us_pat_stream(patent_html)
         
+        # BeautifulSoup is only imported for this engine.
+        from bs4 import BeautifulSoup
         soup = BeautifulSoup(patent_html, "html.parser")
         
         # Check for successful patent lookup. Will need to improve this error
@@ -77,19 +187,27 @@ class USPTOLookup:
                 self.assignee = "Undetermined"
             
             self.abstract = self.clean_text(soup.find(string = re.compile("Abstract")).find_next().text).strip()
-            self.primary_cpc = self.clean_text(soup.find(string = re.compile("Current CPC Class:")).find_next().text).split(" ")[0].strip()
+            cpc_text = self.clean_text(soup.find(string = re.compile("Current CPC Class:")).find_next().text)
+            self.primary_cpc = cpc_text.split(" ")[0].strip()
+            self.cpc_codes = split_codes(cpc_text)
             
-            try: 
-                self.primary_class = cpc_codes[self.primary_cpc].lower()
-            except KeyError:
+            primary_title = cpc_tree.title(self.primary_cpc)
+            if primary_title is not None:
+                self.primary_class = primary_title.lower()
+            else:
                 self.primary_class = "(not identified)"
 
             # Cited _US_ patents are listed in a table under the header References cited.
-            # The table has no header row.
+            # The table has no header row. The first cell of each row holds
+            # the cited patent's number.
             try:
-                self.cited_us = len(soup.find(string = re.compile("References Cited")).find_next(string = "U.S. Patent Documents").find_next("table").find_all("tr"))
+                cited_rows = soup.find(string = re.compile("References Cited")).find_next(string = "U.S. Patent Documents").find_next("table").find_all("tr")
+                self.cited_us = len(cited_rows)
+                self.cited_us_numbers = self.cited_numbers(row.find("td").text for row in cited_rows
+                                                           if row.find("td") is not None)
             except AttributeError:
                 self.cited_us = 0
+                self.cited_us_numbers = []
                                     
             # Cited _foreign_ patents are listed in a table under the header References cited.
             # The table has no header row.
@@ -103,27 +221,107 @@ class USPTOLookup:
             # Claims header, then removing everything at or after "Description"
             claims_in_prog = soup.find("b", string = re.compile("Claims")).find_all_next(string = True)
             claims_in_prog = list(claims_in_prog)[:list(claims_in_prog).index("Description") - 1]
-            self.claims = [self.clean_text(claim).strip() for claim in claims_in_prog]
+            self.read_claims(claims_in_prog)
 
             # Extract the description section in a similar fashion.
             desc_in_prog = soup.find("b", string = re.compile("Description")).find_all_next(string = True)
-            desc_in_prog = [re.sub("\n", " ", desc) for desc in desc_in_prog]
+            desc_in_prog = [desc.replace("\n", " ") for desc in desc_in_prog]
             desc_in_prog = "\n\n".join(desc_in_prog)
-            self.description = re.sub(r"\*", "", desc_in_prog).strip()
+            self.description = desc_in_prog.replace("*", "").strip()
         except ValueError:
             pass
         
         return
         
         
-    def clean_num(self, raw_patent_num):
+    def parse_us_pat_stream(self, patent_html):
+        # Parse the HTML patent with a single pass of a PatentPageParser,
+        # then clean each field exactly as parse_us_pat does.
+        
+        page = parse_patent_page(patent_html)
+        
+        if page.no_match:
+            return None
+        
+        try:
+            self.title = self.clean_text(page.text_of("title"))
+            self.filing_date = self.clean_text(page.text_of("filing_date")).strip()
+            
+            try:
+                self.assignee = self.clean_text(page.text_of("assignee")).strip()
+            except AttributeError:
+                self.assignee = "Undetermined"
+            
+            self.abstract = self.clean_text(page.text_of("abstract")).strip()
+            cpc_text = self.clean_text(page.text_of("primary_cpc"))
+            self.primary_cpc = cpc_text.split(" ")[0].strip()
+            self.cpc_codes = split_codes(cpc_text)
+            
+            primary_title = cpc_tree.title(self.primary_cpc)
+            if primary_title is not None:
+                self.primary_class = primary_title.lower()
+            else:
+                self.primary_class = "(not identified)"
+            
+            self.cited_us = page.rows.get("cited_us", 0)
+            self.cited_us_numbers = self.cited_numbers(cell for cell in page.first_cells.get("cited_us", [])
+                                                       if cell is not None)
+            self.cited_for = page.rows.get("cited_for", 0)
+            
+            if page.claims_b is None:
+                raise AttributeError("The patent page has no claims.")
+            claims_in_prog = page.strings[page.claims_b[1]:]
+            claims_in_prog = claims_in_prog[:claims_in_prog.index("Description") - 1]
+            self.read_claims(claims_in_prog)
+            
+            if page.description_b is None:
+                raise AttributeError("The patent page has no description.")
+            desc_in_prog = [desc.replace("\n", " ") for desc in page.strings[page.description_b[1]:]]
+            desc_in_prog = "\n\n".join(desc_in_prog)
+            self.description = desc_in_prog.replace("*", "").strip()
+        except ValueError:
+            pass
+        
+        return
+        
+        
+    def cited_numbers(self, cells):
+        # Clean the numbers in the first cells of the cited US patents table,
+        # dropping blank cells, numbers that are not utility patents (like
+        # D453,322) and repeats.
+        cited = []
+        for cell in cells:
+            cell = cell.strip()
+            if not cell[:1].isdigit():
+                continue
+            cited_num = self.clean_num(cell)
+            if cited_num != "unrecognized input" and cited_num not in cited:
+                cited.append(cited_num)
+        return cited
+        
+        
+    def read_claims(self, claims_in_prog):
+        # Clean the strings of the claims section, and assemble them into
+        # numbered claims with their dependencies as they are cleaned.
+        claim_builder = ClaimTreeBuilder()
+        self.claims = []
+        for claim in claims_in_prog:
+            cleaned_claim = self.clean_text(claim).strip()
+            self.claims.append(cleaned_claim)
+            claim_builder.add(cleaned_claim)
+        self.claim_tree = claim_builder.tree()
+        
+        return
+        
+        
+    @staticmethod
+    def clean_num(raw_patent_num):
         # In this order, remove: leading US, trailing A1 or similar, and
         # commas or unexpected other punctuation.
+        # This is a static method so that batch lookups can dedupe numbers
+        # before creating any USPTOLookup instances.
         
-        cleaned_num = re.sub(r"US", "", raw_patent_num)
-        cleaned_num = re.sub(r"[a-zA-Z]+[0-9]*", "", cleaned_num)
-        cleaned_num = re.sub(r"[,.\\\!\?\#-]*", "", cleaned_num)
-        cleaned_num = re.sub(r"\s+", "", cleaned_num)
+        cleaned_num = normalize.strip_patent_number(raw_patent_num)
         
         # Test to confirm that the user's patent number could be interpreted.
         try:
@@ -137,6 +335,4 @@ class USPTOLookup:
     
     def clean_text(self, ugly_text):
         # This function scrubs out line breaks, extra spaces, etc.
-        cleaned_text = re.sub(r"[\s]{2,}", " ", ugly_text)
-        cleaned_text = re.sub(r"\n", " ", cleaned_text)
-        return cleaned_text
\ No newline at end of file
+        return normalize.squeeze_whitespace(ugly_text)
\ No newline at end of file
@@ -0,0 +1,233 @@
+# Latency and error metrics for PatentTools, in the Prometheus text format.
+# Each stage of a lookup and of the text analysis is timed with
+# registry.timed(stage), into one histogram per stage, and events such as
+# failed requests to the USPTO are counted with registry.count(name).
+# Observations are kept in memory. Once the registry is shared (see
+# share()), they are added, in one transaction, to an SQLite database next
+# to the cache, so that the metrics of all gunicorn workers add up, as the
+# cache's hit and miss counts do. As in PatentCache, a timer writes them
+# flush_interval seconds after the first of them, whether or not anything
+# else happens in the meantime, and /metrics writes them before reading
+# the totals. Adding to the stored values uses an upsert, which needs
+# SQLite 3.24 or later.
+
+# Import necessary modules
+import atexit
+import bisect
+import contextlib
+import os
+import sqlite3
+import threading
+import time
+import sqlite_store
+import config     # User-definable configuration
+
+# The metrics kept by the registry: type and help text of each.
+METRICS = {"patenttools_stage_seconds" : ("histogram", "Time spent in each stage of a lookup or analysis."),
+           "patenttools_upstream_requests_total" : ("counter", "Requests sent to the USPTO."),
+           "patenttools_upstream_errors_total" : ("counter", "Requests to the USPTO that failed, by kind."),
+           "patenttools_errors_total" : ("counter", "Requests that failed with an unexpected error, by route."),
+           "patenttools_singleflight_total" : ("counter", "Coalesced requests, by whether they did the work "
+                                                          "(leader), shared it (hit) or waited for another worker (wait)."),
+           "patenttools_jobs_total" : ("counter", "Background jobs, by whether they were queued, shared with an "
+                                                  "unfinished job, or rejected because the queue was full.")}
+
+
+def render_labels(labels):
+    # Labels are stored as rendered, e.g. 'stage="fetch"'.
+    return ",".join('%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+                    for name, value in sorted(labels.items()))
+
+
+def format_value(value):
+    # Prometheus reads integers and floats; write counts without a ".0".
+    return repr(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def sample_line(name, labels, value):
+    # One line of the text format, e.g. 'name{stage="fetch"} 3'.
+    return "%s%s %s" % (name, "{%s}" % labels if labels else "", format_value(value))
+
+
+class MetricsRegistry:
+
+    """
+    Instances of this class accumulate stage timings and event counts, and
+    render the totals, across all processes sharing the registry's
+    database, in the Prometheus text format.
+    """
+
+    def __init__(self, buckets = config.metrics_buckets, flush_interval = config.metrics_flush_interval):
+        self.buckets = tuple(buckets)
+        self.bucket_names = [format_value(bound) for bound in self.buckets] + ["+Inf"]
+        self.flush_interval = flush_interval
+        self.path = None
+        self._pending = {}             # (metric, labels, key) -> value not yet in the database
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._timer = None             # Timer of the next flush, if one is due
+
+    def share(self, path = config.metrics_path):
+        # Keep the totals in a database that other processes also add to.
+        self.path = path
+        db = sqlite_store.connect(path, create = True)
+        try:
+            with db:
+                db.execute("""CREATE TABLE IF NOT EXISTS metrics (
+                                  metric TEXT NOT NULL,
+                                  labels TEXT NOT NULL,
+                                  key TEXT NOT NULL,
+                                  value REAL NOT NULL,
+                                  PRIMARY KEY (metric, labels, key)) WITHOUT ROWID""")
+        finally:
+            db.close()
+        atexit.register(self.flush)
+        return
+
+    def _connect(self):
+        return sqlite_store.connect(self.path)
+
+    def _check_fork(self):
+        # A process forked from one with pending values starts afresh, so
+        # that they are only counted once. The lock must be held.
+        if os.getpid() != self._pid:
+            self._pending = {}
+            self._timer = None
+            self._pid = os.getpid()
+        return
+
+    def _schedule_flush(self):
+        # Flush in flush_interval seconds, unless a flush is already due.
+        # The lock must be held.
+        if self.path is not None and self._timer is None:
+            self._timer = threading.Timer(self.flush_interval, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+        return
+
+    def _add(self, metric, labels, key, value):
+        # Add to a pending value; the lock must be held.
+        self._check_fork()
+        entry = (metric, labels, key)
+        self._pending[entry] = self._pending.get(entry, 0) + value
+        self._schedule_flush()
+        return
+
+    def observe(self, stage, seconds):
+        # Record the time taken by one run of a stage.
+        labels = render_labels({"stage" : stage})
+        bucket = self.bucket_names[bisect.bisect_left(self.buckets, seconds)]
+        with self._lock:
+            self._add("patenttools_stage_seconds", labels, bucket, 1)
+            self._add("patenttools_stage_seconds", labels, "sum", seconds)
+            self._add("patenttools_stage_seconds", labels, "count", 1)
+        return
+
+    @contextlib.contextmanager
+    def timed(self, stage):
+        # Time the code in a with block as one run of a stage, whether or not
+        # it raises.
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def count(self, metric, amount = 1, **labels):
+        # Add to a counter, such as patenttools_upstream_errors_total.
+        with self._lock:
+            self._add(metric, render_labels(labels), "", amount)
+        return
+
+    def flush(self):
+        # Add the pending values to the shared database. If it is busy, they
+        # are kept for the next flush.
+        if self.path is None:
+            return
+        with self._lock:
+            self._check_fork()
+            pending, self._pending = self._pending, {}
+            self._timer = None
+        if not pending:
+            return
+
+        db = self._connect()
+        try:
+            with sqlite_store.write_transaction(db):
+                db.executemany("""INSERT INTO metrics VALUES (?, ?, ?, ?)
+                                  ON CONFLICT (metric, labels, key) DO UPDATE SET value = value + excluded.value""",
+                               [entry + (value,) for entry, value in pending.items()])
+        except sqlite3.OperationalError:
+            with self._lock:
+                for entry, value in pending.items():
+                    self._add(*entry, value)
+        finally:
+            db.close()
+        return
+
+    def totals(self):
+        # The current value of every (metric, labels, key), including this
+        # process's pending values.
+        self.flush()
+        totals = {}
+        if self.path is not None:
+            db = self._connect()
+            try:
+                totals = {row[:3] : row[3] for row in db.execute("SELECT metric, labels, key, value FROM metrics")}
+            finally:
+                db.close()
+        with self._lock:
+            for entry, value in self._pending.items():
+                totals[entry] = totals.get(entry, 0) + value
+        return totals
+
+    def exposition(self, extra_lines = ()):
+        # Render the totals in the Prometheus text format, followed by any
+        # further lines, such as those of cache_lines.
+        totals = self.totals()
+        lines = []
+        for metric, (metric_type, help_text) in METRICS.items():
+            entries = sorted(entry for entry in totals if entry[0] == metric)
+            if not entries:
+                continue
+            lines.append("# HELP %s %s" % (metric, help_text))
+            lines.append("# TYPE %s %s" % (metric, metric_type))
+            if metric_type == "counter":
+                for entry in entries:
+                    lines.append(sample_line(metric, entry[1], totals[entry]))
+                continue
+
+            # Histogram buckets are stored separately and reported cumulatively.
+            for labels in sorted(set(entry[1] for entry in entries)):
+                cumulative = 0
+                for bucket in self.bucket_names:
+                    cumulative += totals.get((metric, labels, bucket), 0)
+                    bucket_labels = ",".join(part for part in (labels, 'le="%s"' % bucket) if part)
+                    lines.append(sample_line(metric + "_bucket", bucket_labels, cumulative))
+                lines.append(sample_line(metric + "_sum", labels, totals.get((metric, labels, "sum"), 0)))
+                lines.append(sample_line(metric + "_count", labels, totals.get((metric, labels, "count"), 0)))
+        lines.extend(extra_lines)
+        return "\n".join(lines) + "\n"
+
+
+def cache_lines(stats):
+    # Prometheus lines for the counts kept by PatentCache.stats(), which are
+    # already shared by all processes.
+    lines = ["# HELP patenttools_cache_requests_total Cache lookups, by cache and result.",
+             "# TYPE patenttools_cache_requests_total counter"]
+    for cache, prefix in (("page", ""), ("record", "record_"), ("image", "image_")):
+        for result, counter in (("hit", "hits"), ("miss", "misses")):
+            lines.append(sample_line("patenttools_cache_requests_total",
+                                     render_labels({"cache" : cache, "result" : result}),
+                                     stats[prefix + counter]))
+    lines.extend(["# HELP patenttools_cache_entries Pages in the cache.",
+                  "# TYPE patenttools_cache_entries gauge",
+                  sample_line("patenttools_cache_entries", "", stats["entries"]),
+                  "# HELP patenttools_cache_bytes Size of the pages in the cache.",
+                  "# TYPE patenttools_cache_bytes gauge",
+                  sample_line("patenttools_cache_bytes", "", stats["bytes"])])
+    return lines
+
+
+# The registry used throughout PatentTools. frontend shares it.
+registry = MetricsRegistry()
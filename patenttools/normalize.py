@@ -0,0 +1,49 @@
+# Text normalization shared by USPTOLookup and TextDistiller.
+# Each function replaces a chain of re.sub calls with a single precompiled
+# pattern or a translation table. The results are unchanged.
+
+# Import necessary modules
+import re
+
+# In clean_num: a leading US, letters with any digits after them (like the
+# A1 in a publication number), punctuation, and white space. "US" is tried
+# first, so the digits after it are kept. Digits after letters are removed
+# even if an "US" comes between them, as when "US" was removed first.
+PATENT_NUMBER_JUNK = re.compile(r"US|[a-zA-Z]+(?:[0-9]|US)*|[,.\\!?#-]+|\s+")
+
+# In USPTOLookup.clean_text: runs of white space, and lone line breaks.
+# Every match starts with a white space character, which lets the regex
+# engine skip quickly over the rest of the text.
+EXTRA_WHITESPACE = re.compile(r"\s(?:\s+|(?<=\n))")
+
+# In TextDistiller.clean_text, applied to lowercase text: runs of white
+# space, and every other character that is not a letter.
+NOT_LETTERS = re.compile(r"\s+|[^a-zA-Z\s]")
+
+# For ASCII text, TextDistiller.clean_text is cheaper as a translation
+# table, once runs of white space have been collapsed: letters are
+# lowercased and every other byte becomes a space.
+WHITESPACE = re.compile(r"\s+")
+ASCII_LETTERS_ONLY = bytes(code + 32 if 65 <= code <= 90           # A-Z
+                           else code if 97 <= code <= 122         # a-z
+                           else 32 for code in range(256))
+
+
+def strip_patent_number(raw_patent_num):
+    # Strip letters, punctuation and white space from a patent number, as the four
+    # substitutions in the original clean_num did.
+    return PATENT_NUMBER_JUNK.sub("", raw_patent_num)
+
+
+def squeeze_whitespace(ugly_text):
+    # Replace runs of white space, and line breaks, with single spaces.
+    return EXTRA_WHITESPACE.sub(" ", ugly_text)
+
+
+def letters_only(raw_text):
+    # Lowercase the text and replace everything that is not a letter with
+    # a space, collapsing runs of white space first.
+    if raw_text.isascii():
+        collapsed = WHITESPACE.sub(" ", raw_text).encode("ascii")
+        return collapsed.translate(ASCII_LETTERS_ONLY).decode("ascii")
+    return NOT_LETTERS.sub(" ", raw_text.lower())
@@ -0,0 +1,506 @@
+# A single-pass parser for patent pages served by the USPTO's patft server.
+# PatentPageParser reads the document once, as a stream of HTMLParser
+# events, and picks out every field that USPTOLookup.parse_us_pat needs
+# along the way. No tree is built and nothing is searched twice.
+# It follows the rules that BeautifulSoup's html.parser tree builder
+# (as of the pinned beautifulsoup4 4.9) uses to nest tags, decode
+# references and merge text, so both parser engines give the same results.
+
+# Import necessary modules
+import re
+from html import unescape
+from html.entities import codepoint2name
+from html.parser import HTMLParser
+
+# Tags which BeautifulSoup closes as soon as they are opened.
+VOID_TAGS = frozenset(["area", "base", "br", "col", "embed", "hr", "img",
+                       "input", "keygen", "link", "menuitem", "meta", "param",
+                       "source", "track", "wbr", "basefont", "bgsound",
+                       "command", "frame", "image", "isindex", "nextid",
+                       "spacer"])
+
+# Tags inside which whitespace-only text is kept as it is.
+PRESERVE_WHITESPACE_TAGS = frozenset(["pre", "textarea"])
+
+# Tags whose strings are not counted in the text of the tags around them.
+STRING_CONTAINER_TAGS = frozenset(["style", "script", "template"])
+ASCII_SPACES = "\x20\x0a\x09\x0c\x0d"
+
+# Start and end tags without attributes or spaces, which make up most of a
+# patent page's markup. These skip HTMLParser's general tag parsing. Tags
+# whose content HTMLParser reads specially always take the general path.
+SIMPLE_START_TAG = re.compile(r"<([a-zA-Z][a-zA-Z0-9]*)>")
+SIMPLE_END_TAG = re.compile(r"</([a-zA-Z][a-zA-Z0-9]*)>")
+
+# Start tags whose attributes are plainly written: names of letters, digits
+# and dashes, with values that are quoted, or unquoted without slashes, and
+# no "/>" at the end. These are read here as HTMLParser would read them.
+ATTRS_START_TAG = re.compile(r"""<([a-zA-Z][a-zA-Z0-9]*)
+                                 ((?:[ \t\n\r\f]+[a-zA-Z][-a-zA-Z0-9]*
+                                     (?:[ \t\n\r\f]*=[ \t\n\r\f]*
+                                        (?:"[^"<>]*"|'[^'<>]*'|[^ \t\n\r\f"'=<>`/]+))?)+)
+                                 [ \t\n\r\f]*>""", re.VERBOSE)
+ATTR = re.compile(r"""([a-zA-Z][-a-zA-Z0-9]*)
+                      (?:[ \t\n\r\f]*=[ \t\n\r\f]*
+                         (?:"([^"]*)"|'([^']*)'|([^ \t\n\r\f"'=<>`/]+)))?""", re.VERBOSE)
+RAW_TEXT_TAGS = frozenset(["script", "style", "textarea", "title", "xmp",
+                           "iframe", "noembed", "noframes", "noscript", "plaintext"])
+
+# The tokens PatentPageParser reads without HTMLParser's help: text, simple
+# tags, and well-formed character references. Everything else is passed to
+# HTMLParser's own parse_* methods.
+FAST_TOKEN = re.compile(r"""([^<&]+)
+                          |<([a-zA-Z][a-zA-Z0-9]*)>
+                          |</([a-zA-Z][a-zA-Z0-9]*)>
+                          |&([a-zA-Z][a-zA-Z0-9]*);
+                          |&\#([0-9]+|[xX][0-9a-fA-F]+);""", re.VERBOSE)
+TAG_OPEN = re.compile(r"<[a-zA-Z]")
+
+# The named references BeautifulSoup recognizes: those of HTML 4, plus &apos;.
+ENTITIES = {name : chr(codepoint) for codepoint, name in codepoint2name.items()}
+ENTITIES["apos"] = "'"
+
+# Labels whose following tag holds the text of a field.
+LABELED_FIELDS = (("Filed:", "filing_date"),
+                  ("Assignee:", "assignee"),
+                  ("Abstract", "abstract"),
+                  ("Current CPC Class:", "primary_cpc"))
+
+# Headings of the citation tables, and the field counting each table's rows.
+CITATION_TABLES = {"U.S. Patent Documents" : "cited_us",
+                   "Foreign Patent Documents" : "cited_for"}
+
+
+class _OpenTag:
+
+    """
+    Bookkeeping for one tag while it is open.
+    """
+
+    __slots__ = ("name", "seq", "first_string", "children", "only", "text", "fields", "rows", "cells")
+
+    def __init__(self, name, seq, first_string):
+        self.name = name
+        self.seq = seq                    # Position among all start tags
+        self.first_string = first_string  # Index of the first string inside
+        self.children = 0
+        self.only = None                  # The first child (a str or _OpenTag)
+        self.text = None                  # Strings collected for .text
+        self.fields = None                # Fields that take this tag's text
+        self.rows = None                  # Citation fields counting <tr>s
+        self.cells = None                 # First cells of citation rows this fills
+
+
+# Stands in for any closed tag that has no string, such as a void tag.
+EMPTY_TAG = _OpenTag("", -1, -1)
+
+
+class PatentPageParser(HTMLParser):
+
+    """
+    Instances of this class are fed the HTML of one patent page. Once
+    closed, they hold the raw text of each field that parse_us_pat reads.
+    """
+
+    def __init__(self):
+        HTMLParser.__init__(self, convert_charrefs = False)
+        self.strings = []         # Every string in the document, in order
+        self.texts = {}           # Text of the tag following each label
+        self.rows = {}            # Row counts of the citation tables
+        self.first_cells = {}     # Text of each citation row's first <td>
+        self.no_match = False
+        self.claims_b = None      # (seq, first_string) of the "Claims" <b>
+        self.description_b = None
+
+        self._stack = []
+        self._pending = []        # Text waiting to become a string
+        self._preserve = 0        # Open tags that preserve whitespace
+        self._containers = 0      # Open string container tags
+        self._seq = 0
+        self._closed_void = {}    # Void tags that may see a redundant end tag
+
+        self._seeking = list(LABELED_FIELDS)
+        self._await_tag = []      # Fields waiting for the next tag
+        self._collecting = []     # Open tags collecting text
+        self._title_found = False
+        self._refs_found = False
+        self._headings = {}       # Citation fields waiting for their heading
+        self._await_table = []    # Citation fields waiting for a <table>
+        self._counting = []       # Open tables counting rows
+        self._open_rows = []      # Open citation rows without a <td> yet
+
+    # Tokenizing
+
+    def feed_page(self, patent_html):
+        # Read a whole page. Markup of the kind patft generates is tokenized
+        # here directly; a page with anything unusual is read again from
+        # the start by HTMLParser.
+        if not self._feed_fast(patent_html):
+            PatentPageParser.__init__(self)
+            self.feed(patent_html)
+        self.close()
+        return
+
+    def _feed_fast(self, patent_html):
+        # Tokenize the page as HTMLParser.goahead would, returning False if
+        # it meets markup that only HTMLParser can handle faithfully.
+        self.rawdata = patent_html
+        match_token = FAST_TOKEN.match
+        add_text = self._pending.append
+        pos = 0
+        end = len(patent_html)
+        while pos < end:
+            match = match_token(patent_html, pos)
+            if match is None:
+                pos = self._parse_markup(pos)
+                if pos < 0:
+                    return False
+                continue
+
+            kind = match.lastindex
+            if kind == 1:
+                add_text(match.group(1))
+            elif kind == 2:
+                tag = match.group(2).lower()
+                if tag in VOID_TAGS:
+                    self._void(tag)
+                elif tag in RAW_TEXT_TAGS:
+                    pos = self._parse_markup(pos)
+                    if pos < 0:
+                        return False
+                    continue
+                else:
+                    self._start(tag, [])
+            elif kind == 3:
+                self.handle_endtag(match.group(3).lower())
+            elif kind == 4:
+                self.handle_entityref(match.group(4))
+            else:
+                self.handle_charref(match.group(5))
+            pos = match.end()
+
+        self.rawdata = ""
+        return True
+
+    def _parse_markup(self, i):
+        # Hand the markup at position i to HTMLParser's parse_* methods, as
+        # HTMLParser.goahead does. Returns the position after it, or -1 if
+        # the fast tokenizer should give up.
+        rawdata = self.rawdata
+        if rawdata.startswith("<!--", i):
+            k = self.parse_comment(i)
+        elif rawdata.startswith("<!", i):
+            k = self.parse_html_declaration(i)
+        elif rawdata.startswith("</", i):
+            k = self.parse_endtag(i)
+        elif rawdata.startswith("<?", i):
+            k = self.parse_pi(i)
+        elif TAG_OPEN.match(rawdata, i):
+            k = self.parse_starttag(i)
+            if self.cdata_elem is not None:
+                return -1
+        else:
+            return -1
+        return k
+
+    # HTMLParser tag parsing
+
+    def parse_starttag(self, i):
+        match = SIMPLE_START_TAG.match(self.rawdata, i)
+        if match is not None:
+            tag = match.group(1).lower()
+            if tag not in RAW_TEXT_TAGS:
+                self.lasttag = tag
+                self.handle_starttag(tag, [])
+                return match.end()
+        match = ATTRS_START_TAG.match(self.rawdata, i)
+        if match is not None:
+            tag = match.group(1).lower()
+            if tag not in RAW_TEXT_TAGS:
+                self.lasttag = tag
+                self.handle_starttag(tag, parse_attrs(match.group(2)))
+                return match.end()
+        return HTMLParser.parse_starttag(self, i)
+
+    def parse_endtag(self, i):
+        if self.cdata_elem is None:
+            match = SIMPLE_END_TAG.match(self.rawdata, i)
+            if match is not None:
+                self.handle_endtag(match.group(1).lower())
+                self.clear_cdata_mode()
+                return match.end()
+        return HTMLParser.parse_endtag(self, i)
+
+    # HTMLParser event handlers
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            self._void(tag)
+        else:
+            self._start(tag, attrs)
+
+    def handle_startendtag(self, tag, attrs):
+        # BeautifulSoup lets an earlier void tag's redundant end tag list
+        # absorb this one's end, which leaves the tag open.
+        self._start(tag, attrs)
+        self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        closed = self._closed_void.get(tag)
+        if closed:
+            # A redundant end tag for a tag that was closed when it opened.
+            self._closed_void[tag] = closed - 1
+        else:
+            self._end(tag)
+
+    def handle_data(self, data):
+        self._pending.append(data)
+
+    def handle_entityref(self, name):
+        # Unknown references are kept as text, without their semicolon.
+        self._pending.append(ENTITIES.get(name) or "&" + name)
+
+    def handle_charref(self, name):
+        # Low code points are read as Windows-1252, which is what pages that
+        # use them almost always mean.
+        if name[0] in "xX":
+            codepoint = int(name.lstrip("xX"), 16)
+        else:
+            codepoint = int(name)
+        data = None
+        if codepoint < 256:
+            try:
+                data = bytes([codepoint]).decode("windows-1252")
+            except UnicodeDecodeError:
+                pass
+        if not data:
+            try:
+                data = chr(codepoint)
+            except (ValueError, OverflowError):
+                pass
+        self._pending.append(data or "\N{REPLACEMENT CHARACTER}")
+
+    def handle_comment(self, data):
+        self._flush()
+        self._pending.append(data)
+        self._flush(False)
+
+    def handle_decl(self, decl):
+        self._flush()
+        self._pending.append(decl[len("DOCTYPE "):])
+        self._flush(False)
+
+    def unknown_decl(self, data):
+        # CDATA blocks count as ordinary text; other declarations do not.
+        is_cdata = data.upper().startswith("CDATA[")
+        if is_cdata:
+            data = data[len("CDATA["):]
+        self._flush()
+        self._pending.append(data)
+        self._flush(is_cdata)
+
+    def handle_pi(self, data):
+        self._flush()
+        self._pending.append(data)
+        self._flush(False)
+
+    def close(self):
+        HTMLParser.close(self)
+        self._flush()
+        while self._stack:
+            self._pop()
+
+    def text_of(self, field):
+        # Return the text found for a field. Like the BeautifulSoup engine,
+        # raise AttributeError if the page does not have it.
+        try:
+            return self.texts[field]
+        except KeyError:
+            raise AttributeError("The patent page has no %s." % field)
+
+    # Tree bookkeeping
+
+    def _flush(self, is_text = True):
+        # Turn pending text into a string, as BeautifulSoup.endData does.
+        # Comments and similar strings are searched, but are not part of
+        # any tag's text.
+        pending = self._pending
+        if not pending:
+            return
+        string = pending[0] if len(pending) == 1 else "".join(pending)
+        pending.clear()
+        if not self._preserve and not string.strip(ASCII_SPACES):
+            string = "\n" if "\n" in string else " "
+
+        self.strings.append(string)
+        if self._stack:
+            parent = self._stack[-1]
+            parent.children += 1
+            if parent.children == 1:
+                parent.only = string
+        if is_text and not self._containers:
+            for open_tag in self._collecting:
+                open_tag.text.append(string)
+
+        # Check the string against everything still being looked for.
+        if self._headings:
+            field = self._headings.pop(string, None)
+            if field is not None:
+                self._await_table.append(field)
+        if self._seeking:
+            for label, field in list(self._seeking):
+                if label in string:
+                    self._seeking.remove((label, field))
+                    self._await_tag.append(field)
+        if not self._refs_found and "References Cited" in string:
+            self._refs_found = True
+            self._headings = dict(CITATION_TABLES)
+        if "No patents have matched" in string:
+            self.no_match = True
+        return
+
+    def _start(self, name, attrs):
+        self._flush()
+        open_tag = _OpenTag(name, self._seq, len(self.strings))
+        self._seq += 1
+        if self._stack:
+            parent = self._stack[-1]
+            parent.children += 1
+            if parent.children == 1:
+                parent.only = open_tag
+
+        if self._await_tag:
+            open_tag.fields = self._await_tag
+            self._await_tag = []
+        if not self._title_found and name == "font" and dict(attrs).get("size") == "+1":
+            self._title_found = True
+            open_tag.fields = (open_tag.fields or []) + ["title"]
+        if open_tag.fields:
+            open_tag.text = []
+            self._collecting.append(open_tag)
+
+        if name == "tr":
+            for table in self._counting:
+                for field in table.rows:
+                    self.rows[field] += 1
+                    self.first_cells[field].append(None)
+                    open_tag.cells = (open_tag.cells or []) + [(field, len(self.first_cells[field]) - 1)]
+            if open_tag.cells:
+                self._open_rows.append(open_tag)
+        elif name == "td" and self._open_rows:
+            # The first <td> in a citation row holds the cited document's
+            # number. Its text is collected like a field's.
+            open_tag.cells = [cell for row in self._open_rows for cell in row.cells]
+            self._open_rows = []
+            if open_tag.text is None:
+                open_tag.text = []
+                self._collecting.append(open_tag)
+        elif name == "table" and self._await_table:
+            open_tag.rows = self._await_table
+            self._await_table = []
+            for field in open_tag.rows:
+                self.rows[field] = 0
+                self.first_cells[field] = []
+            self._counting.append(open_tag)
+
+        if name in PRESERVE_WHITESPACE_TAGS:
+            self._preserve += 1
+        if name in STRING_CONTAINER_TAGS:
+            self._containers += 1
+        self._stack.append(open_tag)
+        return
+
+    def _void(self, name):
+        # A void tag opens and closes at once, so it has no children, no
+        # text and no string. It only needs to be counted as a child and
+        # as the tag following any label still waiting for one.
+        if self._pending:
+            self._flush()
+        self._seq += 1
+        if self._stack:
+            parent = self._stack[-1]
+            parent.children += 1
+            if parent.children == 1:
+                parent.only = EMPTY_TAG
+        if self._await_tag:
+            for field in self._await_tag:
+                self.texts[field] = ""
+            self._await_tag = []
+        self._closed_void[name] = self._closed_void.get(name, 0) + 1
+        return
+
+    def _end(self, name):
+        # Pop up to and including the most recent open tag of this name.
+        # End tags that match no open tag pop nothing, but still end the
+        # current string.
+        self._flush()
+        for open_tag in reversed(self._stack):
+            if open_tag.name == name:
+                break
+        else:
+            return
+        while self._pop() is not open_tag:
+            pass
+        return
+
+    def _pop(self):
+        open_tag = self._stack.pop()
+        if open_tag.name in PRESERVE_WHITESPACE_TAGS:
+            self._preserve -= 1
+        if open_tag.name in STRING_CONTAINER_TAGS:
+            self._containers -= 1
+        if open_tag.fields:
+            self._collecting.remove(open_tag)
+            text = "".join(open_tag.text)
+            for field in open_tag.fields:
+                self.texts[field] = text
+        if open_tag.cells:
+            if open_tag.name == "tr":
+                if open_tag in self._open_rows:
+                    self._open_rows.remove(open_tag)
+            else:
+                if not open_tag.fields:
+                    self._collecting.remove(open_tag)
+                text = "".join(open_tag.text)
+                for field, row in open_tag.cells:
+                    self.first_cells[field][row] = text
+        if open_tag.rows:
+            self._counting.remove(open_tag)
+
+        # Work out the tag's .string. A single child string is the tag's
+        # string; a single child tag passes on its own string.
+        if open_tag.children == 1:
+            only = open_tag.only
+            open_tag.only = only if only.__class__ is str else only.only
+        else:
+            open_tag.only = None
+
+        if open_tag.name == "b" and open_tag.only is not None:
+            position = (open_tag.seq, open_tag.first_string)
+            if "Claims" in open_tag.only and (self.claims_b is None or position < self.claims_b):
+                self.claims_b = position
+            if "Description" in open_tag.only and (self.description_b is None or position < self.description_b):
+                self.description_b = position
+        return open_tag
+
+
+def parse_attrs(markup):
+    # The attributes of a start tag matched by ATTRS_START_TAG, as
+    # HTMLParser reports them: lowercased names, and values unquoted and
+    # unescaped, or None for an attribute without a value.
+    attrs = []
+    for match in ATTR.finditer(markup):
+        double, single, bare = match.group(2, 3, 4)
+        value = double if double is not None else single if single is not None else bare
+        if value and "&" in value:
+            value = unescape(value)
+        attrs.append((match.group(1).lower(), value))
+    return attrs
+
+
+def parse_patent_page(patent_html):
+    # Parse a patent page in a single pass. Returns the PatentPageParser,
+    # whose attributes hold the raw (uncleaned) field values.
+    parser = PatentPageParser()
+    parser.feed_page(patent_html)
+    return parser
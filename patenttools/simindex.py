@@ -0,0 +1,230 @@
+# A persistent index of patents that have been looked up, for finding the
+# ones most similar to a given patent.
+# Each patent is summarized by a MinHash signature of its distinct tokens.
+# Locality-sensitive hashing splits every signature into bands; patents
+# that agree on all of a band's rows share a bucket, and only patents that
+# share a bucket with the query are scored. Queries therefore touch a few
+# index entries instead of every patent.
+# Candidates are scored by the cosine similarity of their TF-IDF weights
+# to the query's, in a TermDocumentMatrix. The index keeps each patent's
+# word counts, and the number of patents containing each word, for this.
+# The index lives in an SQLite database next to the page cache. It is
+# memory-mapped, so all gunicorn workers read the same pages from the OS
+# page cache instead of each loading a copy, and new patents are added
+# incrementally under SQLite's locking.
+
+# Import necessary modules
+import hashlib
+import json
+import zlib
+import numpy as np
+from termmatrix import TermDocumentMatrix
+import sqlite_store
+import config     # User-definable configuration
+
+# MinHash uses random linear hash functions modulo a Mersenne prime.
+MERSENNE_PRIME = (1 << 31) - 1
+SIGNATURE_SEED = 1
+
+
+class SimilarityIndex:
+
+    """
+    Instances of this class store MinHash signatures and word counts of
+    patents and answer top-k similarity queries. Similarities are cosine
+    similarities between the patents' TF-IDF weights.
+    """
+
+    def __init__(self, path = config.simindex_path, num_perm = config.simindex_perms,
+                 bands = config.simindex_bands):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.path = path
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+
+        rng = np.random.RandomState(SIGNATURE_SEED)
+        self._a = rng.randint(1, MERSENNE_PRIME, size = (num_perm, 1)).astype(np.uint64)
+        self._b = rng.randint(0, MERSENNE_PRIME, size = (num_perm, 1)).astype(np.uint64)
+
+        db = sqlite_store.connect(path, create = True)
+        try:
+            with db:
+                db.execute("""CREATE TABLE IF NOT EXISTS meta (
+                                  name TEXT PRIMARY KEY,
+                                  value INTEGER NOT NULL)""")
+                db.execute("""CREATE TABLE IF NOT EXISTS signatures (
+                                  number TEXT PRIMARY KEY,
+                                  title TEXT,
+                                  signature BLOB NOT NULL)""")
+                db.execute("""CREATE TABLE IF NOT EXISTS buckets (
+                                  key INTEGER NOT NULL,
+                                  number TEXT NOT NULL)""")
+                db.execute("CREATE INDEX IF NOT EXISTS buckets_key ON buckets (key)")
+                db.execute("CREATE INDEX IF NOT EXISTS buckets_number ON buckets (number)")
+                db.execute("""CREATE TABLE IF NOT EXISTS terms (
+                                  number TEXT PRIMARY KEY,
+                                  counts BLOB NOT NULL)""")
+                db.execute("""CREATE TABLE IF NOT EXISTS doc_freqs (
+                                  term TEXT PRIMARY KEY,
+                                  docs INTEGER NOT NULL) WITHOUT ROWID""")
+
+                # Signatures made with other settings cannot be compared, so
+                # the index starts over if the settings change.
+                settings = {"num_perm" : num_perm, "bands" : bands, "seed" : SIGNATURE_SEED}
+                stored = dict(db.execute("SELECT name, value FROM meta").fetchall())
+                if stored != settings:
+                    db.execute("DELETE FROM signatures")
+                    db.execute("DELETE FROM buckets")
+                    db.execute("DELETE FROM terms")
+                    db.execute("DELETE FROM doc_freqs")
+                    db.execute("DELETE FROM meta")
+                    db.executemany("INSERT INTO meta VALUES (?, ?)", settings.items())
+
+                # Earlier versions indexed patents that could not be found,
+                # without a title, which are never shown, and kept no word
+                # counts. Such patents are dropped, and indexed again when
+                # they are next looked up.
+                db.execute("""DELETE FROM signatures WHERE title IS NULL
+                                  OR number NOT IN (SELECT number FROM terms)""")
+                db.execute("DELETE FROM buckets WHERE number NOT IN (SELECT number FROM signatures)")
+        finally:
+            db.close()
+
+    def _connect(self):
+        # The database file is memory-mapped, so that its pages are shared
+        # by every process that reads it.
+        db = sqlite_store.connect(self.path)
+        db.execute("PRAGMA mmap_size = %d" % config.simindex_mmap_bytes)
+        return db
+
+    def signature(self, tokens):
+        # Compute the MinHash signature of a collection of tokens, such as a
+        # TextDistiller's word_freqs. Duplicates do not matter.
+        hashes = np.fromiter((zlib.crc32(token.encode("utf-8")) for token in set(tokens)),
+                             dtype = np.uint64)
+        if len(hashes) == 0:
+            return np.full(self.num_perm, MERSENNE_PRIME, dtype = np.uint32)
+        return ((self._a * hashes + self._b) % MERSENNE_PRIME).min(axis = 1).astype(np.uint32)
+
+    def _bucket_keys(self, signature):
+        # One key per band, derived from the band's number and its rows.
+        keys = []
+        for band in range(self.bands):
+            rows = signature[band * self.rows:(band + 1) * self.rows]
+            digest = hashlib.blake2b(rows.tobytes(), digest_size = 8,
+                                     person = band.to_bytes(2, "big")).digest()
+            keys.append(int.from_bytes(digest, "big", signed = True))
+        return keys
+
+    def __len__(self):
+        db = self._connect()
+        try:
+            return db.execute("SELECT COUNT(*) FROM signatures").fetchone()[0]
+        finally:
+            db.close()
+
+    def __contains__(self, number):
+        db = self._connect()
+        try:
+            return db.execute("SELECT 1 FROM signatures WHERE number = ?",
+                              (number,)).fetchone() is not None
+        finally:
+            db.close()
+
+    def add(self, number, title, word_freqs, signature = None):
+        # Add a patent to the index from its word counts, such as a
+        # TextDistiller's word_freqs, replacing any earlier entry for it. The
+        # signature of the counts may be given if it has been computed
+        # already. A patent without a title, or without any tokens at all,
+        # would only produce meaningless matches, and is refused.
+        if title is None:
+            raise ValueError("patent %s has no title" % number)
+        if not word_freqs:
+            raise ValueError("patent %s has no tokens" % number)
+        if signature is None:
+            signature = self.signature(word_freqs)
+        counts = zlib.compress(json.dumps(dict(word_freqs), separators = (",", ":")).encode("utf-8"))
+        db = self._connect()
+        try:
+            with sqlite_store.write_transaction(db):
+                self._forget(db, number)
+                db.execute("INSERT INTO signatures VALUES (?, ?, ?)",
+                           (number, title, signature.astype(np.uint32).tobytes()))
+                db.execute("INSERT INTO terms VALUES (?, ?)", (number, counts))
+                db.executemany("INSERT INTO buckets VALUES (?, ?)",
+                               [(key, number) for key in self._bucket_keys(signature)])
+                db.executemany("INSERT OR IGNORE INTO doc_freqs VALUES (?, 0)", ((term,) for term in word_freqs))
+                db.executemany("UPDATE doc_freqs SET docs = docs + 1 WHERE term = ?",
+                               ((term,) for term in word_freqs))
+        finally:
+            db.close()
+
+        return
+
+    def remove(self, number):
+        # Remove a patent from the index, if it is there.
+        db = self._connect()
+        try:
+            with sqlite_store.write_transaction(db):
+                self._forget(db, number)
+        finally:
+            db.close()
+
+        return
+
+    def _forget(self, db, number):
+        # Delete a patent's entry, and take its words out of the document
+        # frequencies, within a write transaction.
+        row = db.execute("SELECT counts FROM terms WHERE number = ?", (number,)).fetchone()
+        if row is not None:
+            terms = json.loads(zlib.decompress(row[0]).decode("utf-8"))
+            db.executemany("UPDATE doc_freqs SET docs = docs - 1 WHERE term = ?", ((term,) for term in terms))
+            db.execute("DELETE FROM doc_freqs WHERE docs <= 0")
+        db.execute("DELETE FROM buckets WHERE number = ?", (number,))
+        db.execute("DELETE FROM signatures WHERE number = ?", (number,))
+        db.execute("DELETE FROM terms WHERE number = ?", (number,))
+        return
+
+    def query(self, word_freqs, top_k = config.similar_count, exclude = None, signature = None):
+        # Return up to top_k (number, title, similarity) tuples for the
+        # indexed patents most similar to a patent's word counts, best
+        # first. Only patents sharing at least one bucket with its
+        # signature, which may be given if it has been computed already,
+        # are scored.
+        if signature is None:
+            signature = self.signature(word_freqs)
+        keys = self._bucket_keys(signature)
+        db = self._connect()
+        try:
+            # The candidates and the document frequencies are read from one
+            # snapshot of the index, in a read transaction.
+            db.execute("BEGIN")
+            rows = db.execute("""SELECT number, title, counts FROM signatures JOIN terms USING (number)
+                                 WHERE number IN (SELECT number FROM buckets
+                                                  WHERE key IN (%s))
+                                 ORDER BY number""" % ",".join("?" * len(keys)),
+                              keys).fetchall()
+            rows = [row for row in rows if row[0] != exclude]
+            if not rows:
+                return []
+
+            # The query is scored as one more document, over the words of
+            # the query and the candidates, with TF-IDF weights from the
+            # document frequencies of the whole index.
+            documents = [(None, word_freqs)]
+            documents += [(number, json.loads(zlib.decompress(counts).decode("utf-8")))
+                          for number, title, counts in rows]
+            db.execute("CREATE TEMP TABLE vocabulary (term TEXT PRIMARY KEY)")
+            db.executemany("INSERT OR IGNORE INTO temp.vocabulary VALUES (?)",
+                           ((term,) for doc_id, counts in documents for term in counts))
+            doc_freq = dict(db.execute("SELECT term, docs FROM doc_freqs JOIN temp.vocabulary USING (term)"))
+            num_docs = db.execute("SELECT COUNT(*) FROM signatures").fetchone()[0]
+        finally:
+            db.close()
+
+        matrix = TermDocumentMatrix.from_freqs(documents, doc_freq, num_docs)
+        titles = {number : title for number, title, counts in rows}
+        return [(number, titles[number], similarity)
+                for number, similarity in matrix.most_similar(None, top_k)]
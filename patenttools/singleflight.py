@@ -0,0 +1,128 @@
+# Coalescing of concurrent requests for the same work, such as looking up
+# and distilling a patent that many users open at once.
+# Within a worker, the first request for a key (the leader) runs the work,
+# and requests for the same key that arrive meanwhile wait for it and share
+# its result, or its exception. Across workers, the leader of each worker
+# also takes an exclusive lock on one of a fixed set of lock files, chosen
+# by a hash of the key; a worker that finds the file locked waits for the
+# other worker to finish, and then does the work itself. Only what the work
+# stores in the shared cache, such as a fetched page or a drawn word cloud,
+# is shared across workers; the rest, such as distilling a patent, is only
+# coalesced within a worker, and is redone by a worker that waited.
+# Unrelated keys that share a lock file may occasionally wait for each
+# other, for no longer than the timeout.
+# Each outcome is counted in patenttools_singleflight_total: "leader" when a
+# request did the work first, "hit" when it shared another request's
+# result in the same worker, and "wait" when it waited for another worker.
+
+# Import necessary modules
+import contextlib
+import hashlib
+import os
+import threading
+import time
+from metrics import registry
+import config     # User-definable configuration
+
+# File locks need fcntl, which is not available on Windows. There, requests
+# are only coalesced within each worker.
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class Flight:
+
+    """
+    Instances of this class hold the outcome of one run of the work for a
+    key, for the requests waiting on it.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+
+    """
+    Instances of this class run the work for each key at most once at a
+    time, sharing the result with concurrent requests for the same key.
+    """
+
+    def __init__(self, lock_dir = config.singleflight_dir, timeout = config.singleflight_timeout,
+                 slots = config.singleflight_slots):
+        self.lock_dir = lock_dir
+        self.timeout = timeout
+        self.slots = slots
+        self._flights = {}             # key -> Flight of the work in progress
+        self._lock = threading.Lock()
+        if lock_dir is not None and fcntl is not None:
+            os.makedirs(lock_dir, exist_ok = True)
+
+    def do(self, key, function):
+        # Return function(), run once for all concurrent requests for key.
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Flight()
+
+        if not leader:
+            registry.count("patenttools_singleflight_total", result = "hit")
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            with self._file_lock(key):
+                flight.result = function()
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result
+
+    def _lock_path(self, key):
+        # The lock file of the slot that key hashes to, so that the number
+        # of lock files stays fixed however many keys there are.
+        slot = int(hashlib.sha1(key.encode("utf-8")).hexdigest(), 16) % self.slots
+        return os.path.join(self.lock_dir, "slot-%d.lock" % slot)
+
+    @contextlib.contextmanager
+    def _file_lock(self, key):
+        # Hold the lock file for key while the work runs, first waiting (up
+        # to the timeout) for any other worker holding it. Lock files are
+        # empty and are kept, since removing one while another worker waits
+        # on it would let two workers run at once; there are only as many
+        # as there are slots.
+        if self.lock_dir is None or fcntl is None:
+            registry.count("patenttools_singleflight_total", result = "leader")
+            yield
+            return
+
+        with open(self._lock_path(key), "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                registry.count("patenttools_singleflight_total", result = "leader")
+            except BlockingIOError:
+                registry.count("patenttools_singleflight_total", result = "wait")
+                deadline = time.monotonic() + self.timeout
+                while time.monotonic() < deadline:
+                    time.sleep(0.02)
+                    try:
+                        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        break
+                    except BlockingIOError:
+                        continue
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return
@@ -0,0 +1,42 @@
+# Helpers for the SQLite databases that PatentTools keeps next to the
+# cache, and that all gunicorn workers share: the page cache's index, the
+# similarity index, the citation graph, the metrics and the job queue.
+# Connections are opened per operation, so that they are never shared
+# across a fork, with isolation_level = None, so that each operation
+# chooses its own transaction type. Reads are plain reads, which do not
+# wait for writers; writes take the write lock at once, in a short
+# write_transaction.
+
+# Import necessary modules
+import contextlib
+import os
+import sqlite3
+
+
+def connect(path, create = False):
+    # Open a connection to the database at path. With create, the
+    # database's directory is made if need be, and the database is switched
+    # to write-ahead logging, which persists in the file, so that this is
+    # only needed once, where its tables are created.
+    if create:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok = True)
+    db = sqlite3.connect(path, timeout = 30, isolation_level = None)
+    if create:
+        db.execute("PRAGMA journal_mode = WAL")
+    return db
+
+
+@contextlib.contextmanager
+def write_transaction(db):
+    # Run the statements in a with block in one write transaction, which is
+    # committed if the block completes (unless it ended the transaction
+    # itself) and rolled back if it raises.
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        yield db
+        if db.in_transaction:
+            db.execute("COMMIT")
+    except BaseException:
+        if db.in_transaction:
+            db.execute("ROLLBACK")
+        raise
@@ -0,0 +1,142 @@
+# Worker startup: loading the modules that are slow to import ahead of
+# time, and a profile of what a worker spends before it serves its first
+# request.
+# NLTK (which imports SciPy) and wordcloud (which imports matplotlib) take
+# over a second to import, so distiller and lookup import them where they
+# are first used. Results pages do not need NLTK at all unless
+# config.tokenizer is "nltk", since words and bigrams are counted and
+# scored without it, nor BeautifulSoup unless config.parser_engine is
+# "soup". With gunicorn.conf.py, the gunicorn master imports the app and
+# the modules these settings need once, before forking workers, so that
+# every worker starts with them loaded and shares their memory
+# copy-on-write.
+#
+# Run this module for the startup profile:
+#   python startup.py             # time to first request, lazily and preloaded
+#   python startup.py --top 30    # and the 30 slowest imports
+#   python startup.py --eager     # also with the heavy modules imported at startup
+
+# Import necessary modules
+import argparse
+import importlib
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import config     # User-definable configuration
+
+
+def heavy_modules(tokenizer = config.tokenizer, parser_engine = config.parser_engine):
+    # The modules imported where first used rather than at startup, that
+    # the app will use with the given settings. Word clouds are always
+    # drawn with wordcloud; NLTK and BeautifulSoup are only used by the
+    # tokenizer and parser engine that need them.
+    modules = []
+    if tokenizer == "nltk":
+        modules.append("nltk.tokenize")
+    if parser_engine == "soup":
+        modules.append("bs4")
+    modules.append("wordcloud")
+    return tuple(modules)
+
+# The modules preloaded with the configured settings.
+HEAVY_MODULES = heavy_modules()
+
+# The first request a worker serves: the search form, then the analysis of
+# a short text, as for a results page.
+SAMPLE_TEXT = """A touch screen device comprising a display layer and a touch sensing
+layer, wherein the touch sensing layer is coupled to the display layer and the touch
+sensing layer detects a touch on the display layer."""
+
+# Run in a fresh interpreter for each mode of the profile. Prints the
+# seconds spent loading, and until the first request has been served.
+PROFILE_SCRIPT = """
+import json, os, sys, time
+start = time.perf_counter()
+import startup
+if "%(mode)s" == "eager":
+    startup.preload()
+import frontend
+if "%(mode)s" == "preload":
+    startup.preload()
+loaded = time.perf_counter()
+
+def first_request():
+    frontend.app.test_client().get("/")
+    distiller = frontend.TextDistiller(startup.SAMPLE_TEXT, visuals = False)
+    distiller.word_freqs
+    distiller.gen_bigrams(min_freq = 1)
+
+# A preloaded app is served by forked workers, as under gunicorn.
+forked = time.perf_counter()
+if "%(mode)s" == "preload":
+    pid = os.fork()
+    if pid == 0:
+        first_request()
+        os._exit(0)
+    os.waitpid(pid, 0)
+else:
+    first_request()
+served = time.perf_counter()
+print(json.dumps({"load" : loaded - start, "first_request" : served - forked}))
+"""
+
+IMPORT_TIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def preload():
+    # Import HEAVY_MODULES, and return the seconds taken.
+    start = time.perf_counter()
+    for name in HEAVY_MODULES:
+        importlib.import_module(name)
+    return time.perf_counter() - start
+
+
+def profile(mode):
+    # Run PROFILE_SCRIPT in a fresh interpreter, with a temporary cache, and
+    # return its timings and the import time of each module it imported, as
+    # (seconds, module, nesting) tuples in import order.
+    env = dict(os.environ, PATENTTOOLS_CACHE_DIR = tempfile.mkdtemp())
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", PROFILE_SCRIPT % {"mode" : mode}],
+                            cwd = os.path.dirname(os.path.abspath(__file__)), env = env,
+                            capture_output = True, text = True, check = True)
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    imports = [(int(cumulative) / 1e6, name, len(indent) // 2)
+               for self_us, cumulative, indent, name in IMPORT_TIME.findall(result.stderr)]
+    return timings, imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Profile the startup of a PatentTools worker.")
+    parser.add_argument("--top", type = int, default = 15, help = "slowest imports to list")
+    parser.add_argument("--eager", action = "store_true",
+                        help = "also profile importing the heavy modules at startup")
+    args = parser.parse_args()
+
+    modes = (("eager",) if args.eager else ()) + ("lazy", "preload")
+    print("%-8s %12s %20s %14s" % ("mode", "load ms", "first request ms", "total ms"))
+    for mode in modes:
+        timings, imports = profile(mode)
+        total = timings["load"] + timings["first_request"]
+        print("%-8s %12.1f %20.1f %14.1f" % (mode, timings["load"] * 1000,
+                                             timings["first_request"] * 1000, total * 1000))
+        if mode == "lazy":
+            lazy_imports = imports
+    print("(preloaded, the load happens once in the gunicorn master, and each worker")
+    print("only pays for the first request)")
+
+    # The modules the app and its first request import directly, and the
+    # modules those import in turn, that took longest.
+    print()
+    print("slowest imports, lazily (ms, including the modules they import):")
+    nested = sorted((item for item in lazy_imports if item[2] <= 1 and item[1] != "frontend"), reverse = True)
+    for seconds, name, nesting in nested[:args.top]:
+        print("%10.1f  %s" % (seconds * 1000, name))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+# A sparse term-document matrix for comparing many patents at once.
+# The token counts of many documents (from TextDistiller or CorpusDistiller)
+# are stored as one SciPy CSR matrix over a shared vocabulary, with one row
+# per document. TF-IDF weights and cosine similarities are then computed
+# with vectorized sparse matrix products rather than Python loops.
+
+# Import necessary modules
+import numpy as np
+from scipy import sparse
+
+
+class TermDocumentMatrix:
+
+    """
+    Instances of this class hold the term counts of a set of documents,
+    keyed by document ids such as patent numbers, and rank the documents by
+    cosine similarity of their TF-IDF weights.
+    """
+
+    def __init__(self, doc_ids, vocabulary, counts, doc_freq = None, num_docs = None):
+        self.doc_ids = list(doc_ids)
+        self.vocabulary = vocabulary       # Term -> column index
+        self.counts = counts               # CSR matrix, documents x terms
+        self.rows = {doc_id : row for row, doc_id in enumerate(self.doc_ids)}
+        # The number of documents containing each term, and the number of
+        # documents, may be given for a larger collection than the matrix
+        # holds. By default, they are those of the matrix.
+        self.doc_freq = doc_freq           # Term -> number of documents
+        self.num_docs = num_docs
+        self._idf = None
+        self._weights = None
+
+    @classmethod
+    def from_freqs(cls, doc_freqs, doc_freq = None, num_docs = None):
+        # Build a matrix from a mapping of document id to word counts (such
+        # as a FreqDist), or an iterable of (document id, counts) pairs.
+        items = doc_freqs.items() if hasattr(doc_freqs, "items") else doc_freqs
+        vocabulary = {}
+        doc_ids = []
+        indptr = [0]
+        indices = []
+        data = []
+        for doc_id, word_freqs in items:
+            doc_ids.append(doc_id)
+            for word, count in word_freqs.items():
+                indices.append(vocabulary.setdefault(word, len(vocabulary)))
+                data.append(count)
+            indptr.append(len(indices))
+
+        counts = sparse.csr_matrix((np.array(data, dtype = np.float64),
+                                    np.array(indices, dtype = np.int32),
+                                    np.array(indptr, dtype = np.int64)),
+                                   shape = (len(doc_ids), len(vocabulary)))
+        return cls(doc_ids, vocabulary, counts, doc_freq, num_docs)
+
+    @classmethod
+    def from_distillers(cls, distillers):
+        # Build a matrix from a mapping of document id to TextDistiller.
+        return cls.from_freqs((doc_id, distiller.word_freqs) for doc_id, distiller in distillers.items())
+
+    @classmethod
+    def from_corpus(cls, corpus):
+        # Build a matrix from the documents of a CorpusDistiller.
+        return cls.from_freqs((doc_id, freqs[0]) for doc_id, freqs in corpus.doc_freqs.items())
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    @property
+    def idf(self):
+        # Smoothed inverse document frequency of each term, as if one extra
+        # document contained every term once.
+        if self._idf is None:
+            if self.doc_freq is None:
+                doc_freq = np.bincount(self.counts.indices, minlength = self.counts.shape[1])
+                num_docs = len(self)
+            else:
+                terms = sorted(self.vocabulary, key = self.vocabulary.get)
+                doc_freq = np.fromiter((self.doc_freq.get(term, 0) for term in terms),
+                                       dtype = np.float64, count = len(terms))
+                num_docs = self.num_docs
+            self._idf = np.log((1 + num_docs) / (1 + doc_freq)) + 1
+        return self._idf
+
+    @property
+    def weights(self):
+        # TF-IDF weights, with each document's row scaled to unit length so
+        # that dot products are cosine similarities.
+        if self._weights is None:
+            self._weights = self.tfidf(self.counts)
+        return self._weights
+
+    def tfidf(self, counts):
+        # Weight rows of term counts over this matrix's vocabulary by TF-IDF,
+        # normalized to unit length. Rows without terms stay zero.
+        weighted = sparse.csr_matrix(counts.multiply(self.idf[np.newaxis, :]))
+        norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis = 1)).ravel())
+        norms[norms == 0] = 1
+        return sparse.csr_matrix(sparse.diags(1 / norms) @ weighted)
+
+    def vectorize(self, word_freqs):
+        # Turn word counts for a document outside the matrix into a row of
+        # term counts. Words outside the vocabulary are ignored.
+        columns = []
+        data = []
+        for word, count in word_freqs.items():
+            column = self.vocabulary.get(word)
+            if column is not None:
+                columns.append(column)
+                data.append(count)
+        return sparse.csr_matrix((np.array(data, dtype = np.float64),
+                                  (np.zeros(len(columns), dtype = np.int32), np.array(columns, dtype = np.int32))),
+                                 shape = (1, self.counts.shape[1]))
+
+    def query_weights(self, queries):
+        # TF-IDF rows for a list of queries, each either the id of a document
+        # in the matrix or the word counts of another document.
+        rows = []
+        for query in queries:
+            if hasattr(query, "items"):
+                rows.append(self.tfidf(self.vectorize(query)))
+            else:
+                rows.append(self.weights[self.rows[query]])
+        return sparse.vstack(rows, format = "csr")
+
+    def cosine_similarity(self, queries, batch_size = 256):
+        # Return a dense (queries x documents) array of cosine similarities.
+        # Queries are multiplied against the matrix in batches to bound the
+        # memory used by intermediate results.
+        query_weights = self.query_weights(queries)
+        similarity = np.empty((query_weights.shape[0], len(self)))
+        for start in range(0, query_weights.shape[0], batch_size):
+            batch = query_weights[start:start + batch_size]
+            similarity[start:start + batch.shape[0]] = (self.weights @ batch.T).T.toarray()
+        return similarity
+
+    def most_similar(self, query, top_k = 10, exclude_self = True):
+        # Rank the documents most similar to one query, returning a list of
+        # (document id, similarity) pairs, best first.
+        # For a single query, a dense vector makes the product cheapest.
+        scores = self.weights @ self.query_weights([query]).toarray().ravel()
+        if exclude_self and not hasattr(query, "items"):
+            scores[self.rows[query]] = -np.inf
+
+        top_k = min(top_k, len(scores))
+        if top_k <= 0:
+            return []
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.lexsort((best, -scores[best]))]
+        return [(self.doc_ids[row], float(scores[row])) for row in best if scores[row] != -np.inf]
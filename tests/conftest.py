@@ -0,0 +1,33 @@
+# Shared setup for the tests. The package and the benchmarks (for the
+# corpus of patent pages) are put on sys.path, and PatentTools is told,
+# before it is first imported, to keep its cache in a temporary directory
+# and never to contact the USPTO.
+
+# Import necessary modules
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "patenttools"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+CACHE_DIR = tempfile.mkdtemp(prefix = "patenttools-tests-")
+atexit.register(shutil.rmtree, CACHE_DIR, ignore_errors = True)
+os.environ["PATENTTOOLS_CACHE_DIR"] = CACHE_DIR
+os.environ["PATENTTOOLS_OFFLINE"] = "1"
+os.environ.pop("PATENTTOOLS_PREFETCH", None)
+
+
+@pytest.fixture(scope = "session")
+def corpus_pages():
+    # The benchmark corpus as a dict of patent number -> HTML.
+    from make_corpus import CORPUS_DIR, load_manifest
+    pages = {}
+    for entry in load_manifest(CORPUS_DIR):
+        with open(os.path.join(CORPUS_DIR, entry["file"]), encoding = "utf-8") as page:
+            pages[entry["number"]] = page.read()
+    return pages
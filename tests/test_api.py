@@ -0,0 +1,104 @@
+# Tests of /api/v1/patents: the fields returned, errors for requests it
+# cannot answer, and gzip and ETag handling of its responses. Pages are put
+# in the cache beforehand, since the tests run offline.
+
+# Import necessary modules
+import gzip
+import json
+import pytest
+from patft_server import NOT_FOUND_PAGE
+import frontend
+import config
+
+FOUND = "8622391"
+MISSING = "1234567"
+
+
+@pytest.fixture(scope = "module", autouse = True)
+def cached_pages(corpus_pages):
+    frontend.page_cache.put(FOUND, corpus_pages[FOUND])
+    frontend.page_cache.put(MISSING, NOT_FOUND_PAGE)
+    return
+
+
+@pytest.fixture
+def client():
+    return frontend.app.test_client()
+
+
+def get_patent(client, number, headers = None, **args):
+    return client.get("/api/v1/patents/%s" % number, query_string = args, headers = headers or {})
+
+
+def test_default_fields_are_the_summary(client):
+    response = get_patent(client, FOUND)
+    assert response.status_code == 200 and response.mimetype == "application/json"
+    values = json.loads(response.get_data())
+    assert list(values) == ["number"] + list(frontend.SUMMARY_FIELDS)
+    patent_info = frontend.USPTOLookup(FOUND, cache = frontend.page_cache)
+    assert values["number"] == FOUND and values["title"] == patent_info.title
+
+
+def test_requested_fields_only(client):
+    response = get_patent(client, FOUND, fields = "number, independent_claims,cited_by,claims_wordcloud")
+    values = json.loads(response.get_data())
+    assert list(values) == ["number", "independent_claims", "cited_by", "claims_wordcloud"]
+    assert values["independent_claims"] and 1 in values["independent_claims"]
+    assert values["claims_wordcloud"] == "/wordcloud/%s.png?section=claims" % FOUND
+
+
+def test_distilled_fields(client):
+    values = json.loads(get_patent(client, FOUND, fields = "bigrams,keyphrases,similar", min_freq = 2).get_data())
+    patent_info, pat_distiller = frontend.analyze_patent(FOUND)
+    assert values["bigrams"] == [list(bigram) for bigram in pat_distiller.gen_bigrams(min_freq = 2)]
+    assert values["keyphrases"] == json.loads(json.dumps(pat_distiller.gen_keyphrases()))
+    assert isinstance(values["similar"], list)
+
+
+@pytest.mark.parametrize("args", [{"fields" : "title,colour"}, {"min_freq" : "two"}])
+def test_bad_arguments(client, args):
+    response = get_patent(client, FOUND, **args)
+    assert response.status_code == 400
+    error = json.loads(response.get_data())["error"]
+    if "fields" in args:
+        assert error.startswith("Unknown fields: colour.")
+
+
+@pytest.mark.parametrize("number, status", [("not a number", 400), (MISSING, 404), ("7000001", 404)])
+def test_patents_that_cannot_be_returned(client, number, status):
+    # 7000001 is neither cached nor fetched, since the tests run offline.
+    response = get_patent(client, number)
+    assert response.status_code == status
+    assert "error" in json.loads(response.get_data())
+
+
+def test_large_responses_are_gzipped(client):
+    plain = get_patent(client, FOUND, fields = "description")
+    assert plain.content_encoding is None
+    assert len(plain.get_data()) >= config.api_gzip_min_bytes
+
+    compressed = get_patent(client, FOUND, {"Accept-Encoding" : "gzip"}, fields = "description")
+    assert compressed.content_encoding == "gzip"
+    assert "Accept-Encoding" in compressed.headers["Vary"]
+    assert gzip.decompress(compressed.get_data()) == plain.get_data()
+    assert compressed.get_etag()[0] == plain.get_etag()[0] + "-gzip"
+
+
+def test_small_responses_are_not_gzipped(client):
+    response = get_patent(client, FOUND, {"Accept-Encoding" : "gzip"}, fields = "number")
+    assert response.content_encoding is None
+    assert json.loads(response.get_data()) == {"number" : FOUND}
+
+
+@pytest.mark.parametrize("headers", [{}, {"Accept-Encoding" : "gzip"}])
+def test_unchanged_responses_are_not_sent_again(client, headers):
+    response = get_patent(client, FOUND, headers, fields = "description")
+    etag = response.get_etag()[0]
+    assert response.cache_control.max_age == config.api_max_age
+
+    again = get_patent(client, FOUND, dict(headers, **{"If-None-Match" : '"%s"' % etag}), fields = "description")
+    assert again.status_code == 304 and again.get_data() == b""
+    assert again.get_etag()[0] == etag
+
+    stale = get_patent(client, FOUND, dict(headers, **{"If-None-Match" : '"other"'}), fields = "description")
+    assert stale.status_code == 200 and stale.get_data() == response.get_data()
@@ -0,0 +1,76 @@
+# Tests of batch_lookup: numbers are cleaned and deduplicated, each patent
+# is reported once, failures are reported rather than raised, and
+# unexpected errors are logged.
+
+# Import necessary modules
+import logging
+import time
+import pytest
+from patft_server import NOT_FOUND_PAGE
+from cache import PatentCache
+from citations import CitationGraph
+import batch
+from batch import batch_lookup, dedupe_numbers, HostRateLimiter, SUMMARY_FIELDS
+
+FOUND = "8622391"
+MISSING = "1234567"
+
+
+@pytest.fixture
+def cache(tmp_path, corpus_pages):
+    cache = PatentCache(cache_dir = str(tmp_path / "cache"), offline = True)
+    cache.put(FOUND, corpus_pages[FOUND])
+    cache.put(MISSING, NOT_FOUND_PAGE)
+    return cache
+
+
+def by_number(results):
+    return {result["number"] : result for result in results}
+
+
+def test_dedupe_numbers():
+    numbers, unrecognized = dedupe_numbers(["8,622,391", "US8622391", "nonsense", "7000001"])
+    assert numbers == {"8622391" : ["8,622,391", "US8622391"], "7000001" : ["7000001"]}
+    assert unrecognized == ["nonsense"]
+
+
+def test_each_patent_is_reported_once(cache):
+    results = list(batch_lookup(["8,622,391", FOUND, MISSING, "9999999", "nonsense"], cache = cache))
+    assert len(results) == 4
+    assert results[0] == dict(batch.summarize(None, ["nonsense"]),
+                              error = "The patent number could not be interpreted.")
+
+    results = by_number(results[1:])
+    assert results[FOUND]["inputs"] == ["8,622,391", FOUND]
+    assert results[FOUND]["error"] is None and results[FOUND]["title"]
+    assert set(results[FOUND]) == {"number", "inputs", "error"} | set(SUMMARY_FIELDS)
+    assert results[MISSING]["error"] == "The patent could not be found."
+    assert results["9999999"]["error"] == "Offline, and the patent is not cached."
+
+
+def test_citations_are_recorded(cache, tmp_path):
+    graph = CitationGraph(path = str(tmp_path / "citations"), refresh = 0)
+    result = by_number(batch_lookup([FOUND, MISSING], cache = cache, graph = graph))[FOUND]
+    assert graph.cites(FOUND) == sorted(result["cited_us_numbers"])
+    assert MISSING not in graph
+
+
+def test_unexpected_errors_are_logged(cache, monkeypatch, caplog):
+    class BrokenLookup(batch.USPTOLookup):
+        def __init__(self, number, **options):
+            raise KeyError(number)
+    monkeypatch.setattr(batch, "USPTOLookup", BrokenLookup)
+    with caplog.at_level(logging.ERROR, logger = "batch"):
+        results = list(batch_lookup([FOUND], cache = cache))
+    assert results[0]["error"] == "An error occured."
+    assert "Error looking up '8622391' in a batch" in caplog.text
+    assert "KeyError" in caplog.text
+
+
+def test_rate_limiter_spaces_requests_to_each_host():
+    limiter = HostRateLimiter(rate = 20)
+    start = time.monotonic()
+    for _ in range(3):
+        limiter.wait("http://patft.uspto.gov/netacgi/nph-Parser")
+    limiter.wait("http://127.0.0.1:8000/netacgi/nph-Parser")
+    assert 0.1 <= time.monotonic() - start < 1
@@ -0,0 +1,63 @@
+# Tests that BigramCounts ranks bigrams exactly as NLTK's
+# BigramCollocationFinder does, for every measure and several frequency
+# thresholds, and that its exact scores are NLTK's.
+
+# Import necessary modules
+import pytest
+from nltk.collocations import BigramCollocationFinder
+from nltk.metrics import BigramAssocMeasures
+from bench_bigrams import MIN_FREQS, nltk_rank
+from bigrams import BigramCounts, MEASURES, EXACT_MEASURES
+from cache import PatentCache
+from distiller import TextDistiller
+from lookup import USPTOLookup
+import config
+
+
+@pytest.fixture(scope = "module")
+def documents(corpus_pages, tmp_path_factory):
+    # The tokens of a few patents of the corpus, as TextDistiller makes them.
+    cache = PatentCache(cache_dir = str(tmp_path_factory.mktemp("cache")), offline = True)
+    tokens = []
+    for number, html in sorted(corpus_pages.items())[:4]:
+        cache.put(number, html)
+        patent_info = USPTOLookup(number, cache = cache)
+        if patent_info.title is not None:
+            tokens.append(TextDistiller({"abstract" : patent_info.abstract, "claims" : patent_info.claims,
+                                         "description" : patent_info.description}, visuals = False).crp_toks)
+    # A short text with many ties, where the order of equal scores matters.
+    tokens.append(TextDistiller("a b c d a b c d e f a b e f c d " * 3, visuals = False).crp_toks)
+    tokens.append(TextDistiller("touch screen panel touch screen layer glass panel touch layer " * 5,
+                                visuals = False).crp_toks)
+    return tokens
+
+
+@pytest.mark.parametrize("measure", MEASURES)
+@pytest.mark.parametrize("min_freq", MIN_FREQS)
+def test_rankings_match_nltk(documents, measure, min_freq):
+    for tokens in documents:
+        counts = BigramCounts.from_tokens(tokens, config.bg_win)
+        assert counts.rank(min_freq, config.bg_count, measure) == nltk_rank(tokens, min_freq, measure)
+
+
+@pytest.mark.parametrize("measure", MEASURES)
+def test_whole_rankings_match_nltk(documents, measure):
+    tokens = documents[0]
+    counts = BigramCounts.from_tokens(tokens, config.bg_win)
+    finder = BigramCollocationFinder.from_words(tokens, window_size = config.bg_win)
+    assert counts.rank(1, len(counts), measure) == finder.nbest(getattr(BigramAssocMeasures, measure),
+                                                                len(counts))
+
+
+def test_exact_scores_are_nltks():
+    for n_ii, n_ix_xi, n_xx in ((3, (5, 4), 100), (1, (1, 1), 7), (12, (40, 13), 5000)):
+        for measure in MEASURES:
+            expected = getattr(BigramAssocMeasures, measure)(n_ii, n_ix_xi, n_xx)
+            assert EXACT_MEASURES[measure](n_ii, n_ix_xi, n_xx) == expected
+
+
+def test_counts_merged_from_freqs_rank_the_same(documents):
+    distiller = TextDistiller(" ".join(documents[0]), visuals = False)
+    merged = BigramCounts.from_freqs(distiller.word_freqs, distiller.bigram_freqs, config.bg_win)
+    for measure in MEASURES:
+        assert merged.rank(2, config.bg_count, measure) == distiller.gen_bigrams(2, measure = measure)
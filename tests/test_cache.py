@@ -0,0 +1,136 @@
+# Tests of PatentCache: pages, parsed records and images round-trip, and
+# expired entries and records of another parser version are misses.
+
+# Import necessary modules
+import os
+import time
+import pytest
+from cache import PatentCache
+import sqlite_store
+
+PAGE = "<HTML><BODY>United States Patent 8622391</BODY></HTML>"
+FIELDS = {"title" : "Touch screen", "claims" : ["1. A device."], "cited_us_numbers" : ["7000001"]}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return PatentCache(cache_dir = str(tmp_path), offline = False)
+
+
+def test_page_round_trip(cache):
+    assert cache.get("8622391") is None
+    cache.put("8622391", PAGE)
+    assert cache.get("8622391") == PAGE
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.stats()["entries"] == 1
+
+
+def test_pages_are_shared_between_instances(cache):
+    cache.put("8622391", PAGE)
+    other = PatentCache(cache_dir = cache.cache_dir, offline = False)
+    assert other.get("8622391") == PAGE
+
+
+def test_expired_page_is_a_miss_except_offline(cache):
+    cache.put("8622391", PAGE)
+    cache.ttl = 0
+    time.sleep(0.01)
+    assert cache.get("8622391") is None
+    cache.offline = True
+    assert cache.get("8622391") == PAGE
+
+
+def test_damaged_blob_is_forgotten(cache):
+    cache.put("8622391", PAGE)
+    for directory, _, files in os.walk(cache.blob_dir):
+        for name in files:
+            os.remove(os.path.join(directory, name))
+    assert cache.get("8622391") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_record_round_trip(cache):
+    cache.put("8622391", PAGE)
+    assert cache.get_record("8622391", 3) is None
+    cache.put_record("8622391", 3, FIELDS)
+    assert cache.get_record("8622391", 3) == FIELDS
+
+
+def test_record_of_another_version_is_a_miss(cache):
+    cache.put("8622391", PAGE)
+    cache.put_record("8622391", 3, FIELDS)
+    assert cache.get_record("8622391", 4) is None
+    assert cache.get_record("8622391", 2) is None
+    assert cache.record_misses == 2
+
+
+def test_record_needs_its_page(cache):
+    cache.put_record("8622391", 3, FIELDS)
+    assert cache.get_record("8622391", 3) is None
+
+
+def test_new_page_drops_the_old_record(cache):
+    cache.put("8622391", PAGE)
+    cache.put_record("8622391", 3, FIELDS)
+    cache.put("8622391", PAGE.replace("8622391", "8622392"))
+    assert cache.get_record("8622391", 3) is None
+
+
+def test_image_round_trip(cache):
+    assert cache.get_image("8622391.png") is None
+    cache.put_image("8622391.png", b"\x89PNG")
+    assert cache.get_image("8622391.png") == b"\x89PNG"
+    stats = cache.stats()
+    assert (stats["image_hits"], stats["image_misses"]) == (1, 1)
+
+
+def test_hits_do_not_wait_for_writers(cache):
+    # A hit only reads the index, even while another process holds its
+    # write lock; counts and access times are written by the next flush.
+    cache.put("8622391", PAGE)
+    writer = sqlite_store.connect(cache.db_path)
+    writer.execute("BEGIN IMMEDIATE")
+    try:
+        start = time.monotonic()
+        assert cache.get("8622391") == PAGE
+        assert cache.get_image("8622391.png") is None
+        assert time.monotonic() - start < 1
+    finally:
+        writer.execute("ROLLBACK")
+        writer.close()
+
+    other = PatentCache(cache_dir = cache.cache_dir, offline = False)
+    assert other.stats()["hits"] == 0
+    cache.flush()
+    stats = other.stats()
+    assert (stats["hits"], stats["image_misses"]) == (1, 1)
+
+
+def test_access_times_are_written_in_batches(cache):
+    cache.put("8622391", PAGE)
+    cache.put("8622392", PAGE.replace("8622391", "8622392"))
+    cache.get("8622391")
+    cache.flush()
+    db = sqlite_store.connect(cache.db_path)
+    try:
+        accessed = dict(db.execute("SELECT number, accessed FROM pages").fetchall())
+        size = db.execute("SELECT MAX(size) FROM pages").fetchone()[0]
+    finally:
+        db.close()
+    assert accessed["8622391"] > accessed["8622392"]
+
+    # The least recently used page is evicted to make room for another.
+    cache.max_bytes = 2 * size
+    cache.put("8622393", PAGE.replace("8622391", "8622393"))
+    assert cache.get("8622392") is None
+    assert cache.get("8622391") == PAGE and cache.get("8622393") is not None
+
+
+def test_pending_counts_are_flushed_in_the_background(tmp_path):
+    cache = PatentCache(cache_dir = str(tmp_path), offline = False, flush_interval = 0.05)
+    cache.get("8622391")
+    other = PatentCache(cache_dir = str(tmp_path), offline = False)
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline and other.stats()["misses"] == 0:
+        time.sleep(0.05)
+    assert other.stats()["misses"] == 1
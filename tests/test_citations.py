@@ -0,0 +1,107 @@
+# Tests of CitationGraph: direct queries answer from the citations as soon
+# as they are added, and multi-hop queries from snapshots, which are
+# rebuilt at most once per rebuild interval.
+
+# Import necessary modules
+import os
+import sqlite3
+import time
+import pytest
+from citations import CitationGraph
+
+
+@pytest.fixture
+def graph(tmp_path):
+    return CitationGraph(path = str(tmp_path / "citations"), refresh = 0, rebuild_interval = 0)
+
+
+def test_cites_and_cited_by(graph):
+    graph.add("8622391", ["7000001", "7000002"])
+    graph.add("8622392", ["7000002"])
+    assert graph.cites("8622391") == ["7000001", "7000002"]
+    assert graph.cited_by("7000002") == ["8622391", "8622392"]
+    assert graph.cited_by("7000001") == ["8622391"]
+    assert graph.cites("7000001") == [] and graph.cited_by("8622391") == []
+    assert len(graph) == 2 and "8622391" in graph and "7000001" not in graph
+
+
+def test_add_replaces_earlier_citations(graph):
+    graph.add("8622391", ["7000001", "7000002"])
+    graph.add("8622391", ["7000003"])
+    assert graph.cites("8622391") == ["7000003"]
+    assert graph.cited_by("7000001") == []
+
+
+def test_patent_without_citations_is_recorded(graph):
+    graph.add("7000003", [])
+    assert "7000003" in graph and graph.cites("7000003") == []
+
+
+def test_unknown_citations_are_not_recorded(graph):
+    graph.add("1234567", None)
+    assert "1234567" not in graph and len(graph) == 0
+
+
+def test_unchanged_citations_are_not_written(graph):
+    graph.add("8622391", ["7000001"])
+    # While another process holds the write lock, recording the same
+    # citations again neither waits for it nor changes the graph.
+    db = sqlite3.connect(graph.db_path, isolation_level = None)
+    try:
+        db.execute("BEGIN IMMEDIATE")
+        start = time.perf_counter()
+        graph.add("8622391", ["7000001"])
+        assert time.perf_counter() - start < 1
+        db.execute("ROLLBACK")
+        assert db.execute("SELECT value FROM meta WHERE name = 'version'").fetchone()[0] == 1
+    finally:
+        db.close()
+
+
+def test_expand(graph):
+    graph.add("1", ["2", "3"])
+    graph.add("2", ["4"])
+    graph.add("4", ["5"])
+    assert graph.expand(["1"], hops = 2) == {"1" : 0, "2" : 1, "3" : 1, "4" : 2}
+    assert graph.expand(["4"], hops = 5, direction = "backward") == {"4" : 0, "2" : 1, "1" : 2}
+    assert graph.expand(["2"], direction = "both") == {"2" : 0, "1" : 1, "4" : 1}
+    with pytest.raises(ValueError):
+        graph.expand(["1"], direction = "sideways")
+
+
+def test_snapshots_are_rebuilt_at_most_once_per_interval(tmp_path):
+    graph = CitationGraph(path = str(tmp_path / "citations"), refresh = 0, rebuild_interval = 60)
+    graph.add("1", ["2"])
+    assert graph.expand(["1"]) == {"1" : 0, "2" : 1}
+
+    # Direct queries see a new citation at once; multi-hop queries only
+    # once the snapshot is old enough to be rebuilt.
+    graph.add("1", ["2", "3"])
+    assert graph.cites("1") == ["2", "3"]
+    assert graph.expand(["1"]) == {"1" : 0, "2" : 1}
+    graph.rebuild_interval = 0
+    assert graph.expand(["1"]) == {"1" : 0, "2" : 1, "3" : 1}
+
+
+def test_old_snapshots_are_removed(tmp_path):
+    graph = CitationGraph(path = str(tmp_path / "citations"), refresh = 0, rebuild_interval = 60)
+    graph.add("1", ["2"])
+    graph.expand(["1"])
+    graph.add("2", ["3"])
+    backdate(graph, 1)
+    assert graph.expand(["1"], hops = 2) == {"1" : 0, "2" : 1, "3" : 2}
+
+    # The replaced snapshot is kept while readers may still be using it,
+    # and removed once its successor has been in place for the interval.
+    assert graph._snapshots() == [1, 2]
+    backdate(graph, 2)
+    graph.expand(["1"])
+    assert graph._snapshots() == [2]
+    assert graph.expand(["1"], hops = 2) == {"1" : 0, "2" : 1, "3" : 2}
+
+
+def backdate(graph, version):
+    # Make a snapshot look as if it was written two minutes ago.
+    past = time.time() - 120
+    os.utime(graph._snapshot_dir(version), (past, past))
+    return
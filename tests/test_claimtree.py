@@ -0,0 +1,61 @@
+# Tests of ClaimTreeBuilder and of the dependency graph read from its claims.
+
+# Import necessary modules
+import time
+from claimtree import ClaimTreeBuilder, independent_claims, dependency_graph, claim_roots
+
+
+def build(fragments):
+    builder = ClaimTreeBuilder()
+    for fragment in fragments:
+        builder.add(fragment)
+    return builder.tree()
+
+
+def test_numbered_claims_from_fragments():
+    tree = build(["What is claimed is:", "", "1. A device comprising:", "a housing; and",
+                  "a sensor.", "2. The device of claim 1, wherein the sensor is optical.",
+                  "3.", "A method of using the device of claim 2."])
+    assert [claim["number"] for claim in tree] == [1, 2, 3]
+    assert tree[0]["text"] == "A device comprising: a housing; and a sensor."
+    assert tree[0]["words"] == 8
+    assert tree[2]["text"] == "A method of using the device of claim 2."
+    assert [claim["depends_on"] for claim in tree] == [[], [1], [2]]
+
+
+def test_references_to_several_claims():
+    texts = ["A device.", "A method.", "A system.", "A kit.",
+             "The device of claims 1 or 2.", "The device of any one of claims 1 to 4.",
+             "The device of claims 1, 3 and 5.", "The device of claims 2-3 and claim 6.",
+             "The device of claim 12, or of claim 8."]
+    tree = build(["%d. %s" % (number, text) for number, text in enumerate(texts, 1)])
+    assert [claim["depends_on"] for claim in tree[4:]] == [[1, 2], [1, 2, 3, 4], [1, 3, 5], [2, 3, 6], [8]]
+
+
+def test_numbers_out_of_sequence_continue_the_claim():
+    tree = build(["1. A device having", "3. wheels.", "2. The device of claim 1."])
+    assert [claim["number"] for claim in tree] == [1, 2]
+    assert tree[0]["text"] == "A device having 3. wheels."
+    assert tree[1]["depends_on"] == [1]
+
+
+def test_independent_claims():
+    tree = build(["1. A device.", "2. The device of claim 1.", "3. A method.", "4. The method of claim 3."])
+    assert independent_claims(tree) == [1, 3]
+    assert independent_claims([]) == []
+
+
+def test_ranges_stop_at_the_claim_before():
+    # A huge or mistyped range is cut at the current claim, not expanded.
+    start = time.perf_counter()
+    tree = build(["1. A device.", "2. A method.", "3. The device of any one of claims 1 to 999999999."])
+    assert time.perf_counter() - start < 1
+    assert tree[2]["depends_on"] == [1, 2]
+
+
+def test_dependency_graph_and_roots():
+    tree = build(["1. A device.", "2. The device of claim 1.", "3. A method.",
+                  "4. The method of claim 3.", "5. The device of claim 2 or the method of claim 4."])
+    assert dependency_graph(tree) == {1 : [2], 2 : [5], 3 : [4], 4 : [5], 5 : []}
+    assert claim_roots(tree) == {1 : [1], 2 : [1], 3 : [3], 4 : [3], 5 : [1, 3]}
+    assert dependency_graph([]) == {} and claim_roots([]) == {}
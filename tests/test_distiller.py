@@ -0,0 +1,65 @@
+# Tests of CorpusDistiller: documents are added and removed one at a time,
+# and the corpus totals and rankings stay those of the documents it holds.
+
+# Import necessary modules
+from collections import Counter
+import pytest
+from distiller import CorpusDistiller, TextDistiller
+
+FIRST = "A touch screen panel with a touch sensor layer. The touch screen panel has a glass layer."
+SECOND = "An epoxy resin with a filler. The epoxy resin is cured; the filler is silica."
+
+
+def test_totals_are_those_of_the_documents():
+    corpus = CorpusDistiller(visuals = False)
+    corpus.add("1", FIRST)
+    corpus.add("2", SECOND)
+    first, second = TextDistiller(FIRST, visuals = False), TextDistiller(SECOND, visuals = False)
+    assert len(corpus) == 2 and "1" in corpus and "3" not in corpus
+    assert corpus.word_freqs == first.word_freqs + second.word_freqs
+
+    # Bigrams are counted within each document, so none span the two.
+    assert corpus.bigram_freqs == first.bigram_freqs + second.bigram_freqs
+    assert ("layer", "epoxy") not in corpus.bigram_freqs
+
+
+def test_remove_restores_the_other_documents_results():
+    corpus = CorpusDistiller(visuals = False)
+    corpus.add("1", FIRST)
+    corpus.add("2", SECOND)
+    assert corpus.gen_bigrams(min_freq = 1) != TextDistiller(FIRST).gen_bigrams(min_freq = 1)
+
+    corpus.remove("2")
+    alone = TextDistiller(FIRST, visuals = False)
+    assert corpus.word_freqs == alone.word_freqs
+    assert "epoxy" not in corpus.word_freqs
+    for measure in ("pmi", "likelihood_ratio", "chi_sq"):
+        assert corpus.gen_bigrams(min_freq = 1, measure = measure) == alone.gen_bigrams(min_freq = 1,
+                                                                                        measure = measure)
+    with pytest.raises(KeyError):
+        corpus.remove("2")
+
+
+def test_add_replaces_a_document_with_the_same_id():
+    corpus = CorpusDistiller(visuals = False)
+    corpus.add("1", FIRST)
+    corpus.add("1", SECOND)
+    assert len(corpus) == 1
+    assert corpus.word_freqs == TextDistiller(SECOND, visuals = False).word_freqs
+
+
+def test_sections_are_one_document():
+    corpus = CorpusDistiller(visuals = False)
+    corpus.add("1", {"abstract" : FIRST, "claims" : ["1. A device.", "2. The device of claim 1."]})
+    assert corpus.word_freqs == Counter(TextDistiller(FIRST + " 1. A device. 2. The device of claim 1.",
+                                                      visuals = False).crp_toks)
+
+
+def test_wordcloud_is_redrawn_after_changes():
+    corpus = CorpusDistiller()
+    corpus.add("1", FIRST)
+    png = corpus.wordcloud_png
+    assert png.startswith(b"\x89PNG")
+    assert corpus.wordcloud_png is png
+    corpus.add("2", SECOND)
+    assert corpus.wordcloud_png != png
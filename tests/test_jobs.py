@@ -0,0 +1,138 @@
+# Tests of JobQueue and its runners: jobs for the same key are shared, the
+# queue is bounded, jobs record their progress, result or error, stale
+# jobs expire, and jobs that no runner starts in time are given up.
+
+# Import necessary modules
+import threading
+import time
+import pytest
+import config
+import jobs
+
+
+def double(progress, number):
+    progress("Doubling")
+    return {"double" : number * 2}
+
+
+def fail(progress):
+    raise LookupError("no such patent")
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    # A queue whose jobs are run here, by run_next, in place of runners.
+    queue = jobs.JobQueue(path = str(tmp_path / "jobs.sqlite3"), workers = 1, max_depth = 2)
+    monkeypatch.setattr(queue, "_ensure_runners", lambda: None)
+    return queue
+
+
+def run_next(queue):
+    jobs.run_job(queue.path, *jobs.claim_job(queue.path))
+    return
+
+
+def test_job_runs_to_its_result(queue):
+    job_id = queue.submit("double-21", double, 21)
+    job = queue.get(job_id)
+    assert (job["state"], job["stage"], job["result"]) == ("queued", None, None)
+
+    assert jobs.claim_job(queue.path)[0] == job_id
+    assert queue.get(job_id)["state"] == "running"
+    assert jobs.claim_job(queue.path) is None
+
+    jobs.run_job(queue.path, job_id, "test_jobs:double", "[21]")
+    job = queue.get(job_id)
+    assert (job["state"], job["stage"], job["result"]) == ("done", "Doubling", {"double" : 42})
+
+
+def test_failed_job_records_the_error(queue):
+    job_id = queue.submit("fail", fail)
+    run_next(queue)
+    job = queue.get(job_id)
+    assert (job["state"], job["error"], job["result"]) == ("failed", "LookupError", None)
+
+
+def test_jobs_with_the_same_key_are_shared(queue):
+    job_id = queue.submit("double-1", double, 1)
+    assert queue.submit("double-1", double, 1) == job_id
+    run_next(queue)
+    assert queue.submit("double-1", double, 1) != job_id
+
+
+def test_queue_is_bounded(queue):
+    queue.submit("double-1", double, 1)
+    queue.submit("double-2", double, 2)
+    with pytest.raises(jobs.QueueFull):
+        queue.submit("double-3", double, 3)
+    run_next(queue)
+    queue.submit("double-3", double, 3)
+
+
+def test_unknown_and_expired_jobs(queue):
+    assert queue.get("no-such-job") is None
+    job_id = queue.submit("double-1", double, 1)
+    queue.timeout = 0
+    time.sleep(0.01)
+    job = queue.get(job_id)
+    assert (job["state"], job["error"]) == ("failed", "Expired")
+
+    # Expired jobs no longer count against the bound, and are forgotten
+    # after the TTL like other finished jobs.
+    queue.submit("double-2", double, 2)
+    queue.submit("double-3", double, 3)
+    queue.ttl = 0
+    time.sleep(0.01)
+    queue.submit("double-4", double, 4)
+    assert queue.get(job_id) is None
+
+
+def test_jobs_not_started_in_time_are_given_up(queue):
+    job_id = queue.submit("double-1", double, 1)
+    queue.start_timeout = 0
+    time.sleep(0.01)
+    job = queue.get(job_id)
+    assert (job["state"], job["error"]) == ("failed", "NotStarted")
+
+    # No runner takes it up later. The next submit records it as failed,
+    # so it no longer counts against the bound.
+    assert jobs.claim_job(queue.path, start_timeout = 0) is None
+    queue.submit("double-2", double, 2)
+    queue.start_timeout = 60
+    queue.submit("double-3", double, 3)
+    assert queue.get(job_id)["error"] == "NotStarted"
+
+
+def test_wait_for_a_job(queue):
+    job_id = queue.submit("double-21", double, 21)
+    start = time.monotonic()
+    assert queue.wait(job_id, 0.1)["state"] == "queued"
+    assert 0.1 <= time.monotonic() - start < 5
+
+    runner = threading.Timer(0.05, run_next, (queue,))
+    runner.start()
+    job = queue.wait(job_id, 10)
+    runner.join()
+    assert (job["state"], job["result"]) == ("done", {"double" : 42})
+    assert queue.wait("no-such-job", 1) is None
+
+
+def test_runners_started_when_none_are_alive(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "jobs_start_method", "fork")
+    queue = jobs.JobQueue(path = str(tmp_path / "jobs.sqlite3"), workers = 2)
+    try:
+        job_ids = [queue.submit("double-%d" % number, double, number) for number in range(4)]
+        assert len(queue._runners) == 2
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline and any(queue.get(job_id)["state"] != "done" for job_id in job_ids):
+            time.sleep(0.05)
+        assert [queue.get(job_id)["result"] for job_id in job_ids] == [{"double" : 2 * number}
+                                                                    for number in range(4)]
+
+        # Runners that are alive are used rather than started again.
+        queue._started = None
+        queue.submit("double-9", double, 9)
+        assert len(queue._runners) == 2
+    finally:
+        queue.shutdown()
+    assert queue._runners == []
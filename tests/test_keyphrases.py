@@ -0,0 +1,56 @@
+# Tests of PhraseSketch: the top phrases and their counts are exact, also
+# for phrases that span chunks and for phrases whose hashes collide.
+
+# Import necessary modules
+import numpy as np
+from bench_keyphrases import exact_counts, exact_top
+import keyphrases
+from keyphrases import PhraseSketch
+from distiller import TextDistiller
+
+TEXT = """A first electrode layer is formed on the substrate. A second electrode layer
+          is formed on the first electrode layer. The touch screen panel has a first
+          electrode layer and a touch screen controller. The touch screen controller
+          reads the first electrode layer. """
+
+
+def test_top_phrases_are_exact():
+    tokens = TextDistiller(TEXT * 5, visuals = False).crp_toks
+    sketch = PhraseSketch.from_tokens(tokens)
+    counts = exact_counts(tokens)
+    assert sketch.top() == exact_top(counts)
+    assert ("first", "electrode", "layer") in sketch.top()
+    for phrase, phrase_count in sketch.counts().items():
+        assert phrase_count == counts[phrase]
+
+
+def test_phrases_spanning_chunks_are_counted_once(monkeypatch):
+    monkeypatch.setattr(keyphrases, "CHUNK_SIZE", 7)
+    tokens = TextDistiller(TEXT * 3, visuals = False).crp_toks
+    sketch = PhraseSketch.from_tokens(tokens)
+    counts = exact_counts(tokens)
+    assert sketch.top(min_freq = 2) == exact_top({phrase : count for phrase, count in counts.items()
+                                                  if count >= 2})
+    for phrase, phrase_count in sketch.counts().items():
+        assert phrase_count == counts[phrase]
+
+
+def test_colliding_hashes_do_not_merge_counts(monkeypatch):
+    # With only a few distinct token hashes, many phrases share a hash.
+    # Counts are still those of each phrase's own words.
+    def few_hashes(tokens):
+        return np.fromiter((len(token) % 3 for token in tokens), dtype = np.uint64, count = len(tokens))
+    monkeypatch.setattr(keyphrases, "hash_tokens", few_hashes)
+    tokens = TextDistiller(TEXT * 4, visuals = False).crp_toks
+    counts = exact_counts(tokens)
+    sketch = PhraseSketch.from_tokens(tokens)
+    assert sketch.counts()
+    for phrase, phrase_count in sketch.counts().items():
+        assert phrase_count == counts[phrase]
+
+
+def test_token_hashes_are_64_bit():
+    hashes = keyphrases.hash_tokens(["electrode", "layer", "electrode"])
+    assert hashes.dtype == np.uint64
+    assert hashes[0] == hashes[2] != hashes[1]
+    assert int(hashes.max()) >= 2 ** 32
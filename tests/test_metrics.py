@@ -0,0 +1,75 @@
+# Tests of MetricsRegistry: observations are kept in memory, and added up
+# across the registries sharing a database, on a timer even when nothing
+# else happens, and whenever the totals are read.
+
+# Import necessary modules
+import sqlite3
+import time
+from metrics import MetricsRegistry
+
+
+def shared_registry(path, flush_interval = 60):
+    registry = MetricsRegistry(flush_interval = flush_interval)
+    registry.share(str(path))
+    return registry
+
+
+def stored(path):
+    db = sqlite3.connect(str(path))
+    try:
+        return {row[:3] : row[3] for row in db.execute("SELECT metric, labels, key, value FROM metrics")}
+    finally:
+        db.close()
+
+
+def test_totals_add_up_across_registries(tmp_path):
+    path = tmp_path / "metrics.sqlite3"
+    first, second = shared_registry(path), shared_registry(path)
+    first.count("patenttools_errors_total", route = "api")
+    second.count("patenttools_errors_total", 2, route = "api")
+    second.observe("fetch", 0.003)
+    first.flush()
+    totals = second.totals()
+    assert totals[("patenttools_errors_total", 'route="api"', "")] == 3
+    assert totals[("patenttools_stage_seconds", 'stage="fetch"', "0.005")] == 1
+    assert totals[("patenttools_stage_seconds", 'stage="fetch"', "count")] == 1
+
+
+def test_idle_registry_flushes_on_a_timer(tmp_path):
+    path = tmp_path / "metrics.sqlite3"
+    registry = shared_registry(path, flush_interval = 0.05)
+    registry.count("patenttools_errors_total", route = "batch")
+    assert stored(path) == {}
+    deadline = time.monotonic() + 5
+    while not stored(path) and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert stored(path) == {("patenttools_errors_total", 'route="batch"', "") : 1}
+
+
+def test_exposition_flushes_pending_values(tmp_path):
+    path = tmp_path / "metrics.sqlite3"
+    registry = shared_registry(path)
+    registry.observe("parse", 0.2)
+    text = registry.exposition()
+    assert 'patenttools_stage_seconds_bucket{stage="parse",le="0.25"} 1' in text
+    assert 'patenttools_stage_seconds_bucket{stage="parse",le="+Inf"} 1' in text
+    assert stored(path)[("patenttools_stage_seconds", 'stage="parse"', "count")] == 1
+
+
+def test_values_are_kept_while_the_database_is_busy(tmp_path, monkeypatch):
+    path = tmp_path / "metrics.sqlite3"
+    registry = shared_registry(path)
+    registry.count("patenttools_upstream_requests_total")
+    db = sqlite3.connect(str(path), isolation_level = None)
+    try:
+        db.execute("BEGIN IMMEDIATE")
+        with monkeypatch.context() as patch:
+            patch.setattr(registry, "_connect", lambda: sqlite3.connect(str(path), timeout = 0,
+                                                                         isolation_level = None))
+            registry.flush()
+        db.execute("ROLLBACK")
+    finally:
+        db.close()
+    assert stored(path) == {}
+    registry.flush()
+    assert stored(path) == {("patenttools_upstream_requests_total", "", "") : 1}
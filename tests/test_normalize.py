@@ -0,0 +1,41 @@
+# Tests that the one-pass functions in normalize give exactly the results of
+# the re.sub chains they replaced (kept in benchmarks/bench_normalize.py).
+
+# Import necessary modules
+import pytest
+from bench_normalize import (PATENT_NUMBERS, clean_num_chain, lookup_clean_text_chain,
+                             distiller_clean_text_chain)
+from lookup import USPTOLookup
+import normalize
+
+TEXTS = ["", " ", "\n", "a\nb", "a \nb", "a\n\nb", "a\t\t b", " lead and trail \n",
+         "Claim 1, wherein\r\n  the layer is 5 µm thick.", "Café — naïve\n\nÉté",
+         "A-B/C (D); 10% e.g. \"quoted\" ‘text’"]
+
+
+@pytest.mark.parametrize("raw_num", PATENT_NUMBERS + ["", "US", "A1", "8622391US", "12-34 US5 6",
+                                                      "8\n622\t391", "٨622391"])
+def test_strip_patent_number(raw_num):
+    assert normalize.strip_patent_number(raw_num) == clean_num_chain(raw_num)
+
+
+def test_clean_num():
+    assert USPTOLookup.clean_num("US 8,622,391 B2") == "8622391"
+    assert USPTOLookup.clean_num("8.622.391") == "8622391"
+    assert USPTOLookup.clean_num("no number") == "unrecognized input"
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_squeeze_whitespace(text):
+    assert normalize.squeeze_whitespace(text) == lookup_clean_text_chain(text)
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_letters_only(text):
+    assert normalize.letters_only(text) == distiller_clean_text_chain(text)
+
+
+def test_on_patent_pages(corpus_pages):
+    for html in list(corpus_pages.values())[:5]:
+        assert normalize.squeeze_whitespace(html) == lookup_clean_text_chain(html)
+        assert normalize.letters_only(html) == distiller_clean_text_chain(html)
@@ -0,0 +1,83 @@
+# Tests that the single-pass "stream" parser engine extracts the same fields
+# as the BeautifulSoup engine, on the benchmark corpus and on markup that
+# takes the stream engine off its fast path.
+
+# Import necessary modules
+from html.parser import HTMLParser
+import pytest
+from lookup import USPTOLookup, RECORD_FIELDS
+from patft_server import NOT_FOUND_PAGE
+import pageparser
+
+
+def parse(engine, patent_html):
+    # The fields a lookup extracts from a page with an engine, or the type of
+    # the exception it raised.
+    lookup = USPTOLookup("8622391", engine = engine, fetch = False)
+    try:
+        lookup.parse_us_pat(patent_html)
+    except AttributeError as error:
+        return type(error)
+    return {field : getattr(lookup, field) for field in RECORD_FIELDS}
+
+
+def test_corpus_parses_identically(corpus_pages):
+    assert corpus_pages
+    for number, patent_html in sorted(corpus_pages.items()):
+        stream = parse("stream", patent_html)
+        assert isinstance(stream, dict), number
+        assert stream == parse("soup", patent_html), number
+
+
+def test_corpus_fields(corpus_pages):
+    fields = parse("stream", corpus_pages["8622391"])
+    assert fields["title"]
+    assert fields["claims"] and fields["description"]
+    assert [claim["number"] for claim in fields["claim_tree"]] == list(range(1, 21))
+    assert fields["cited_us_numbers"] and all(number.isdigit() for number in fields["cited_us_numbers"])
+    assert fields["primary_cpc"]
+    assert len(set(parse("stream", page)["primary_cpc"] for page in corpus_pages.values())) > 1
+
+
+@pytest.mark.parametrize("change", [
+    ("<HR>", "<!-- a comment --><HR>"),
+    ("<HR>", "<script>if (a < b) {}</script><HR>"),
+    ("<B>Abstract</B>", "<B CLASS=heading>Abstract</B>"),
+    ('<font size="+1">', "<FONT SIZE='+1' COLOR=\"#000\">"),
+    ("<BR><BR>", "<BR/><BR>"),
+    ("What is claimed is:", "What is &quot;claimed&quot; &#8220;is&#x201d;: &unknown;"),
+])
+def test_unusual_markup_parses_identically(corpus_pages, change):
+    old, new = change
+    patent_html = corpus_pages["8622392"].replace(old, new)
+    assert patent_html != corpus_pages["8622392"]
+    assert parse("stream", patent_html) == parse("soup", patent_html)
+
+
+def test_not_found_page():
+    assert parse("stream", NOT_FOUND_PAGE) == parse("soup", NOT_FOUND_PAGE)
+
+
+class StartTags(HTMLParser):
+
+    def __init__(self):
+        HTMLParser.__init__(self, convert_charrefs = False)
+        self.tags = []
+
+    def handle_starttag(self, tag, attrs):
+        self.tags.append((tag, attrs))
+
+
+@pytest.mark.parametrize("tag", [
+    '<a href="/netacgi/nph-Parser?Sect1=PTO1&amp;Sect2=HITOFF&p=1">',
+    "<TD ALIGN=LEFT WIDTH='90%' NOWRAP>",
+    '<td\n align = "left"   valign=top >',
+    '<img border="0" src="/netaicon/PTO/search.gif" alt="">',
+    "<input checked value=&lt;>",
+])
+def test_attributes_read_as_htmlparser_reads_them(tag):
+    match = pageparser.ATTRS_START_TAG.match(tag)
+    assert match is not None and match.end() == len(tag)
+    reference = StartTags()
+    reference.feed(tag)
+    assert [(match.group(1).lower(), pageparser.parse_attrs(match.group(2)))] == reference.tags
@@ -0,0 +1,136 @@
+# Tests of /results for patents that are found and patents that the USPTO
+# does not have, both within the request and through a background job.
+# Pages are put in the cache beforehand, since the tests run offline.
+
+# Import necessary modules
+import json
+import threading
+import time
+import pytest
+from patft_server import NOT_FOUND_PAGE
+import frontend
+import jobs
+
+FOUND = "8622391"
+MISSING = "1234567"
+
+
+@pytest.fixture(scope = "module", autouse = True)
+def cached_pages(corpus_pages):
+    frontend.page_cache.put(FOUND, corpus_pages[FOUND])
+    frontend.page_cache.put(MISSING, NOT_FOUND_PAGE)
+    return
+
+
+@pytest.fixture
+def client():
+    return frontend.app.test_client()
+
+
+def post_results(client, number):
+    return client.post("/results", data = {"raw_pat_num" : number, "bigram_freq_filter" : "2"})
+
+
+def test_not_found_within_the_request(client, monkeypatch):
+    monkeypatch.setattr(frontend, "job_queue", None)
+    indexed, recorded = len(frontend.similar_index), len(frontend.citation_graph)
+    response = post_results(client, MISSING)
+    assert response.status_code == 200
+    assert frontend.NOT_FOUND_ERROR in response.get_data(as_text = True)
+    assert MISSING not in frontend.similar_index
+    assert MISSING not in frontend.citation_graph
+    assert (len(frontend.similar_index), len(frontend.citation_graph)) == (indexed, recorded)
+
+
+def test_found_within_the_request(client, monkeypatch):
+    monkeypatch.setattr(frontend, "job_queue", None)
+    response = post_results(client, FOUND)
+    body = response.get_data(as_text = True)
+    assert response.status_code == 200
+    assert "Key Phrases" in body
+    assert FOUND in frontend.similar_index
+    cited = frontend.USPTOLookup(FOUND, cache = frontend.page_cache).cited_us_numbers
+    assert frontend.citation_graph.cites(FOUND) == sorted(cited)
+
+
+def test_reading_cited_by_does_not_write_the_graph(monkeypatch):
+    # Citations are recorded when a patent is looked up, not when the
+    # patents citing it are read.
+    patent_info = frontend.lookup_patent(FOUND)
+    assert frontend.citation_graph.cites(FOUND)
+    def add(number, cited_numbers):
+        raise AssertionError("cited_by wrote to the citation graph")
+    monkeypatch.setattr(frontend.citation_graph, "add", add)
+    values = frontend.patent_fields(patent_info, ["cited_by"], 2)
+    assert values == {"cited_by" : frontend.citation_graph.cited_by(FOUND)}
+
+
+def test_results_job_for_a_missing_patent():
+    stages = []
+    assert frontend.results_job(stages.append, MISSING, 2) is None
+    assert stages == ["Looking up the patent"]
+
+
+def test_results_job_returns_plain_values():
+    # A job's result is stored as JSON, which must not change the page.
+    context = frontend.results_job(lambda stage: None, FOUND, 2)
+    assert context["pat_num"] == FOUND
+    with frontend.app.test_request_context():
+        assert frontend.render_results(json.loads(json.dumps(context))) == frontend.render_results(context)
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    # A job queue whose jobs are run by the tests, in place of runner
+    # processes.
+    queue = jobs.JobQueue(path = str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setattr(queue, "_ensure_runners", lambda: None)
+    monkeypatch.setattr(frontend, "job_queue", queue)
+    return queue
+
+
+@pytest.mark.parametrize("number, shown", [(MISSING, frontend.NOT_FOUND_ERROR), (FOUND, "Key Phrases")])
+def test_through_a_background_job(client, monkeypatch, queue, number, shown):
+    monkeypatch.setattr(frontend.config, "jobs_inline_wait", 0)
+    response = post_results(client, number)
+    assert response.status_code == 303
+    assert "Working" in client.get(response.location).get_data(as_text = True)
+
+    jobs.run_job(queue.path, *jobs.claim_job(queue.path))
+    assert shown in client.get(response.location).get_data(as_text = True)
+
+
+def test_jobs_that_finish_quickly_are_shown_at_once(client, monkeypatch, queue):
+    # A runner that takes the job as soon as it is queued.
+    monkeypatch.setattr(frontend.config, "jobs_inline_wait", 10)
+    def run():
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            job = jobs.claim_job(queue.path)
+            if job is not None:
+                jobs.run_job(queue.path, *job)
+                return
+            time.sleep(0.01)
+    runner = threading.Thread(target = run)
+    runner.start()
+    response = post_results(client, FOUND)
+    runner.join(10)
+    assert response.status_code == 200
+    assert "Key Phrases" in response.get_data(as_text = True)
+
+
+@pytest.mark.parametrize("overdue, shown", [("start_timeout", frontend.NOT_STARTED_ERROR),
+                                            ("timeout", frontend.TIMEOUT_ERROR)])
+def test_waiting_page_gives_up_at_the_deadline(client, monkeypatch, queue, overdue, shown):
+    monkeypatch.setattr(frontend.config, "jobs_inline_wait", 0)
+    response = post_results(client, FOUND)
+    waiting = client.get(response.location).get_data(as_text = True)
+    assert "Working" in waiting and "gives up in 30 seconds" in waiting
+
+    # No runner takes the job, or the runner never finishes it.
+    if overdue == "timeout":
+        jobs.claim_job(queue.path)
+    setattr(queue, overdue, 0)
+    time.sleep(0.01)
+    body = client.get(response.location).get_data(as_text = True)
+    assert shown in body and "Working" not in body
@@ -0,0 +1,96 @@
+# Tests of SimilarityIndex: similar patents are found and scored by TF-IDF
+# cosine similarity, and patents without a title or without any tokens are
+# kept out of the index.
+
+# Import necessary modules
+import math
+import sqlite3
+from collections import Counter
+import pytest
+from simindex import SimilarityIndex
+
+WORDS = ["touch", "screen", "display", "layer", "sensor", "electrode", "panel", "glass",
+         "polymer", "resin", "weight", "percent", "temperature", "curing", "epoxy", "filler"]
+
+
+@pytest.fixture
+def index(tmp_path):
+    return SimilarityIndex(path = str(tmp_path / "similarity.sqlite3"))
+
+
+def test_finds_the_most_similar_patent(index):
+    index.add("1", "Touch screen", Counter(WORDS[:8]))
+    index.add("2", "Touch panel", Counter(WORDS[:7] + ["stylus"]))
+    index.add("3", "Epoxy resin", Counter(WORDS[8:]))
+    assert len(index) == 3 and "2" in index
+
+    results = index.query(Counter(WORDS[:8]), exclude = "1")
+    assert results[0][:2] == ("2", "Touch panel")
+    assert 0 < results[0][2] < 1
+    assert "1" not in [number for number, title, similarity in results]
+
+
+def test_similarity_is_tfidf_cosine_over_the_index(index):
+    # Words that every indexed patent has count for less than rare ones.
+    documents = {"1" : Counter({"touch" : 3, "screen" : 2, "layer" : 1, "glass" : 1}),
+                 "2" : Counter({"touch" : 1, "screen" : 1, "layer" : 4, "stylus" : 1}),
+                 "3" : Counter({"touch" : 2, "screen" : 1, "layer" : 1, "epoxy" : 5})}
+    for number, counts in documents.items():
+        index.add(number, "Patent %s" % number, counts)
+    query = Counter({"touch" : 2, "screen" : 2, "layer" : 1, "glass" : 1, "display" : 1})
+
+    def weights(counts):
+        # Smoothed IDF over the three indexed patents.
+        doc_freq = Counter(word for doc in documents.values() for word in doc)
+        return {word : count * (math.log(4 / (1 + doc_freq[word])) + 1) for word, count in counts.items()}
+
+    def cosine(first, second):
+        dot = sum(value * second.get(word, 0) for word, value in first.items())
+        return dot / math.sqrt(sum(v * v for v in first.values()) * sum(v * v for v in second.values()))
+
+    expected = {number : cosine(weights(query), weights(counts)) for number, counts in documents.items()}
+    results = index.query(query, top_k = 3)
+    assert [number for number, title, similarity in results] == sorted(expected, key = expected.get,
+                                                                        reverse = True)
+    for number, title, similarity in results:
+        assert similarity == pytest.approx(expected[number])
+
+
+def test_add_replaces_and_remove_forgets(index):
+    index.add("1", "Touch screen", Counter(WORDS[:8]))
+    index.add("1", "Epoxy resin", Counter(WORDS[8:]))
+    assert len(index) == 1
+    number, title, similarity = index.query(Counter(WORDS[8:]))[0]
+    assert (number, title, similarity) == ("1", "Epoxy resin", pytest.approx(1.0))
+    index.remove("1")
+    assert len(index) == 0 and index.query(Counter(WORDS[8:])) == []
+
+    # Document frequencies follow the patents that are indexed.
+    db = sqlite3.connect(index.path)
+    try:
+        assert db.execute("SELECT COUNT(*) FROM doc_freqs").fetchone()[0] == 0
+    finally:
+        db.close()
+
+
+def test_refuses_a_patent_without_a_title(index):
+    with pytest.raises(ValueError):
+        index.add("1234567", None, Counter(WORDS))
+    assert len(index) == 0
+
+
+def test_refuses_a_patent_without_tokens(index):
+    with pytest.raises(ValueError):
+        index.add("1234567", "Untitled", Counter())
+    assert len(index) == 0
+
+
+def test_forgets_untitled_patents_indexed_before(index):
+    index.add("1", "Touch screen", Counter(WORDS[:8]))
+    db = sqlite3.connect(index.path)
+    with db:
+        db.execute("UPDATE signatures SET title = NULL WHERE number = '1'")
+    db.close()
+    reopened = SimilarityIndex(path = index.path)
+    assert len(reopened) == 0
+    assert reopened.query(Counter(WORDS[:8])) == []
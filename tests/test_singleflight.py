@@ -0,0 +1,156 @@
+# Tests of SingleFlight: concurrent requests in one worker share one run of
+# the work, a worker waits for another process holding the key's lock file,
+# but not beyond the timeout, and each outcome is counted.
+
+# Import necessary modules
+import multiprocessing
+import os
+import threading
+import time
+import pytest
+from metrics import MetricsRegistry
+import singleflight
+from singleflight import SingleFlight
+
+# Lock files need fcntl, as in singleflight.
+fcntl = pytest.importorskip("fcntl")
+
+
+@pytest.fixture
+def counts(monkeypatch):
+    # Count outcomes in a registry of the test's own, and return a function
+    # reading its patenttools_singleflight_total counters.
+    registry = MetricsRegistry()
+    monkeypatch.setattr(singleflight, "registry", registry)
+    def outcomes():
+        return {labels : value for (metric, labels, key), value in registry.totals().items()
+                if metric == "patenttools_singleflight_total"}
+    return outcomes
+
+
+@pytest.fixture
+def flights(tmp_path):
+    return SingleFlight(lock_dir = str(tmp_path / "flights"), timeout = 10)
+
+
+def hold_lock(lock_dir, key, started, release, marker):
+    # In another process, run the work for key until told to stop, then
+    # leave a marker file behind.
+    def work():
+        started.set()
+        release.wait(10)
+        with open(marker, "w") as marker_file:
+            marker_file.write("done")
+        return "child"
+    SingleFlight(lock_dir = lock_dir, timeout = 10).do(key, work)
+    return
+
+
+def test_concurrent_requests_share_one_run(flights, counts):
+    runs = []
+    started, release = threading.Event(), threading.Event()
+    def work():
+        runs.append(1)
+        started.set()
+        release.wait(5)
+        return "result"
+
+    results = []
+    leader = threading.Thread(target = lambda: results.append(flights.do("patent", work)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target = lambda: results.append(flights.do("patent", work)))
+                 for number in range(3)]
+    for follower in followers:
+        follower.start()
+    while counts().get('result="hit"', 0) < 3:
+        time.sleep(0.01)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert results == ["result"] * 4 and len(runs) == 1
+    assert counts() == {'result="leader"' : 1, 'result="hit"' : 3}
+
+
+def test_waiting_requests_share_the_exception(flights, counts):
+    started, release = threading.Event(), threading.Event()
+    def fail():
+        started.set()
+        release.wait(5)
+        raise ValueError("no such patent")
+
+    errors = []
+    def request():
+        try:
+            flights.do("patent", fail)
+        except ValueError as error:
+            errors.append(error)
+
+    leader = threading.Thread(target = request)
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target = request)
+    follower.start()
+    while counts().get('result="hit"', 0) < 1:
+        time.sleep(0.01)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    assert len(errors) == 2 and errors[0] is errors[1]
+
+    # The key is free again once the work is over.
+    assert flights.do("patent", lambda: "again") == "again"
+
+
+def test_waits_for_another_process(flights, counts, tmp_path):
+    context = multiprocessing.get_context("fork")
+    started, release = context.Event(), context.Event()
+    marker = str(tmp_path / "child-done")
+    child = context.Process(target = hold_lock, args = (flights.lock_dir, "patent", started, release, marker))
+    child.start()
+    try:
+        assert started.wait(10)
+        threading.Timer(0.2, release.set).start()
+
+        # The work runs here only after the other process has finished it.
+        assert flights.do("patent", lambda: os.path.exists(marker)) is True
+    finally:
+        release.set()
+        child.join(10)
+    assert child.exitcode == 0
+    assert counts() == {'result="wait"' : 1}
+
+
+def test_gives_up_waiting_after_the_timeout(tmp_path, counts):
+    flights = SingleFlight(lock_dir = str(tmp_path / "flights"), timeout = 0.2)
+    # Another process holds the lock file and never lets go of it.
+    with open(flights._lock_path("patent"), "a") as lock_file:
+        context = multiprocessing.get_context("fork")
+        holding, release = context.Event(), context.Event()
+        def hold():
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            holding.set()
+            release.wait(10)
+        child = context.Process(target = hold)
+        child.start()
+        try:
+            assert holding.wait(10)
+            start = time.monotonic()
+            assert flights.do("patent", lambda: "result") == "result"
+            assert 0.2 <= time.monotonic() - start < 5
+        finally:
+            release.set()
+            child.join(10)
+    assert counts() == {'result="wait"' : 1}
+
+
+def test_unrelated_keys_do_not_wait(flights, counts):
+    # Keys in different slots each lead.
+    keys = ["patent-%d" % number for number in range(50)]
+    slots = {}
+    for key in keys:
+        slots.setdefault(flights._lock_path(key), key)
+    first, second = list(slots.values())[:2]
+    assert flights.do(first, lambda: flights.do(second, lambda: "nested")) == "nested"
+    assert counts() == {'result="leader"' : 2}
@@ -0,0 +1,17 @@
+# Tests that the modules preloaded before forking workers are those the
+# configured tokenizer and parser engine will import.
+
+# Import necessary modules
+import startup
+import config
+
+
+def test_heavy_modules_follow_the_settings():
+    assert startup.heavy_modules("fast", "stream") == ("wordcloud",)
+    assert startup.heavy_modules("nltk", "stream") == ("nltk.tokenize", "wordcloud")
+    assert startup.heavy_modules("fast", "soup") == ("bs4", "wordcloud")
+    assert startup.heavy_modules("nltk", "soup") == ("nltk.tokenize", "bs4", "wordcloud")
+
+
+def test_configured_modules_are_preloaded():
+    assert startup.HEAVY_MODULES == startup.heavy_modules(config.tokenizer, config.parser_engine)
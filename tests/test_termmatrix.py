@@ -0,0 +1,77 @@
+# Tests of TermDocumentMatrix: TF-IDF cosine similarities match a
+# brute-force computation over plain dicts.
+
+# Import necessary modules
+import math
+import random
+from collections import Counter
+import numpy as np
+import pytest
+from termmatrix import TermDocumentMatrix
+
+VOCABULARY = ["word%d" % number for number in range(60)]
+
+
+def random_documents(count, seed = 1):
+    rng = random.Random(seed)
+    return {"doc%d" % number : Counter(rng.choices(VOCABULARY[:rng.randint(5, 60)], k = rng.randint(1, 80)))
+            for number in range(count)}
+
+
+def brute_force_cosine(documents, query, doc_freq = None, num_docs = None):
+    # Smoothed IDF, as if one extra document contained every word once.
+    if doc_freq is None:
+        doc_freq = Counter(word for counts in documents.values() for word in counts)
+        num_docs = len(documents)
+    vocabulary = set(word for counts in documents.values() for word in counts)
+
+    def weights(counts):
+        return {word : count * (math.log((1 + num_docs) / (1 + doc_freq.get(word, 0))) + 1)
+                for word, count in counts.items() if word in vocabulary}
+
+    def norm(vector):
+        return math.sqrt(sum(value * value for value in vector.values())) or 1
+
+    query_weights = weights(query)
+    return {doc_id : sum(value * query_weights.get(word, 0) for word, value in weights(counts).items())
+                     / (norm(weights(counts)) * norm(query_weights))
+            for doc_id, counts in documents.items()}
+
+
+def test_cosine_similarity_matches_brute_force():
+    documents = random_documents(40)
+    matrix = TermDocumentMatrix.from_freqs(documents)
+    queries = ["doc3", "doc17", random_documents(1, seed = 2)["doc0"]]
+    similarity = matrix.cosine_similarity(queries, batch_size = 2)
+    assert similarity.shape == (3, 40)
+    for row, query in enumerate(queries):
+        counts = documents[query] if isinstance(query, str) else query
+        expected = brute_force_cosine(documents, counts)
+        assert similarity[row] == pytest.approx([expected[doc_id] for doc_id in matrix.doc_ids])
+
+
+def test_most_similar_matches_brute_force():
+    documents = random_documents(40)
+    matrix = TermDocumentMatrix.from_freqs(documents)
+    expected = brute_force_cosine(documents, documents["doc5"])
+    del expected["doc5"]
+    ranked = sorted(expected, key = lambda doc_id: (-expected[doc_id], matrix.rows[doc_id]))[:5]
+    results = matrix.most_similar("doc5", top_k = 5)
+    assert [doc_id for doc_id, similarity in results] == ranked
+    assert [similarity for doc_id, similarity in results] == pytest.approx([expected[doc_id] for doc_id in ranked])
+
+
+def test_document_frequencies_of_a_larger_collection():
+    documents = random_documents(10)
+    doc_freq = {word : 3 + number % 7 for number, word in enumerate(VOCABULARY)}
+    matrix = TermDocumentMatrix.from_freqs(documents, doc_freq, 100)
+    query = random_documents(1, seed = 3)["doc0"]
+    expected = brute_force_cosine(documents, query, doc_freq, 100)
+    assert matrix.cosine_similarity([query])[0] == pytest.approx([expected[doc_id] for doc_id in matrix.doc_ids])
+
+
+def test_empty_documents_are_never_similar():
+    matrix = TermDocumentMatrix.from_freqs({"empty" : Counter(), "full" : Counter(["word1", "word2"])})
+    assert matrix.weights.shape == (2, 2)
+    assert np.all(matrix.cosine_similarity(["empty"]) == 0)
+    assert matrix.most_similar(Counter(["word1"]))[0][0] == "full"